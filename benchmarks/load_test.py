@@ -0,0 +1,189 @@
+"""
+Load test of many processes running a mix of check, complete and create through the command line interface, against a
+single SQLite file, as shells and scripts sharing a database do.
+
+Reports throughput, latency percentiles, commands that failed on a locked database, and task instances that were
+scheduled more than once.
+
+Run from the repository root with:
+    python -m benchmarks.load_test [--workers N] [--commands N] [--tasks N]
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import date
+from multiprocessing import Pool
+from StringIO import StringIO
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+from src.cli import run
+from src.database import create_database_engine, create_session
+from src.models import TaskInstance
+from src.tasker import Tasker
+
+
+WORKERS = 8
+COMMANDS = 250
+TASKS = 200
+
+# Relative frequency of each command, about what a handful of shells checking on start, and scripts completing and
+# creating tasks, would send.
+MIX = (
+    ('check', 6),
+    ('complete', 3),
+    ('create', 1),
+)
+
+
+def _choose_command(rand):
+    choice = rand.uniform(0, sum(weight for _, weight in MIX))
+    for command, weight in MIX:
+        choice -= weight
+        if choice < 0:
+            return command
+    return MIX[-1][0]
+
+
+def _work(args):
+    """
+    Run commands in a worker process, returning a tuple (latencies of the commands in seconds, commands that failed on
+    a locked database, commands that failed otherwise).
+    """
+    worker, database_uri, commands = args
+    rand = random.Random(worker)
+    engine = create_database_engine(database_uri)
+
+    latencies = []
+    locked = 0
+    failed = 0
+    pending_ids = []
+    created = 0
+    try:
+        for _ in xrange(commands):
+            command = _choose_command(rand)
+            stdin = ''
+            if command == 'check':
+                argv = ['check', '--format', 'tsv']
+            elif command == 'complete' and pending_ids:
+                argv = ['complete', str(pending_ids.pop(rand.randrange(len(pending_ids))))]
+            elif command == 'complete':
+                argv = ['count']
+            else:
+                argv = ['create']
+                stdin = 'Worker {} task {}\ndaily\n\n'.format(worker, created)
+                created += 1
+
+            stdout = StringIO()
+            start = time.time()
+            try:
+                status = run(argv, stdin=StringIO(stdin), stdout=stdout, stderr=StringIO(), database=engine)
+            except OperationalError as e:
+                status = None
+                if 'locked' in str(e):
+                    locked += 1
+                else:
+                    failed += 1
+            latencies.append(time.time() - start)
+
+            if status is not None and status != 0:
+                failed += 1
+            elif status == 0 and command == 'check':
+                pending_ids = [int(line.split('\t', 1)[0]) for line in stdout.getvalue().splitlines()[1:]]
+    finally:
+        engine.dispose()
+
+    return latencies, locked, failed
+
+
+def _percentile(sorted_values, percent):
+    """
+    Returns the nearest-rank percentile of a sorted list.
+    """
+    if not sorted_values:
+        return 0
+    # Multiplying before dividing keeps whole ranks exact, where 7 / 100.0 * 100 would round up to the 8th value.
+    rank = int(math.ceil(percent * len(sorted_values) / 100.0))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def _count_duplicates(database_uri):
+    """
+    Returns the number of task instances scheduled for a task and date that already had one.
+    """
+    db = create_session(database_uri)
+    try:
+        counts = db.query(func.count(TaskInstance.id)) \
+            .group_by(TaskInstance.task, TaskInstance.date) \
+            .having(func.count(TaskInstance.id) > 1) \
+            .all()
+        return sum(count - 1 for count, in counts)
+    finally:
+        db.close()
+
+
+def load_test(workers, commands, tasks):
+    """
+    Returns a dictionary of the results of running commands from each of workers processes, against a database with
+    tasks daily tasks already scheduled.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        database_uri = 'sqlite:///{}'.format(os.path.join(temp_dir, 'tasker.sqlite'))
+
+        db = create_session(database_uri)
+        tasker = Tasker(db)
+        for i in xrange(tasks):
+            tasker.create_task('Task {}'.format(i), 'daily', date.today())
+        tasker.schedule_tasks()
+        db.close()
+
+        pool = Pool(workers)
+        try:
+            start = time.time()
+            results = pool.map(_work, [(worker, database_uri, commands) for worker in xrange(workers)])
+            elapsed = time.time() - start
+        finally:
+            pool.close()
+            pool.join()
+
+        latencies = sorted(latency for worker_latencies, _, _ in results for latency in worker_latencies)
+        return {
+            'commands': len(latencies),
+            'throughput': len(latencies) / elapsed,
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'p99': _percentile(latencies, 99),
+            'locked': sum(locked for _, locked, _ in results),
+            'failed': sum(failed for _, _, failed in results),
+            'duplicates': _count_duplicates(database_uri),
+        }
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test tasker with concurrent processes.')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Number of processes running commands.')
+    parser.add_argument('--commands', type=int, default=COMMANDS, help='Number of commands each process runs.')
+    parser.add_argument('--tasks', type=int, default=TASKS, help='Number of daily tasks to start with.')
+    args = parser.parse_args()
+
+    results = load_test(args.workers, args.commands, args.tasks)
+
+    print '{:<12}{:>12}'.format('commands', results['commands'])
+    print '{:<12}{:>12.0f}/s'.format('throughput', results['throughput'])
+    for percentile in ('p50', 'p95', 'p99'):
+        print '{:<12}{:>12.1f}ms'.format(percentile, results[percentile] * 1000)
+    print '{:<12}{:>12}'.format('locked', results['locked'])
+    print '{:<12}{:>12}'.format('failed', results['failed'])
+    print '{:<12}{:>12}'.format('duplicates', results['duplicates'])
+
+
+if __name__ == '__main__':
+    main()
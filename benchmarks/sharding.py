@@ -0,0 +1,88 @@
+"""
+Benchmark of concurrent completions from several processes, against a single SQLite file and against the same tasks
+sharded across several files.
+
+Run from the repository root with:
+    python -m benchmarks.sharding
+"""
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+from multiprocessing import Pool
+
+from sqlalchemy.exc import OperationalError
+
+from src.database import create_session
+from src.sharding import ShardedTasker, shard_database_uris
+from src.tasker import Tasker
+
+
+TASKS = 2000
+WORKERS = 8
+SHARDS = (1, 2, 4, 8)
+
+
+def _open(database_uri, shards):
+    if shards == 1:
+        return Tasker(create_session(database_uri))
+    return ShardedTasker([create_session(uri) for uri in shard_database_uris(database_uri, shards)])
+
+
+def _complete(args):
+    """
+    Complete task instances in a worker process, returning the number of completions that failed on a locked database.
+    """
+    database_uri, shards, ti_ids = args
+    tasker = _open(database_uri, shards)
+
+    locked = 0
+    for ti_id in ti_ids:
+        try:
+            tasker.complete_task_instance(ti_id)
+        except OperationalError:
+            locked += 1
+            for shard in getattr(tasker, 'shards', [tasker]):
+                shard.db.rollback()
+
+    return locked
+
+
+def benchmark(shards):
+    """
+    Returns a tuple (completions per second, completions that failed on a locked database) for TASKS completions
+    spread over WORKERS processes.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        database_uri = 'sqlite:///{}'.format(os.path.join(temp_dir, 'tasker.sqlite'))
+
+        tasker = _open(database_uri, shards)
+        for i in xrange(TASKS):
+            tasker.create_task('Task {}'.format(i), 'once', date(2016, 11, 3))
+        ti_ids = [ti.id for ti in tasker.schedule_tasks(until_date=date(2016, 11, 3))]
+
+        pool = Pool(WORKERS)
+        try:
+            start = time.time()
+            locked = sum(pool.map(_complete, [(database_uri, shards, ti_ids[i::WORKERS]) for i in xrange(WORKERS)]))
+            elapsed = time.time() - start
+        finally:
+            pool.close()
+            pool.join()
+
+        return TASKS / elapsed, locked
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def main():
+    print '{:<12}{:>20}{:>12}'.format('shards', 'completions/s', 'locked')
+    for shards in SHARDS:
+        rate, locked = benchmark(shards)
+        print '{:<12}{:>20.0f}{:>12}'.format(shards, rate, locked)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Microbenchmark of the per-call overhead of Tasker's hot operations, with and without statement caching.
+
+Run from the repository root with:
+    python -m benchmarks.statement_cache
+"""
+import timeit
+from datetime import date
+
+from src.database import create_session
+from src.tasker import Tasker
+
+
+TASKS = 50
+REPEAT = 5
+
+
+def _create_tasker(cache_statements):
+    db = create_session('sqlite://')
+    # Follows the flag Session has in later versions of SQLAlchemy, which Tasker honours.
+    db.enable_baked_queries = cache_statements
+
+    tasker = Tasker(db)
+    for i in xrange(TASKS):
+        tasker.create_task('Task {}'.format(i), 'once', date(2016, 11, 3))
+    tasker.schedule_tasks(until_date=date(2016, 11, 3))
+
+    return tasker
+
+
+def _time_per_call(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=REPEAT)) / number
+
+
+def benchmark(cache_statements):
+    """
+    Returns a dictionary of the best time per call, in seconds, of each operation.
+    """
+    tasker = _create_tasker(cache_statements)
+    results = {
+        'schedule_tasks': _time_per_call(lambda: tasker.schedule_tasks(until_date=date(2016, 11, 3)), 200),
+        'get_incomplete_task_instances': _time_per_call(tasker.get_incomplete_task_instances, 200),
+    }
+
+    # Completing a task instance a second time does nothing, so only the first completion of each one is timed.
+    ti_ids = iter(xrange(1, TASKS * REPEAT + 1))
+    tasker = _create_tasker(cache_statements)
+    for i in xrange(REPEAT - 1):
+        for task in xrange(TASKS):
+            tasker.create_task('Task {} {}'.format(i, task), 'once', date(2016, 11, 3))
+    tasker.schedule_tasks(until_date=date(2016, 11, 3))
+    results['complete_task_instance'] = _time_per_call(lambda: tasker.complete_task_instance(next(ti_ids)), TASKS)
+
+    return results
+
+
+def main():
+    uncached = benchmark(False)
+    cached = benchmark(True)
+
+    print '{:<32}{:>12}{:>12}{:>12}'.format('operation (us/call)', 'uncached', 'cached', 'saved')
+    for operation in sorted(cached):
+        saved = uncached[operation] - cached[operation]
+        print '{:<32}{:>12.1f}{:>12.1f}{:>12.1f}'.format(
+            operation, uncached[operation] * 1e6, cached[operation] * 1e6, saved * 1e6
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -12,13 +12,14 @@ setuptools.setup(
     package_dir={'tasker': 'src'},
     entry_points={
         'console_scripts': [
-            'tasker = tasker.cli:do_program'
+            'tasker = tasker.main:main'
         ]
     },
     install_requires=[
         'sqlalchemy~=1.1.15'
     ],
     extras_require={
-        'mysql': 'mysql-python~=1.2.5'
+        'mysql': 'mysql-python~=1.2.5',
+        'numpy': 'numpy~=1.16.6'
     }
 )
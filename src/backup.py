@@ -0,0 +1,231 @@
+import _sqlite3
+import ctypes
+import json
+import os
+import sys
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, func, inspect, select
+
+from models import Base
+
+
+_SQLITE_OK = 0
+_SQLITE_BUSY = 5
+_SQLITE_LOCKED = 6
+_SQLITE_DONE = 101
+
+_SQLITE_OPEN_READONLY = 0x1
+_SQLITE_OPEN_READWRITE = 0x2
+_SQLITE_OPEN_CREATE = 0x4
+
+
+class BackupException(Exception):
+    pass
+
+
+def _load_sqlite():
+    """
+    Returns the SQLite library used by the sqlite3 module, with the signatures of the functions needed for backups.
+    Python 2's sqlite3 module doesn't expose the online backup API, so it's called through ctypes instead.
+    """
+    lib = ctypes.CDLL(_sqlite3.__file__)
+
+    lib.sqlite3_open_v2.argtypes = [ctypes.c_char_p, ctypes.POINTER(ctypes.c_void_p), ctypes.c_int, ctypes.c_char_p]
+    lib.sqlite3_close.argtypes = [ctypes.c_void_p]
+    lib.sqlite3_errmsg.argtypes = [ctypes.c_void_p]
+    lib.sqlite3_errmsg.restype = ctypes.c_char_p
+
+    lib.sqlite3_backup_init.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_void_p, ctypes.c_char_p]
+    lib.sqlite3_backup_init.restype = ctypes.c_void_p
+    lib.sqlite3_backup_step.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    lib.sqlite3_backup_remaining.argtypes = [ctypes.c_void_p]
+    lib.sqlite3_backup_pagecount.argtypes = [ctypes.c_void_p]
+    lib.sqlite3_backup_finish.argtypes = [ctypes.c_void_p]
+
+    return lib
+
+
+def print_progress(unit, stream=sys.stderr, clock=time.time):
+    """
+    Returns a progress hook that reports how much of a backup has been copied, and how quickly, on a single line.
+
+    :param unit: Name of what's being copied, like "pages" or "rows".
+    :param stream: File to report progress to.
+    :param clock: Callable returning the current time in seconds.
+    """
+    start = clock()
+
+    def report(copied, total):
+        elapsed = clock() - start
+        rate = copied / elapsed if elapsed else 0
+        stream.write('\r{} of {} {} copied ({:.0f} {}/s)'.format(copied, total, unit, rate, unit))
+        if copied >= total:
+            stream.write('\n')
+        stream.flush()
+
+    return report
+
+
+def backup_sqlite(source_path, destination_path, pages_per_step=64, step_sleep=0.005, progress=None,
+                  busy_timeout=30):
+    """
+    Copy an SQLite database with SQLite's online backup API, which gives a consistent copy even while other processes
+    are using the database. Only a few pages are copied at a time, and the source is unlocked between steps, so
+    writers are never held up for long. If another process changes the source part way through, SQLite starts the
+    copy over.
+
+    The copy is written next to the destination, and only moved into place once it's complete. It's removed if the
+    backup fails.
+
+    :param source_path: Path to the database file to back up.
+    :param destination_path: Path to write the backup to. Replaced if it exists.
+    :param pages_per_step: Number of pages to copy while holding the lock on the source.
+    :param step_sleep: Seconds to wait between steps, or before trying again when the source is locked.
+    :param progress: Optional callable, given the number of pages copied and the total number of pages after each step.
+    :param busy_timeout: Seconds to keep trying while other processes hold the source locked, before giving up.
+    :raises BackupException: When the source can't be opened or read, stays locked for longer than busy_timeout, or
+        the destination can't be written.
+    """
+    lib = _load_sqlite()
+
+    temp_path = '{}.tmp'.format(destination_path)
+    if os.path.exists(temp_path):
+        os.unlink(temp_path)
+
+    try:
+        _backup_sqlite(lib, source_path, temp_path, pages_per_step, step_sleep, progress, busy_timeout)
+        os.rename(temp_path, destination_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _backup_sqlite(lib, source_path, temp_path, pages_per_step, step_sleep, progress, busy_timeout):
+    source = ctypes.c_void_p()
+    destination = ctypes.c_void_p()
+    try:
+        if lib.sqlite3_open_v2(source_path, ctypes.byref(source), _SQLITE_OPEN_READONLY, None) != _SQLITE_OK:
+            raise BackupException('Can\'t open {}: {}'.format(source_path, lib.sqlite3_errmsg(source)))
+
+        flags = _SQLITE_OPEN_READWRITE | _SQLITE_OPEN_CREATE
+        if lib.sqlite3_open_v2(temp_path, ctypes.byref(destination), flags, None) != _SQLITE_OK:
+            raise BackupException('Can\'t open {}: {}'.format(temp_path, lib.sqlite3_errmsg(destination)))
+
+        backup = lib.sqlite3_backup_init(destination, 'main', source, 'main')
+        if not backup:
+            raise BackupException('Can\'t back up {}: {}'.format(source_path, lib.sqlite3_errmsg(destination)))
+
+        try:
+            result = _SQLITE_OK
+            busy_since = None
+            while result != _SQLITE_DONE:
+                result = lib.sqlite3_backup_step(backup, pages_per_step)
+                if result not in (_SQLITE_OK, _SQLITE_BUSY, _SQLITE_LOCKED, _SQLITE_DONE):
+                    break
+
+                # A writer that holds the source locked for too long would otherwise keep the backup waiting forever.
+                if result in (_SQLITE_BUSY, _SQLITE_LOCKED):
+                    if busy_since is None:
+                        busy_since = time.time()
+                    elif time.time() - busy_since >= busy_timeout:
+                        break
+                else:
+                    busy_since = None
+
+                if progress and result in (_SQLITE_OK, _SQLITE_DONE):
+                    total = lib.sqlite3_backup_pagecount(backup)
+                    progress(total - lib.sqlite3_backup_remaining(backup), total)
+
+                if result != _SQLITE_DONE:
+                    time.sleep(step_sleep)
+        finally:
+            finished = lib.sqlite3_backup_finish(backup)
+
+        if result in (_SQLITE_BUSY, _SQLITE_LOCKED):
+            raise BackupException(
+                'Can\'t back up {}: it stayed locked for more than {}s'.format(source_path, busy_timeout)
+            )
+        if result != _SQLITE_DONE or finished != _SQLITE_OK:
+            raise BackupException('Can\'t back up {}: {}'.format(source_path, lib.sqlite3_errmsg(destination)))
+    finally:
+        # Closing a connection that was never opened is a no-op.
+        lib.sqlite3_close(destination)
+        lib.sqlite3_close(source)
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def dump_database(database_uri, destination_path, batch_size=500, progress=None):
+    """
+    Write a logical backup of a database of any kind, as a file with one JSON object per line. Each line holds a
+    row, as {"table": ..., "row": {...}}, and tables are written in dependency order, so that the rows can be inserted
+    in the order they appear. Rows are read in a single transaction, a batch at a time. On SQLite, the transaction is
+    opened explicitly, so that every table is read from the same snapshot; other databases give the consistency of
+    their default isolation level.
+
+    The dump is written next to the destination, and only moved into place once it's complete. It's removed if the
+    dump fails.
+
+    :param database_uri: SQLAlchemy URI of the database to back up.
+    :param destination_path: Path to write the dump to. Replaced if it exists.
+    :param batch_size: Number of rows to read from the database at a time.
+    :param progress: Optional callable, given the number of rows written and the total number of rows after each
+        batch.
+    """
+    temp_path = '{}.tmp'.format(destination_path)
+    try:
+        _dump_database(database_uri, temp_path, batch_size, progress)
+        os.rename(temp_path, destination_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _dump_database(database_uri, temp_path, batch_size, progress):
+    engine = create_engine(database_uri)
+    try:
+        inspector = inspect(engine)
+        existing_tables = set(inspector.get_table_names())
+
+        # Databases from older versions of tasker may not have every table or column yet.
+        tables = []
+        for table in Base.metadata.sorted_tables:
+            if table.name in existing_tables:
+                existing_columns = set(c['name'] for c in inspector.get_columns(table.name))
+                tables.append((table, [c for c in table.columns if c.name in existing_columns]))
+
+        with engine.connect() as connection, connection.begin(), open(temp_path, 'w') as f:
+            # The sqlite3 module only begins transactions before writes, so reads would each see the latest data.
+            if engine.dialect.name == 'sqlite':
+                connection.execute('BEGIN')
+
+            total = sum(connection.execute(select([func.count()]).select_from(table)).scalar() for table, _ in tables)
+
+            dumped = 0
+            for table, columns in tables:
+                query = select(columns).order_by(*table.primary_key.columns)
+                result = connection.execution_options(stream_results=True).execute(query)
+
+                rows = result.fetchmany(batch_size)
+                while rows:
+                    for row in rows:
+                        f.write(json.dumps(
+                            {'table': table.name, 'row': dict(row.items())}, default=_json_default, sort_keys=True
+                        ))
+                        f.write('\n')
+
+                    dumped += len(rows)
+                    if progress:
+                        progress(dumped, total)
+
+                    rows = result.fetchmany(batch_size)
+    finally:
+        engine.dispose()
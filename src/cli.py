@@ -1,56 +1,160 @@
 import argparse
 import os
+import shlex
 import sys
+import threading
 from datetime import date
-
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
-from tasker import Tasker, InvalidStartDateException, DuplicateNameException, InvalidCadenceException
-from models import Base
+from functools import partial
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import Session
+
+from backup import BackupException, backup_sqlite, dump_database, print_progress
+from database import create_session
+from export import ExportException, write_columns
+from fanout import check_databases
+from hooks import HookPipeline, command_hook, log_hook, webhook
+from journal import CompletionJournal
+from main import DEFAULT_DATABASE_PATH
+from output import OutputFormats, write_task_instances
+from sharding import ShardedTasker, ShardingException, shard_database_uris
+from sync import synchronize
+from tasker import Tasker, InvalidStartDateException, DuplicateNameException, InvalidCadenceException, TaskerException
+from watcher import TaskWatcher, command_notification, print_notification
 from intervals.interval_factory import IntervalFactory, UnsupportedIntervalException
 
 
 class TaskerCliOptions(object):
+    BACKUP = 'backup'
     CREATE = 'create'
     CHECK = 'check'
     COMPLETE = 'complete'
+    COUNT = 'count'
+    DEPEND = 'depend'
+    EXPORT = 'export'
+    FIND = 'find'
+    STATS = 'stats'
+    SYNC = 'sync'
+    WATCH = 'watch'
 
 
 class TaskerCli(object):
-    DEFAULT_DATABASE_URI = 'sqlite:///{}'.format(os.path.join(os.path.expanduser('~'), '.tasker.sqlite'))
+    DEFAULT_DATABASE_URI = 'sqlite:///{}'.format(DEFAULT_DATABASE_PATH)
+
+    _cadences = None
+
+    def __init__(self, database=None, journal=None, owner=None, hooks=None, hook_timeout=10, shards=None,
+                 stdin=None, stdout=None, stderr=None, program=None):
+        """
+        :param database: A database URI, or a list of them. With more than one database, only checking tasks is
+            supported, and databases are only connected to while checking. Can also be an SQLAlchemy engine, which a
+            session is opened on, or an existing session, so that a warm connection pool is reused; their tables have
+            to exist already, as with create_database_engine.
+        :param journal: Optional path to a completion journal, which completions are written to until the next check
+            or sync.
+        :param owner: Optional owner to manage the tasks of, in databases shared by several people.
+        :param hooks: Optional list of hooks to run in the background for each task instance scheduled or completed.
+        :param hook_timeout: Seconds to wait for each hook call.
+        :param shards: Optional number of SQLite files to split the database across, named after its file. Only
+            creating, checking, completing and counting tasks are supported, without a journal.
+        :param stdin: File to read answers to prompts from. Defaults to sys.stdin.
+        :param stdout: File to print to. Defaults to sys.stdout.
+        :param stderr: File to print errors and progress to. Defaults to sys.stderr.
+        :param program: Path this was run as, used in the hints printed for completing tasks. Defaults to sys.argv[0].
+        """
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self.stderr = stderr or sys.stderr
 
-    def __init__(self, database=None):
         if not database:
             database = self.DEFAULT_DATABASE_URI
 
-        self.database_uri = database
-
-        engine = create_engine(self.database_uri)
-        Base.metadata.create_all(engine)
-        Base.metadata.bind = engine
-
-        session = sessionmaker(bind=engine)
-        self.db = session()
-
-        self.tasker = Tasker(self.db)
-
-        self._run_path = sys.argv[0]
+        # Sessions and engines opened here are closed by close(); those passed in are left to their owner.
+        self._sessions = []
+        self._engines = []
+        session = None
+        if isinstance(database, Session):
+            session = database
+            database = str(session.get_bind().url)
+        elif isinstance(database, Engine):
+            # A plain Session, as each sessionmaker creates a new Session subclass, which is slow to set up.
+            session = Session(bind=database)
+            self._sessions.append(session)
+            database = str(database.url)
+
+        self.database_uris = [database] if isinstance(database, basestring) else list(database)
+        self.database_uri = self.database_uris[0]
+        self.owner = owner
+        self.shards = shards
+
+        self.hooks = HookPipeline(hooks, timeout=hook_timeout, errors=self.stderr) if hooks else None
+        self.db = None
+        self.tasker = None
+        try:
+            if shards:
+                self.tasker = ShardedTasker(
+                    [self._open_session(uri) for uri in shard_database_uris(self.database_uri, shards)],
+                    owner=owner,
+                    hooks=self.hooks
+                )
+            elif len(self.database_uris) == 1:
+                self.db = session or self._open_session(self.database_uri)
+                self.tasker = Tasker(
+                    self.db,
+                    journal=CompletionJournal(journal) if journal else None,
+                    owner=owner,
+                    hooks=self.hooks
+                )
+        except Exception:
+            # Nothing else will close the hooks' workers, and the databases already opened.
+            self.close()
+            raise
+
+        self._run_path = program or sys.argv[0]
         # Scan through $PATH, and determine if this could be run without the full path.
-        run_directory = os.path.dirname(sys.argv[0])
-        if run_directory[-1] != os.path.sep:
+        run_directory = os.path.dirname(self._run_path)
+        if run_directory and run_directory[-1] != os.path.sep:
             run_directory = run_directory + os.path.sep
         len_run_directory = len(run_directory)
 
-        for a_path in os.environ['PATH'].split(os.pathsep):
+        for a_path in os.environ['PATH'].split(os.pathsep) if run_directory else []:
             if a_path[-1] != os.path.sep:
                 a_path = a_path + os.path.sep
             if a_path == run_directory:
                 self._run_path = self._run_path[len_run_directory:]
                 break
 
+        self.all_cadences = self._load_cadences()
+
+    def _open_session(self, database_uri):
+        session = create_session(database_uri)
+        self._sessions.append(session)
+        self._engines.append(session.get_bind())
+        return session
+
+    def close(self):
+        """
+        Wait for hooks to finish, and close the sessions and connections opened by this TaskerCli.
+        """
+        if self.hooks:
+            self.hooks.close()
+        for session in self._sessions:
+            session.close()
+        for engine in self._engines:
+            engine.dispose()
+
+    @classmethod
+    def _load_cadences(cls):
+        """
+        Returns a dictionary of the (name, interval) of each cadence, keyed by its approximate period. Only loaded once,
+        as it doesn't change between runs in the same process.
+        """
+        if cls._cadences is not None:
+            return cls._cadences
+
         # Attempt to load up all intervals from the intervals directory.
-        self.all_cadences = {}
+        all_cadences = {}
         intervals_dir = os.path.realpath(os.path.join(os.path.dirname(__file__), 'intervals'))
         for f in os.listdir(intervals_dir):
             # Only take py files
@@ -63,9 +167,12 @@ class TaskerCli(object):
             except UnsupportedIntervalException:
                 pass
 
-            self.all_cadences[interval.approximate_period()] = (interval_name, interval)
+            all_cadences[interval.approximate_period()] = (interval_name, interval)
+
+        cls._cadences = all_cadences
+        return all_cadences
 
-    def create_task(self):
+    def create_task(self, project=None, tags=None):
         name = self._get_task_name()
         cadence = self._get_cadence()
         while True:
@@ -74,41 +181,172 @@ class TaskerCli(object):
                 self.tasker.assert_start_date_valid(cadence, start)
                 break
             except InvalidStartDateException as e:
-                print >> sys.stderr, e.message
+                print >> self.stderr, e.message
 
-        self.tasker.create_task(name, cadence, start)
+        self.tasker.create_task(name, cadence, start, project=project, tags=tags)
 
-    def print_tasks(self):
-        self.tasker.schedule_tasks()
-        self._print_remaining_tasks()
-
-    def complete_task(self, ti_id):
-        self.tasker.complete_task_instance(ti_id)
+    def print_tasks(self, tag=None, project=None, output_format=OutputFormats.TEXT):
+        if len(self.database_uris) > 1:
+            if output_format == OutputFormats.TEXT:
+                self._print_remaining_tasks_from_databases(tag=tag, project=project)
+            else:
+                task_instances = check_databases(self.database_uris, tag=tag, project=project, owner=self.owner)
+                write_task_instances(
+                    task_instances, output_format, self.stdout, fields=('source', 'id', 'name', 'date')
+                )
+            return
 
-    def _print_remaining_tasks(self):
-        task_instances = self.tasker.get_incomplete_task_instances()
+        self.tasker.schedule_tasks()
+        if output_format == OutputFormats.TEXT:
+            self._print_remaining_tasks(tag=tag, project=project)
+        else:
+            task_instances = self.tasker.iter_incomplete_task_instances(tag=tag, project=project)
+            write_task_instances(task_instances, output_format, self.stdout)
+
+    def complete_task(self, ti_id, tag=None, project=None):
+        self.tasker.complete_task_instance(ti_id, tag=tag, project=project)
+
+    def depend(self, name=None, dependency_name=None, remove=False):
+        if name is None:
+            for name, dependency_name in self.tasker.get_dependencies():
+                print >> self.stdout, '{} waits for {}'.format(name, dependency_name)
+        elif remove:
+            self.tasker.remove_dependency(name, dependency_name)
+        else:
+            self.tasker.add_dependency(name, dependency_name)
+
+    def print_count(self):
+        print >> self.stdout, self.tasker.pending_count()
+
+    def sync(self, other_database=None):
+        self.tasker.flush_journal()
+
+        if other_database:
+            other_db = create_session(other_database)
+            try:
+                received, sent = synchronize(self.tasker, Tasker(other_db, owner=self.owner))
+            finally:
+                other_db.close()
+
+            print >> self.stdout, 'Received {} and sent {} changes.'.format(received, sent)
+
+    def backup(self, destination, logical=False, pages_per_step=64):
+        # Completions still in the journal would be missing from the backup.
+        self.tasker.flush_journal()
+
+        url = make_url(self.database_uri)
+        if url.get_backend_name() == 'sqlite' and url.database and not logical:
+            backup_sqlite(
+                url.database,
+                destination,
+                pages_per_step=pages_per_step,
+                progress=print_progress('pages', stream=self.stderr)
+            )
+        else:
+            dump_database(self.database_uri, destination, progress=print_progress('rows', stream=self.stderr))
+
+    def export(self, destination, npz=False):
+        write_columns(self.tasker.export_columns(), destination, npz=npz)
+
+    def watch(self, poll_interval, notify_command=None):
+        if notify_command:
+            notify = command_notification(shlex.split(notify_command))
+        else:
+            notify = partial(print_notification, stream=self.stdout)
+        TaskWatcher(self.tasker, notify=notify, poll_interval=poll_interval).run()
+
+    def find_tasks(self, query, tag=None, project=None):
+        tasks = self.tasker.search(query, tag=tag, project=project)
+        if len(tasks):
+            rjust = 4 + len(str(max(task.id for task in tasks)))
+
+            for task in tasks:
+                print >> self.stdout, '{}. {} ({})'.format(str(task.id).rjust(rjust), task.name, task.cadence)
+
+    def print_statistics(self, by_cadence=False, rebuild=False):
+        if rebuild:
+            self.tasker.rebuild_statistics()
+
+        statistics = self.tasker.get_statistics(by_cadence=by_cadence)
+        if by_cadence:
+            for row in statistics:
+                print >> self.stdout, '  {}: {}'.format(row.cadence, self._format_statistics(row))
+        elif len(statistics):
+            rjust = 4 + len(str(max(row.id for row in statistics)))
+
+            for row in statistics:
+                print >> self.stdout, '{}. {} ({}): {}'.format(
+                    str(row.id).rjust(rjust), row.name, row.cadence, self._format_statistics(row)
+                )
+
+    @staticmethod
+    def _format_statistics(row):
+        rate = ' ({:.0%})'.format(float(row.done) / row.scheduled) if row.scheduled else ''
+        average_late = float(row.days_late) / row.done if row.done else 0
+        return '{} of {} done{}, {:.1f} days late on average'.format(row.done, row.scheduled, rate, average_late)
+
+    def _print_remaining_tasks(self, tag=None, project=None):
+        task_instances = self.tasker.get_incomplete_task_instances(tag=tag, project=project)
         if len(task_instances):
 
             # Get the highest TI id, so that the indent can be exactly 4 spaces in from the longest ID.
             max_id = max(ti[0] for ti in task_instances)
             rjust = 4 + len(str(max_id))
 
-            print 'Things to do:'
+            print >> self.stdout, 'Things to do:'
             for row in task_instances:
                 ti_id, name, date, done = row
-                print '{}. ({}) {}'.format(str(ti_id).rjust(rjust), date, name)
+                print >> self.stdout, '{}. ({}) {}'.format(str(ti_id).rjust(rjust), date, name)
 
             database_str = ' '
             if self.database_uri != self.DEFAULT_DATABASE_URI:
                 database_str = ' --database "{}" '.format(self.database_uri)
+            if self.shards:
+                database_str += '--shards {} '.format(self.shards)
+            if self.owner is not None:
+                database_str += '--owner "{}" '.format(self.owner)
+            if getattr(self.tasker, 'journal', None):
+                database_str += '--journal "{}" '.format(self.tasker.journal.path)
+
+            filter_str = ''
+            if tag is not None:
+                filter_str += ' --tag "{}"'.format(tag)
+            if project is not None:
+                filter_str += ' --project "{}"'.format(project)
+
+            print >> self.stdout, 'To complete any task, use:\n    {}{}{}{} N'.format(
+                self._run_path, database_str, TaskerCliOptions.COMPLETE, filter_str
+            )
+
+    def _print_remaining_tasks_from_databases(self, tag=None, project=None):
+        task_instances = check_databases(self.database_uris, tag=tag, project=project, owner=self.owner)
+        if len(task_instances):
+            rjust = 4 + len(str(max(ti.id for ti in task_instances)))
+
+            print >> self.stdout, 'Things to do:'
+            for ti in task_instances:
+                print >> self.stdout, '{}. ({}) {} [{}]'.format(str(ti.id).rjust(rjust), ti.date, ti.name, ti.source)
 
-            print 'To complete any task, use:\n    {}{}{} N'.format(
-                self._run_path, database_str, TaskerCliOptions.COMPLETE
+            owner_str = ' --owner "{}"'.format(self.owner) if self.owner is not None else ''
+            print >> self.stdout, 'To complete any task, use:\n    {} --database SOURCE{} {} N'.format(
+                self._run_path, owner_str, TaskerCliOptions.COMPLETE
             )
 
+    def _input(self, prompt):
+        """
+        Print a prompt, and return the line read in answer, as raw_input does, but with this TaskerCli's files.
+        """
+        self.stdout.write(prompt)
+        self.stdout.flush()
+
+        line = self.stdin.readline()
+        if not line:
+            raise EOFError()
+        return line[:-1] if line.endswith('\n') else line
+
     def _get_task_name(self):
         while True:
-            name = raw_input('Enter task name: ').strip()
+            name = self._input('Enter task name: ').strip()
 
             if not name:
                 continue
@@ -117,16 +355,16 @@ class TaskerCli(object):
                 self.tasker.assert_name_unique(name)
                 return name
             except DuplicateNameException as e:
-                print >> sys.stderr, e.message
+                print >> self.stderr, e.message
 
     def _get_cadence(self):
         all_cadences_keys = sorted(self.all_cadences.keys())
         cadence_lst = ['  {}. {}'.format(i+1, self.all_cadences[o][0].title()) for i, o in enumerate(all_cadences_keys)]
 
         while True:
-            print 'Available cadences:'
-            print '\n'.join(cadence_lst)
-            cadence = raw_input('Select cadence: ').strip()
+            print >> self.stdout, 'Available cadences:'
+            print >> self.stdout, '\n'.join(cadence_lst)
+            cadence = self._input('Select cadence: ').strip()
 
             if not cadence:
                 continue
@@ -141,11 +379,11 @@ class TaskerCli(object):
                 self.tasker.assert_cadence_valid(cadence)
                 return cadence
             except InvalidCadenceException as e:
-                print >> sys.stderr, e.message
+                print >> self.stderr, e.message
 
     def _get_first_date(self):
         while True:
-            start = raw_input('When does this start (YYYY-MM-DD; default today): ').strip()
+            start = self._input('When does this start (YYYY-MM-DD; default today): ').strip()
 
             if start == '':
                 return date.today()
@@ -153,41 +391,297 @@ class TaskerCli(object):
             try:
                 return date(*[int(i) for i in start.split('-')])
             except (TypeError, ValueError) as e:
-                print >> sys.stderr, 'Not a valid (YYYY-MM-DD) ({})'.format(e.message)
-
-
-def do_program():
-    parser = argparse.ArgumentParser(description='Pretty basic interval task management system')
-
-    parser.add_argument('--database', '-d', help='database uri, defaults to sqlite:///$HOME/.tasker.sqlite')
+                print >> self.stderr, 'Not a valid (YYYY-MM-DD) ({})'.format(e.message)
+
+
+class _CliExit(Exception):
+    def __init__(self, status):
+        super(_CliExit, self).__init__(status)
+        self.status = status
+
+
+class _CliArgumentParser(argparse.ArgumentParser):
+    """
+    Argument parser that prints usage and errors to the files it's given, and raises _CliExit rather than exiting, so
+    that it can be run in-process.
+    """
+    stdout = None
+    stderr = None
+
+    def _print_message(self, message, file=None):
+        if message:
+            if file is sys.stdout:
+                (self.stdout or sys.stdout).write(message)
+            else:
+                (self.stderr or sys.stderr).write(message)
+
+    def exit(self, status=0, message=None):
+        if message:
+            self._print_message(message, self.stderr)
+        raise _CliExit(status)
+
+
+_parsers = threading.local()
+
+
+def _get_parser(stdout=None, stderr=None, program=None):
+    """
+    Returns the argument parser, printing to the given files. Building it takes longer than most commands take to run,
+    so it's only built once for each program name in each thread, and only the files it prints to change between runs.
+    """
+    if not hasattr(_parsers, 'by_program'):
+        _parsers.by_program = {}
+
+    parser = _parsers.by_program.get(program)
+    if parser is None:
+        parser = _parsers.by_program[program] = _build_parser(program)
+
+    for a_parser in [parser] + parser.subparsers.choices.values():
+        a_parser.stdout = stdout
+        a_parser.stderr = stderr
+
+    return parser
+
+
+def _build_parser(program=None):
+    parser = _CliArgumentParser(
+        prog=program and os.path.basename(program),
+        description='Pretty basic interval task management system'
+    )
+
+    parser.add_argument('--database', '-d', action='append',
+                        help='database uri, defaults to sqlite:///$HOME/.tasker.sqlite. check accepts several')
+    parser.add_argument('--databases-file',
+                        help='file listing database uris to check, one per line, along with any --database')
+    parser.add_argument('--journal', '-j',
+                        help='write completions to this local file, and apply them to the database on check or sync')
+    parser.add_argument('--owner', '-o',
+                        help='only manage the tasks of this owner, for databases shared by several people')
+    parser.add_argument('--shards', type=int,
+                        help='split the sqlite database across this many files, so that writes to different tasks '
+                             'don\'t wait for each other. Supports create, check, complete and count')
+    parser.add_argument('--hook-command', action='append', default=[],
+                        help='command to run for each task scheduled or completed, with the event, name, date and id '
+                             'appended. May be repeated')
+    parser.add_argument('--webhook', action='append', default=[],
+                        help='url to post a JSON object to for each task scheduled or completed. May be repeated')
+    parser.add_argument('--hook-log', action='append', default=[],
+                        help='file to append a line of JSON to for each task scheduled or completed. May be repeated')
+    parser.add_argument('--hook-timeout', type=float, default=10,
+                        help='seconds to wait for each hook, defaults to 10')
 
     subparsers = parser.add_subparsers(dest='command', help='sub-commands')
+    parser.subparsers = subparsers
+
+    create_parser = subparsers.add_parser(TaskerCliOptions.CREATE, help='create a task')
+    create_parser.add_argument('--project', '-p', help='project the task belongs to')
+    create_parser.add_argument('--tag', '-t', action='append', dest='tags', help='tag to attach, may be repeated')
 
-    subparsers.add_parser(TaskerCliOptions.CREATE, help='create a task')
-    subparsers.add_parser(TaskerCliOptions.CHECK, help='print pending/incomplete tasks')
+    check_parser = subparsers.add_parser(TaskerCliOptions.CHECK, help='print pending/incomplete tasks')
+    check_parser.add_argument('--project', '-p', help='only print tasks belonging to this project')
+    check_parser.add_argument('--tag', '-t', help='only print tasks carrying this tag')
+    check_parser.add_argument('--format', '-f', choices=OutputFormats.ALL, default=OutputFormats.TEXT,
+                              help='print tasks for people to read (the default), or as json, jsonl, or tsv for other '
+                                   'programs')
 
     complete_parser = subparsers.add_parser(TaskerCliOptions.COMPLETE, help='complete an existing task')
     complete_parser.add_argument('task_id', help='task ID to complete')
+    complete_parser.add_argument('--project', '-p', help='only complete the task if it belongs to this project')
+    complete_parser.add_argument('--tag', '-t', help='only complete the task if it carries this tag')
+
+    subparsers.add_parser(TaskerCliOptions.COUNT,
+                          help='print the number of pending tasks, as of the last check, quickly enough for a prompt')
+
+    depend_parser = subparsers.add_parser(TaskerCliOptions.DEPEND,
+                                          help='make a task wait for another to be done, or list tasks that wait')
+    depend_parser.add_argument('task', nargs='?', help='name of the task that waits')
+    depend_parser.add_argument('dependency', nargs='?', help='name of the task to wait for')
+    depend_parser.add_argument('--remove', action='store_true', help='stop the task from waiting')
+
+    find_parser = subparsers.add_parser(TaskerCliOptions.FIND, help='search for tasks by name')
+    find_parser.add_argument('query', nargs='+', help='words to search for, matched by prefix')
+    find_parser.add_argument('--project', '-p', help='only find tasks belonging to this project')
+    find_parser.add_argument('--tag', '-t', help='only find tasks carrying this tag')
+
+    backup_parser = subparsers.add_parser(TaskerCliOptions.BACKUP, help='back up the database while it\'s in use')
+    backup_parser.add_argument('destination', help='path to write the backup to')
+    backup_parser.add_argument('--jsonl', action='store_true',
+                               help='write a dump with a JSON object per row, rather than a copy of an SQLite '
+                                    'database. Always used for other databases')
+    backup_parser.add_argument('--pages', type=int, default=64,
+                               help='SQLite pages to copy at a time, between which writers can use the database')
+
+    export_parser = subparsers.add_parser(TaskerCliOptions.EXPORT,
+                                          help='write the history of every task as numpy arrays, for analysis')
+    export_parser.add_argument('destination',
+                               help='directory to write a .npy file per column to, which numpy can map into memory')
+    export_parser.add_argument('--npz', action='store_true',
+                               help='write a single uncompressed .npz archive instead of a directory')
+
+    stats_parser = subparsers.add_parser(TaskerCliOptions.STATS, help='print completion statistics')
+    stats_parser.add_argument('--by-cadence', action='store_true', help='aggregate statistics by cadence')
+    stats_parser.add_argument('--rebuild', action='store_true',
+                              help='recompute statistics from task history, for databases from older versions')
+
+    sync_parser = subparsers.add_parser(TaskerCliOptions.SYNC,
+                                        help='apply completions pending in the journal, and sync with another database')
+    sync_parser.add_argument('other_database', nargs='?', help='database uri to exchange changes with')
+
+    watch_parser = subparsers.add_parser(TaskerCliOptions.WATCH, help='schedule tasks and notify as they become due')
+    watch_parser.add_argument('--interval', '-i', type=float, default=60,
+                              help='seconds between checks for new tasks and completions, defaults to 60')
+    watch_parser.add_argument('--notify-command', '-n',
+                              help='command to run for each due task, with its name, date and id appended')
+
+    return parser
+
+
+def _read_databases_file(parser, args):
+    """
+    Add the database URIs listed in the --databases-file to the --database ones. Blank lines and lines starting with #
+    are skipped.
+    """
+    if args.databases_file is None:
+        return
+
+    try:
+        with open(args.databases_file) as f:
+            uris = [line.strip() for line in f]
+    except IOError as e:
+        parser.error('can\'t read --databases-file: {}'.format(e))
+
+    args.database = (args.database or []) + [uri for uri in uris if uri and not uri.startswith('#')]
+
+
+def _check_args(parser, args):
+    """
+    Fail with a usage error for combinations of arguments that argparse can't rule out by itself.
+    """
+    if args.database and len(args.database) > 1:
+        if args.command != TaskerCliOptions.CHECK:
+            parser.error('{} only supports a single --database'.format(args.command))
+        if args.journal:
+            parser.error('--journal only supports a single --database')
+        if args.hook_command or args.webhook or args.hook_log:
+            parser.error('hooks only support a single --database')
+
+    if args.shards is not None:
+        if args.shards < 1:
+            parser.error('--shards needs at least 1 shard')
+        if args.command not in (TaskerCliOptions.CREATE, TaskerCliOptions.CHECK, TaskerCliOptions.COMPLETE,
+                                TaskerCliOptions.COUNT):
+            parser.error('{} doesn\'t support --shards'.format(args.command))
+        if args.database and len(args.database) > 1:
+            parser.error('--shards only supports a single --database')
+        if args.journal:
+            parser.error('--journal doesn\'t support --shards')
+
+    if args.command == TaskerCliOptions.DEPEND and (args.task is None) != (args.dependency is None):
+        parser.error('depend needs both a task and the task it waits for')
+
+
+def run(argv=None, stdin=None, stdout=None, stderr=None, database=None, program=None):
+    """
+    Run the command line interface in-process, with the given arguments and files in place of the process's own.
+
+    :param argv: Command line arguments, after the program name. Defaults to sys.argv[1:].
+    :param stdin: File to read answers to prompts from. Defaults to sys.stdin.
+    :param stdout: File to print to. Defaults to sys.stdout.
+    :param stderr: File to print errors to. Defaults to sys.stderr.
+    :param database: Database to use when no --database is given: a URI, or an SQLAlchemy engine or session whose
+        tables already exist. Passing the same engine to every run reuses its connection pool.
+    :param program: Path the command line interface was run as, for usage and hints. Defaults to sys.argv[0].
+    :returns: The exit status: 0 on success, 2 for invalid arguments, or -1 when the command fails.
+    """
+    parser = _get_parser(stdout=stdout, stderr=stderr, program=program)
+    try:
+        args = parser.parse_args(argv)
+        _read_databases_file(parser, args)
+        _check_args(parser, args)
+
+        hooks = [command_hook(shlex.split(command)) for command in args.hook_command] + \
+            [webhook(url, timeout=args.hook_timeout) for url in args.webhook] + \
+            [log_hook(path) for path in args.hook_log]
+
+        try:
+            tasker_cli = TaskerCli(
+                args.database or database,
+                journal=args.journal,
+                owner=args.owner,
+                hooks=hooks,
+                hook_timeout=args.hook_timeout,
+                shards=args.shards,
+                stdin=stdin,
+                stdout=stdout,
+                stderr=stderr,
+                program=program
+            )
+        except ShardingException as e:
+            parser.error(e.message)
+    except _CliExit as e:
+        return e.status
 
-    args = parser.parse_args()
+    try:
+        return _run_command(parser, tasker_cli, args)
+    finally:
+        tasker_cli.close()
 
-    tasker_cli = TaskerCli(args.database)
 
+def _run_command(parser, tasker_cli, args):
     if args.command == TaskerCliOptions.CREATE:
         try:
-            tasker_cli.create_task()
+            tasker_cli.create_task(project=args.project, tags=args.tags)
         except (KeyboardInterrupt, EOFError):
-            print ''
-            sys.exit(-1)
+            print >> tasker_cli.stdout, ''
+            return -1
     elif args.command == TaskerCliOptions.CHECK:
-        tasker_cli.print_tasks()
+        tasker_cli.print_tasks(tag=args.tag, project=args.project, output_format=args.format)
     elif args.command == TaskerCliOptions.COMPLETE:
-        tasker_cli.complete_task(args.task_id)
+        tasker_cli.complete_task(args.task_id, tag=args.tag, project=args.project)
+    elif args.command == TaskerCliOptions.DEPEND:
+        try:
+            tasker_cli.depend(args.task, args.dependency, remove=args.remove)
+        except TaskerException as e:
+            print >> tasker_cli.stderr, e.message
+            return -1
+    elif args.command == TaskerCliOptions.COUNT:
+        tasker_cli.print_count()
+    elif args.command == TaskerCliOptions.FIND:
+        tasker_cli.find_tasks(' '.join(args.query), tag=args.tag, project=args.project)
+    elif args.command == TaskerCliOptions.STATS:
+        tasker_cli.print_statistics(by_cadence=args.by_cadence, rebuild=args.rebuild)
+    elif args.command == TaskerCliOptions.BACKUP:
+        try:
+            tasker_cli.backup(args.destination, logical=args.jsonl, pages_per_step=args.pages)
+        except BackupException as e:
+            print >> tasker_cli.stderr, e.message
+            return -1
+    elif args.command == TaskerCliOptions.EXPORT:
+        try:
+            tasker_cli.export(args.destination, npz=args.npz)
+        except ExportException as e:
+            print >> tasker_cli.stderr, e.message
+            return -1
+    elif args.command == TaskerCliOptions.SYNC:
+        tasker_cli.sync(args.other_database)
+    elif args.command == TaskerCliOptions.WATCH:
+        try:
+            tasker_cli.watch(args.interval, notify_command=args.notify_command)
+        except KeyboardInterrupt:
+            pass
     else:  # pragma: no cover
         # Shouldn't actually be reachable, but a good failsafe in case commands are added to the list without actually
         # being implemented.
-        parser.print_usage(sys.stderr)
-        sys.exit(-1)
+        parser.print_usage(tasker_cli.stderr)
+        return -1
+
+    return 0
+
+
+def do_program():
+    status = run()
+    if status:
+        sys.exit(status)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,57 @@
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn
+
+from models import Base
+
+
+def upgrade_schema(engine):
+    """
+    Bring the tables of a database created by an older version of tasker up to date, by adding the columns and indexes
+    that have been added to them since. Columns added to existing tables are always nullable, so this is all that's
+    needed.
+
+    :param engine: SQLAlchemy engine of the database.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = set(c['name'] for c in inspector.get_columns(table.name))
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    connection.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                        table.name, CreateColumn(column).compile(dialect=engine.dialect)
+                    ))
+
+            existing_indexes = set(i['name'] for i in inspector.get_indexes(table.name))
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+
+
+def create_database_engine(database_uri):
+    """
+    Connect to a tasker database, creating any missing tables, and return its engine. The engine's connection pool can
+    be shared by any number of sessions, so that they don't each connect and check the tables again.
+
+    :param database_uri: SQLAlchemy URI of the database.
+    """
+    engine = create_engine(database_uri)
+    upgrade_schema(engine)
+    Base.metadata.create_all(engine)
+
+    return engine
+
+
+def create_session(database_uri):
+    """
+    Connect to a tasker database, creating any missing tables, and return a new session bound to it.
+
+    :param database_uri: SQLAlchemy URI of the database.
+    """
+    return sessionmaker(bind=create_database_engine(database_uri))()
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import zipfile
+
+
+class ExportException(Exception):
+    pass
+
+
+def load_numpy():
+    """
+    Returns the numpy module, which exports need, but the rest of tasker doesn't, so it's only an optional dependency.
+
+    :raises ExportException: When NumPy isn't installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ExportException('Exporting needs NumPy, which can be installed with: pip install tasker[numpy]')
+
+    return numpy
+
+
+def read_columns(result, dtypes, batch_size=10000, size_hint=0):
+    """
+    Read the rows of a query result into a typed NumPy array per column, a batch of rows at a time, so that no more than
+    a batch of rows is ever held as Python objects.
+
+    :param result: Result of a Core statement, ideally executed with stream_results, so that rows are fetched from the
+        database as they're read.
+    :param dtypes: NumPy dtype of each column of the result.
+    :param batch_size: Number of rows to fetch at a time.
+    :param size_hint: Expected number of rows, which the arrays are allocated for up front. They grow as needed.
+    :returns: A list of arrays, one for each column.
+    """
+    numpy = load_numpy()
+
+    columns = [numpy.empty(size_hint, dtype) for dtype in dtypes]
+    filled = 0
+
+    rows = result.fetchmany(batch_size)
+    while rows:
+        end = filled + len(rows)
+        if end > len(columns[0]):
+            columns = [numpy.concatenate([column, numpy.empty(max(end, 2 * len(column)) - len(column), column.dtype)])
+                       for column in columns]
+
+        for column, values in zip(columns, zip(*rows)):
+            column[filled:end] = values
+        filled = end
+
+        rows = result.fetchmany(batch_size)
+
+    return [column[:filled] for column in columns]
+
+
+def _remove_previous_export(path):
+    """
+    Remove a directory written by an earlier export, which only ever holds .npy files.
+
+    :raises ExportException: When the directory holds anything else, so it isn't an earlier export.
+    """
+    names = os.listdir(path)
+    if any(not name.endswith('.npy') or not os.path.isfile(os.path.join(path, name)) for name in names):
+        raise ExportException('{} already exists, and isn\'t an earlier export.'.format(path))
+
+    for name in names:
+        os.unlink(os.path.join(path, name))
+    os.rmdir(path)
+
+
+def write_columns(columns, destination_path, npz=False):
+    """
+    Write named arrays to disk, replacing the destination only once they're all written.
+
+    By default, the destination is a directory with a .npy file for each array, which numpy.load can map into memory
+    with mmap_mode='r', so that analyses only read the columns and rows they use. With npz, it's a single uncompressed
+    .npz archive instead, which is easier to pass around, but is read into memory when loaded.
+
+    An existing destination is only replaced when it's an earlier export: a directory of .npy files, or a .npz archive.
+
+    :param columns: Dictionary of NumPy arrays, keyed by name.
+    :param destination_path: Path of the directory, or the archive, to write.
+    :param npz: Write a single .npz archive rather than a directory.
+    :raises ExportException: When the destination exists, and isn't an earlier export.
+    """
+    numpy = load_numpy()
+
+    destination_path = os.path.abspath(destination_path)
+    if os.path.exists(destination_path):
+        if npz and (os.path.isdir(destination_path) or not zipfile.is_zipfile(destination_path)):
+            raise ExportException('{} already exists, and isn\'t an earlier export.'.format(destination_path))
+        if not npz and not os.path.isdir(destination_path):
+            raise ExportException('{} already exists, and isn\'t an earlier export.'.format(destination_path))
+
+    parent_path, name = os.path.split(destination_path)
+    if npz:
+        fd, temp_path = tempfile.mkstemp(prefix='.{}.'.format(name), dir=parent_path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                numpy.savez(f, **columns)
+            # Renaming over a file replaces it in one step.
+            os.rename(temp_path, destination_path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        return
+
+    temp_path = tempfile.mkdtemp(prefix='.{}.'.format(name), dir=parent_path)
+    try:
+        for column_name, column in columns.iteritems():
+            numpy.save(os.path.join(temp_path, '{}.npy'.format(column_name)), column)
+
+        if os.path.isdir(destination_path):
+            _remove_previous_export(destination_path)
+        os.rename(temp_path, destination_path)
+    except Exception:
+        shutil.rmtree(temp_path)
+        raise
@@ -0,0 +1,61 @@
+import heapq
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from database import create_session
+from tasker import Tasker
+
+
+SourcedTaskInstance = namedtuple('SourcedTaskInstance', ['source', 'id', 'name', 'date', 'done'])
+
+
+def _check_database(database_uri, until_date=None, tag=None, project=None, owner=None):
+    """
+    Schedule tasks in a single database, and return its pending task instances.
+    """
+    db = create_session(database_uri)
+    try:
+        tasker = Tasker(db, owner=owner)
+        tasker.schedule_tasks(until_date=until_date)
+        return tasker.get_incomplete_task_instances(tag=tag, project=project)
+    finally:
+        db.close()
+        db.get_bind().dispose()
+
+
+def check_databases(database_uris, until_date=None, tag=None, project=None, owner=None):
+    """
+    Schedule tasks and fetch pending task instances from several databases concurrently, each on its own thread and
+    connection, so that the total time taken is close to that of the slowest database rather than the sum of them all.
+
+    Returns a list of SourcedTaskInstance named tuples, sorted by scheduled date ascending. Task instances scheduled on
+    the same date are ordered by the position of their database in database_uris.
+
+    :param database_uris: SQLAlchemy URIs of the databases to check.
+    :param until_date: Passed through to Tasker.schedule_tasks.
+    :param tag: Passed through to Tasker.get_incomplete_task_instances.
+    :param project: Passed through to Tasker.get_incomplete_task_instances.
+    :param owner: Only schedule and fetch the task instances of this owner's tasks.
+    """
+    if not database_uris:
+        return []
+
+    pool = ThreadPool(len(database_uris))
+    try:
+        results = pool.map(
+            lambda database_uri: _check_database(
+                database_uri, until_date=until_date, tag=tag, project=project, owner=owner
+            ),
+            database_uris
+        )
+    finally:
+        pool.close()
+        pool.join()
+
+    # Each database's rows are already sorted by date, so a k-way merge is enough to sort them all.
+    merged = heapq.merge(*[
+        [(row.date, i, j, SourcedTaskInstance(database_uris[i], *row)) for j, row in enumerate(rows)]
+        for i, rows in enumerate(results)
+    ])
+
+    return [row for _, _, _, row in merged]
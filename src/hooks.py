@@ -0,0 +1,192 @@
+import Queue
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+import urllib2
+from collections import namedtuple
+
+
+HookEvent = namedtuple('HookEvent', ['kind', 'id', 'name', 'date', 'owner'])
+
+
+class HookEvents(object):
+    SCHEDULED = 'scheduled'
+    COMPLETED = 'completed'
+
+
+def _event_json(event):
+    return json.dumps({
+        'event': event.kind,
+        'id': event.id,
+        'name': event.name,
+        'date': event.date.isoformat(),
+        'owner': event.owner
+    }, sort_keys=True)
+
+
+def command_hook(command):
+    """
+    Returns a hook that runs a command for each event. The event's kind, task instance name, date and id are appended
+    to the command's arguments, so that it can be used with something like notify-send.
+
+    :param command: List of program arguments.
+    """
+    def hook(event):
+        subprocess.call(list(command) + [event.kind, event.name, str(event.date), str(event.id)])
+
+    return hook
+
+
+def webhook(url, timeout=10):
+    """
+    Returns a hook that posts each event to a URL, as a JSON object.
+
+    :param url: URL to post events to.
+    :param timeout: Seconds to wait for the server to respond.
+    """
+    def hook(event):
+        request = urllib2.Request(url, _event_json(event), {'Content-Type': 'application/json'})
+        urllib2.urlopen(request, timeout=timeout).close()
+
+    return hook
+
+
+def log_hook(path):
+    """
+    Returns a hook that appends each event to a file, as a line of JSON.
+
+    :param path: Path to the log file. It's created if it doesn't exist.
+    """
+    def hook(event):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, '{}\n'.format(_event_json(event)))
+        finally:
+            os.close(fd)
+
+    return hook
+
+
+# Pipelines that haven't been closed, which are closed when the process exits. Each pipeline is dropped from here when
+# it's closed, rather than registering its own exit handler, which Python can't unregister.
+_open_pipelines = set()
+
+
+def _close_open_pipelines():
+    for pipeline in list(_open_pipelines):
+        pipeline.close()
+
+
+atexit.register(_close_open_pipelines)
+
+
+class HookPipeline(object):
+    """
+    Runs hooks for tasker events on a pool of worker threads, so that slow hooks don't hold up scheduling or
+    completing task instances.
+
+    Events wait in a bounded queue. When it's full, emitting blocks until there's room, so a burst of events can't
+    grow without limit. Each hook call is given a limited time; a call that takes longer is left to finish in the
+    background, and its worker moves on. Everything queued is run before the process exits.
+    """
+    def __init__(self, hooks=None, workers=4, max_pending=100, timeout=10, errors=sys.stderr):
+        """
+        :param hooks: Callables given each HookEvent.
+        :param workers: Number of threads running hooks.
+        :param max_pending: Number of hook calls that can be waiting before emitting blocks.
+        :param timeout: Seconds to wait for each hook call before moving on.
+        :param errors: File to report failed and timed out hook calls to.
+        """
+        self.hooks = list(hooks or [])
+        self.timeout = timeout
+        self.errors = errors
+
+        self._queue = Queue.Queue(max_pending)
+        # Held while queueing an event and while closing, so that nothing is queued once the workers have been told to
+        # stop, where it would never be taken off the queue.
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = []
+        for _ in xrange(workers):
+            # Daemon threads, so that a hook that never returns can't keep the process alive.
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+        _open_pipelines.add(self)
+
+    def add_hook(self, hook):
+        """
+        Run a hook for every event emitted from now on.
+        """
+        self.hooks.append(hook)
+
+    def emit(self, event):
+        """
+        Queue a call of every hook with an event, blocking while the queue is full. Once the pipeline is closed,
+        events are reported as dropped instead.
+
+        :param event: A HookEvent.
+        """
+        with self._lock:
+            if self._closed:
+                self._report('Hook pipeline is closed, dropped {} event of {}'.format(event.kind, event.name))
+                return
+
+            for hook in self.hooks:
+                self._queue.put((hook, event))
+
+    def flush(self):
+        """
+        Wait until every queued hook call has finished, or timed out.
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Flush queued hook calls, and stop the workers. Called when the process exits.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        _open_pipelines.discard(self)
+
+        self.flush()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._call(*item)
+            finally:
+                self._queue.task_done()
+
+    def _call(self, hook, event):
+        def run():
+            try:
+                hook(event)
+            except Exception as e:
+                self._report('Hook for {} event of {} failed: {}'.format(event.kind, event.name, e))
+
+        # Each call gets its own thread, so that the worker can give up on it.
+        call = threading.Thread(target=run)
+        call.daemon = True
+        call.start()
+        call.join(self.timeout)
+
+        if call.is_alive():
+            self._report('Hook for {} event of {} timed out after {}s'.format(event.kind, event.name, self.timeout))
+
+    def _report(self, message):
+        print >> self.errors, message
@@ -0,0 +1,112 @@
+import errno
+import fcntl
+import glob
+import os
+import uuid
+
+
+class CompletionJournal(object):
+    """
+    Append-only local file of task instance ids that have been completed, but not yet written to the database.
+
+    Completing a task instance is then only a local append, and all pending completions can be written to the
+    database later in a single transaction. Each entry is a single short line written with O_APPEND, under a lock
+    that flushing also takes, so several processes can append to the same journal while others flush it.
+    """
+    def __init__(self, path):
+        """
+        :param path: Path to the journal file. It, and the files claimed from it while flushing, are created as
+            needed.
+        """
+        self.path = path
+
+    def _claimed_paths(self):
+        return glob.glob('{}.*.flushing'.format(self.path))
+
+    @staticmethod
+    def _read(path, lock=False):
+        try:
+            with open(path) as f:
+                if lock:
+                    # Wait for an append that opened the file before it was claimed to finish writing to it.
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                contents = f.read()
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return []
+            raise
+
+        # A line without a trailing newline is an append still in progress, so it's left for the next read.
+        return [int(line) for line in contents.split('\n')[:-1] if line]
+
+    def append(self, ti_id):
+        """
+        Record the completion of a task instance.
+
+        :param ti_id: The id of the task instance.
+        """
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+
+                # A flush may have claimed the journal after it was opened, and read it before it was locked, in
+                # which case the entry has to go to the new journal instead.
+                try:
+                    claimed = os.fstat(fd).st_ino != os.stat(self.path).st_ino
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                    claimed = True
+
+                if not claimed:
+                    os.write(fd, '{}\n'.format(int(ti_id)))
+                    return
+            finally:
+                os.close(fd)
+
+    def pending(self):
+        """
+        Returns the sorted list of task instance ids whose completion hasn't been flushed yet, including those claimed
+        by a flush that hasn't finished.
+        """
+        ids = set(self._read(self.path))
+        for claimed_path in self._claimed_paths():
+            ids.update(self._read(claimed_path))
+
+        return sorted(ids)
+
+    def flush(self, apply):
+        """
+        Write all pending completions to the database.
+
+        The journal is first renamed aside, so that completions appended while flushing go to a new journal, and the
+        claimed entries are only discarded once apply has returned. If apply fails, they're picked up again by the next
+        flush. Applying a completion twice has no effect, so concurrent flushes are harmless.
+
+        :param apply: Callable that's given the list of pending task instance ids, and writes them to the database.
+        :returns: The list of task instance ids that were applied.
+        """
+        try:
+            os.rename(self.path, '{}.{}.flushing'.format(self.path, uuid.uuid4().hex))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+        claimed_paths = self._claimed_paths()
+        ids = set()
+        for claimed_path in claimed_paths:
+            ids.update(self._read(claimed_path, lock=True))
+
+        ids = sorted(ids)
+        if ids:
+            apply(ids)
+
+        for claimed_path in claimed_paths:
+            try:
+                os.unlink(claimed_path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+        return ids
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import sys
+
+
+DEFAULT_DATABASE_PATH = os.path.join(os.path.expanduser('~'), '.tasker.sqlite')
+
+_SHORT_OPTIONS = {'-d': '--database', '-o': '--owner', '-j': '--journal'}
+
+
+def _parse_count_args(args):
+    """
+    Returns a tuple (database, owner, journal) of the options given to a count command, or None if the arguments
+    aren't for a count, or use anything beyond those options.
+    """
+    options = {'--database': None, '--owner': None, '--journal': None}
+
+    args = list(args)
+    while args and args[0] != 'count':
+        name, equals, value = args.pop(0).partition('=')
+        name = _SHORT_OPTIONS.get(name, name)
+        if name not in options or options[name] is not None:
+            return None
+
+        if not equals:
+            if not args:
+                return None
+            value = args.pop(0)
+        options[name] = value
+
+    if args != ['count']:
+        return None
+
+    return options['--database'], options['--owner'], options['--journal']
+
+
+def _sqlite_path(database_uri):
+    """
+    Returns the path of the SQLite database file a URI refers to, or None if it refers to any other kind of database.
+    """
+    if database_uri is None:
+        return DEFAULT_DATABASE_PATH
+    if database_uri.startswith('sqlite:///') and '?' not in database_uri:
+        return database_uri[len('sqlite:///'):] or None
+    return None
+
+
+def count_pending(args):
+    """
+    Count pending task instances by reading the maintained counts directly with the sqlite3 module, without loading
+    SQLAlchemy, so that it's quick enough to run on every shell prompt. Gives the same result as Tasker.pending_count.
+
+    :param args: Command line arguments, after the program name.
+    :returns: The count, or None if the arguments or database need the full command line interface, which is the case
+        for anything but an existing SQLite database with counts.
+    """
+    count_args = _parse_count_args(args)
+    if count_args is None:
+        return None
+
+    database_uri, owner, journal = count_args
+    path = _sqlite_path(database_uri)
+    if path is None or not os.path.isfile(path):
+        return None
+
+    connection = sqlite3.connect(path)
+    try:
+        if owner is None:
+            count = connection.execute('SELECT coalesce(sum(pending), 0) FROM pendingcounts').fetchone()[0]
+        else:
+            count = connection.execute(
+                'SELECT coalesce(sum(pending), 0) FROM pendingcounts WHERE owner = ?', (owner,)
+            ).fetchone()[0]
+
+        journaled = []
+        if journal:
+            # Only imported when needed, as its dependencies take longer to load than the count takes to run.
+            from journal import CompletionJournal
+            journaled = CompletionJournal(journal).pending()
+
+        for i in xrange(0, len(journaled), 500):
+            chunk = journaled[i:i + 500]
+            query = 'SELECT count(*) FROM taskinstances WHERE done = 0 AND id IN ({})'.format(
+                ', '.join('?' * len(chunk))
+            )
+            if owner is not None:
+                query += ' AND owner = ?'
+                chunk = chunk + [owner]
+            count -= connection.execute(query, chunk).fetchone()[0]
+    except sqlite3.Error:
+        # Databases from older versions of tasker get their counts once the full interface has opened them.
+        return None
+    finally:
+        connection.close()
+
+    return count
+
+
+def main():
+    """
+    Entry point of the tasker command. Counts are answered without loading the rest of tasker when possible; everything
+    else is passed on to the full command line interface.
+    """
+    count = count_pending(sys.argv[1:])
+    if count is not None:
+        print count
+        return
+
+    # Imported here, as loading SQLAlchemy takes many times longer than counting.
+    from cli import do_program
+    do_program()
+
+
+if __name__ == '__main__':
+    main()
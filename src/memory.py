@@ -0,0 +1,506 @@
+import bisect
+import errno
+import json
+import os
+import re
+from collections import Counter, namedtuple
+from datetime import date, datetime
+
+from hooks import HookEvent, HookEvents
+from intervals.interval_factory import IntervalFactory, UnsupportedIntervalException
+from tasker import DuplicateNameException, InvalidCadenceException, InvalidStartDateException, ScheduledTaskInstance
+
+
+TaskSchedule = namedtuple('TaskSchedule', ['id', 'name', 'cadence', 'start', 'ti_id', 'date', 'done', 'owner'])
+TaskMatch = namedtuple('TaskMatch', ['id', 'name', 'cadence', 'start'])
+TaskStatisticsRow = namedtuple('TaskStatisticsRow', ['id', 'name', 'cadence', 'scheduled', 'done', 'days_late'])
+CadenceStatisticsRow = namedtuple('CadenceStatisticsRow', ['cadence', 'scheduled', 'done', 'days_late'])
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class _MemoryTask(object):
+    __slots__ = ('id', 'name', 'cadence', 'start', 'project', 'tags', 'owner', 'scheduled', 'done', 'days_late')
+
+    def __init__(self, id, name, cadence, start, project, tags, owner, scheduled=0, done=0, days_late=0):
+        self.id = id
+        self.name = name
+        self.cadence = cadence
+        self.start = start
+        self.project = project
+        self.tags = frozenset(tags)
+        self.owner = owner
+        self.scheduled = scheduled
+        self.done = done
+        self.days_late = days_late
+
+    def to_json(self):
+        return [self.id, self.name, self.cadence, self.start.isoformat(), self.project, sorted(self.tags), self.owner,
+                self.scheduled, self.done, self.days_late]
+
+    @classmethod
+    def from_json(cls, row):
+        id, name, cadence, start, project, tags, owner, scheduled, done, days_late = row
+        return cls(id, name, cadence, _parse_date(start), project, tags, owner, scheduled, done, days_late)
+
+
+class _MemoryTaskInstance(object):
+    __slots__ = ('id', 'task', 'date', 'done')
+
+    def __init__(self, id, task, date, done=False):
+        self.id = id
+        self.task = task
+        self.date = date
+        self.done = done
+
+    def to_json(self):
+        return [self.id, self.task, self.date.isoformat(), self.done]
+
+    @classmethod
+    def from_json(cls, row):
+        id, task, ti_date, done = row
+        return cls(id, task, _parse_date(ti_date), done)
+
+
+class MemoryStore(object):
+    """
+    Tasks and task instances held in memory, indexed for what Tasker needs to answer quickly:
+
+        - The latest task instance of each task, which is all scheduling needs to look at.
+        - The pending task instances, kept sorted by date and id, so listing them is a walk through a list.
+        - The number of pending task instances of each owner.
+
+    With a path, every change is also appended to a log next to it, as a line of JSON, and the whole store is written
+    out as a snapshot after every snapshot_interval changes, which empties the log. Opening the store again loads the
+    snapshot, and replays the changes logged since. Each change is numbered, and a snapshot records the number of the
+    last change it includes, so changes already in the snapshot are skipped if the process stopped before the log
+    could be emptied.
+    """
+    def __init__(self, path=None, snapshot_interval=1000):
+        """
+        :param path: Optional path to the snapshot. The log is kept at the same path, with ".log" appended. Both are
+            created as needed. Without a path, nothing is persisted.
+        :param snapshot_interval: Number of changes to log before writing a new snapshot.
+        """
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+
+        self.tasks = {}
+        self.task_ids_by_name = {}
+        self.task_instances = {}
+        self.latest_task_instances = {}
+        self.pending = []
+        self.pending_counts = Counter()
+
+        self.seq = 0
+        self._next_task_id = 1
+        self._next_ti_id = 1
+        self._logged = 0
+        self._log = None
+
+        if path is not None:
+            self._load()
+            self._log = open(self.log_path, 'a')
+
+    @property
+    def log_path(self):
+        return '{}.log'.format(self.path)
+
+    def add_task(self, name, cadence, start_date, project, tags, owner):
+        """
+        Add a task, returning its id.
+        """
+        task_id = self._next_task_id
+        self._change('create', task_id, name, cadence, start_date.isoformat(), project, tags, owner)
+        return task_id
+
+    def add_task_instance(self, task_id, ti_date):
+        """
+        Add a pending task instance of a task, returning its id.
+        """
+        ti_id = self._next_ti_id
+        self._change('schedule', ti_id, task_id, ti_date.isoformat())
+        return ti_id
+
+    def complete_task_instance(self, ti_id, days_late):
+        """
+        Set a pending task instance to be "done", counting how many days late it was in its task's statistics.
+        """
+        self._change('complete', ti_id, days_late)
+
+    def _change(self, *change):
+        """
+        Log a change, and apply it. Writes a snapshot once enough changes have been logged since the last one.
+        """
+        change = [self.seq + 1] + list(change)
+
+        if self._log is not None:
+            self._log.write(json.dumps(change))
+            self._log.write('\n')
+            self._log.flush()
+            self._logged += 1
+
+        self._apply(change)
+
+        if self._log is not None and self._logged >= self.snapshot_interval:
+            self.snapshot()
+
+    def _apply(self, change):
+        kind = change[1]
+        if kind == 'create':
+            _, _, task_id, name, cadence, start, project, tags, owner = change
+            self._add_task(_MemoryTask(task_id, name, cadence, _parse_date(start), project, tags, owner))
+        elif kind == 'schedule':
+            _, _, ti_id, task_id, ti_date = change
+            task = self.tasks[task_id]
+            task.scheduled += 1
+            self._add_task_instance(_MemoryTaskInstance(ti_id, task_id, _parse_date(ti_date)))
+        elif kind == 'complete':
+            _, _, ti_id, days_late = change
+            ti = self.task_instances[ti_id]
+            task = self.tasks[ti.task]
+            task.done += 1
+            task.days_late += days_late
+
+            ti.done = True
+            del self.pending[bisect.bisect_left(self.pending, (ti.date, ti.id))]
+            self.pending_counts[task.owner] -= 1
+
+        self.seq = change[0]
+
+    def _add_task(self, task):
+        self.tasks[task.id] = task
+        self.task_ids_by_name.setdefault(task.name, []).append(task.id)
+        self._next_task_id = max(self._next_task_id, task.id + 1)
+
+    def _add_task_instance(self, ti):
+        self.task_instances[ti.id] = ti
+        self._next_ti_id = max(self._next_ti_id, ti.id + 1)
+
+        # Task instances of a task are always added in date order, so the last one added is the latest.
+        self.latest_task_instances[ti.task] = ti.id
+        if not ti.done:
+            bisect.insort(self.pending, (ti.date, ti.id))
+            self.pending_counts[self.tasks[ti.task].owner] += 1
+
+    def snapshot(self):
+        """
+        Write every task and task instance to the snapshot, and empty the log. The snapshot is written next to its
+        path, and only moved into place once it's complete.
+        """
+        if self.path is None:
+            return
+
+        temp_path = '{}.tmp'.format(self.path)
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'seq': self.seq,
+                'tasks': [task.to_json() for _, task in sorted(self.tasks.iteritems())],
+                'task_instances': [ti.to_json() for _, ti in sorted(self.task_instances.iteritems())]
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_path, self.path)
+
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.log_path, 'w')
+        self._logged = 0
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            snapshot = {'seq': 0, 'tasks': [], 'task_instances': []}
+
+        for row in snapshot['tasks']:
+            self._add_task(_MemoryTask.from_json(row))
+        for row in snapshot['task_instances']:
+            self._add_task_instance(_MemoryTaskInstance.from_json(row))
+        self.seq = snapshot['seq']
+
+        try:
+            with open(self.log_path) as f:
+                contents = f.read()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            contents = ''
+
+        # A line without a trailing newline was still being written when the process stopped, so it's dropped. It's cut
+        # from the log too, so that the next change isn't appended to it.
+        lines = contents.split('\n')
+        if lines[-1]:
+            with open(self.log_path, 'r+') as f:
+                f.truncate(len(contents) - len(lines[-1]))
+
+        for line in lines[:-1]:
+            change = json.loads(line)
+            if change[0] > self.seq:
+                self._apply(change)
+                self._logged += 1
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class MemoryTasker(object):
+    """
+    Manages recurring tasks kept in a MemoryStore, for uses that can't afford a database query per operation. Behaves
+    the same as Tasker, for everything but journals, synchronizing, and dependencies, which it doesn't support.
+    """
+    def __init__(self, store, owner=None, hooks=None):
+        """
+        :param store: The MemoryStore holding the tasks. Several MemoryTaskers can share a store.
+        :param owner: Optional owner to scope this MemoryTasker to, as with Tasker.
+        :param hooks: Optional HookPipeline, given an event for each task instance scheduled or completed.
+        """
+        self.store = store
+        self.owner = owner
+        self.hooks = hooks
+
+    def _owns(self, task):
+        return self.owner is None or task.owner == self.owner
+
+    def _matches(self, task, tag=None, project=None):
+        return self._owns(task) and \
+            (project is None or task.project == project) and \
+            (tag is None or tag in task.tags)
+
+    def _emit(self, events):
+        if self.hooks:
+            for event in events:
+                self.hooks.emit(event)
+
+    def assert_cadence_valid(self, cadence):
+        """
+        Ensure that the provided cadence exists in the set of supported cadences.
+
+        :raises InvalidCadenceException: If the cadence is not present in the list of available/configured cadences.
+        """
+        try:
+            IntervalFactory.get(cadence)
+        except UnsupportedIntervalException:
+            raise InvalidCadenceException('Cadence {} not available.'.format(cadence))
+
+    def assert_name_unique(self, name):
+        """
+        Ensure that a task by this name doesn't already exist in the tasks list (of this MemoryTasker's owner, if it
+        has one).
+
+        :raises DuplicateNameException: When a task with this name already exists.
+        """
+        for task_id in self.store.task_ids_by_name.get(name, []):
+            if self._owns(self.store.tasks[task_id]):
+                raise DuplicateNameException('Task "{}" already exists.'.format(name))
+
+    def assert_start_date_valid(self, cadence, start_date):
+        """
+        Ensure that the date provided makes sense for the cadence it should run at.
+
+        :raises InvalidStartDateException: When a start date and cadence could cause tasks to skip instances.
+        """
+        if not IntervalFactory.get(cadence).is_compatible(start_date):
+            raise InvalidStartDateException(
+                'Cadence {} and start date: {} could lose task instances.'.format(cadence, start_date)
+            )
+
+    def create_task(self, name, cadence, start_date, project=None, tags=None):
+        """
+        Create a task that will be used to derive task instances.
+
+        :param name: The name of the task.
+        :param cadence: How often this task will schedule itself to create task instances.
+        :param start_date: The date for which the first task instance should create itself.
+        :param project: Optional project the task belongs to.
+        :param tags: Optional iterable of tags to attach to the task.
+        """
+        self.assert_cadence_valid(cadence)
+        self.assert_start_date_valid(cadence, start_date)
+        self.assert_name_unique(name)
+
+        self.store.add_task(name, cadence, start_date, project, sorted(set(tags or [])), self.owner)
+
+    def search(self, query, tag=None, project=None):
+        """
+        Returns a list of named tuples (id, name, cadence, start) of the tasks whose names contain every word in the
+        query, matching words by prefix. Ordered by name.
+
+        :param query: Words to search for.
+        :param tag: Only include tasks carrying this tag.
+        :param project: Only include tasks belonging to this project.
+        """
+        words = [word.lower() for word in re.findall(r'\w+', query, re.UNICODE)]
+        if not words:
+            return []
+
+        matches = []
+        for task in self.store.tasks.itervalues():
+            name_words = re.findall(r'\w+', task.name.lower(), re.UNICODE)
+            if self._matches(task, tag, project) and all(any(w.startswith(word) for w in name_words) for word in words):
+                matches.append(TaskMatch(task.id, task.name, task.cadence, task.start))
+
+        return sorted(matches, key=lambda match: (match.name, match.id))
+
+    def get_task_schedules(self, task_ids=None, min_task_id=None):
+        """
+        Returns a list of named tuples (id, name, cadence, start, ti_id, date, done, owner) of tasks, along with their
+        most recently scheduled task instance, if any. Sorted by task id ascending.
+
+        :param task_ids: Only include these tasks.
+        :param min_task_id: Only include tasks with ids greater than or equal to this one.
+        """
+        task_ids = sorted(self.store.tasks if task_ids is None else set(task_ids).intersection(self.store.tasks))
+
+        schedules = []
+        for task_id in task_ids:
+            task = self.store.tasks[task_id]
+            if not self._owns(task) or (min_task_id is not None and task_id < min_task_id):
+                continue
+
+            ti = self.store.task_instances.get(self.store.latest_task_instances.get(task_id))
+            schedules.append(TaskSchedule(
+                task.id, task.name, task.cadence, task.start, ti and ti.id, ti and ti.date, ti and ti.done, task.owner
+            ))
+
+        return schedules
+
+    def get_next_date(self, task_schedule):
+        """
+        Returns the date that the next task instance of a task should be scheduled on, or None if it's waiting on its
+        latest task instance to be completed, or will never be scheduled again.
+
+        :param task_schedule: A row returned from get_task_schedules.
+        """
+        if task_schedule.done is False:
+            return None
+        if not task_schedule.date:
+            return task_schedule.start
+
+        next_date = IntervalFactory.get(task_schedule.cadence).next_interval(task_schedule.date)
+        if next_date == task_schedule.date:
+            return None
+
+        return next_date
+
+    def schedule_tasks(self, until_date=None, task_ids=None):
+        """
+        Ensure that every task that could be scheduled on or before today's date has a task instance on the earliest of
+        its possible dates, as Tasker.schedule_tasks.
+
+        :param until_date: Schedule task instances up to and including this date. Defaults to today.
+        :param task_ids: Only schedule these tasks.
+        :returns: A list of named tuples (id, name, date, done) of the task instances that were scheduled.
+        """
+        if not until_date:
+            until_date = date.today()
+
+        scheduled = []
+        for row in self.get_task_schedules(task_ids=task_ids):
+            next_date = self.get_next_date(row)
+            if next_date is None or next_date > until_date:
+                continue
+
+            ti_id = self.store.add_task_instance(row.id, next_date)
+            scheduled.append(HookEvent(HookEvents.SCHEDULED, ti_id, row.name, next_date, row.owner))
+
+        self._emit(scheduled)
+        return [ScheduledTaskInstance(event.id, event.name, event.date, False) for event in scheduled]
+
+    def get_done_task_instance_ids(self, ti_ids):
+        """
+        Returns the sorted list of ids from the ones provided that belong to task instances that are done.
+
+        :param ti_ids: Ids of the task instances to check.
+        """
+        task_instances = self.store.task_instances
+        return sorted(set(ti_id for ti_id in ti_ids if ti_id in task_instances and task_instances[ti_id].done))
+
+    def complete_task_instance(self, ti_id, tag=None, project=None):
+        """
+        Set the provided task instance to be "done"
+
+        :param ti_id: The id for the task instance.
+        :param tag: Only complete the task instance if its task carries this tag.
+        :param project: Only complete the task instance if its task belongs to this project.
+        """
+        # An id that isn't a number can't match a task instance, as with Tasker.
+        try:
+            ti = self.store.task_instances.get(int(ti_id))
+        except (TypeError, ValueError):
+            return
+
+        if ti is None or ti.done:
+            return
+
+        task = self.store.tasks[ti.task]
+        if not self._matches(task, tag, project):
+            return
+
+        self.store.complete_task_instance(ti.id, max(0, (date.today() - ti.date).days))
+        self._emit([HookEvent(HookEvents.COMPLETED, ti.id, task.name, ti.date, task.owner)])
+
+    def get_statistics(self, by_cadence=False):
+        """
+        Returns a list of named tuples (id, name, cadence, scheduled, done, days_late) of the statistics of each task
+        (of this MemoryTasker's owner, if it has one), sorted by task id.
+
+        :param by_cadence: Instead aggregate the statistics of all tasks sharing a cadence, returning named tuples
+            (cadence, scheduled, done, days_late) sorted by cadence.
+        """
+        tasks = [task for _, task in sorted(self.store.tasks.iteritems()) if self._owns(task)]
+        if not by_cadence:
+            return [
+                TaskStatisticsRow(task.id, task.name, task.cadence, task.scheduled, task.done, task.days_late)
+                for task in tasks
+            ]
+
+        by_cadence = {}
+        for task in tasks:
+            scheduled, done, days_late = by_cadence.get(task.cadence, (0, 0, 0))
+            by_cadence[task.cadence] = (scheduled + task.scheduled, done + task.done, days_late + task.days_late)
+
+        return [CadenceStatisticsRow(cadence, *by_cadence[cadence]) for cadence in sorted(by_cadence)]
+
+    def pending_count(self):
+        """
+        Returns the number of task instances still pending (of this MemoryTasker's owner, if it has one).
+        """
+        if self.owner is not None:
+            return self.store.pending_counts[self.owner]
+        return sum(self.store.pending_counts.itervalues())
+
+    def get_incomplete_task_instances(self, tag=None, project=None):
+        """
+        Returns a list of named tuples (id, name, date, done) of the task instances that are still pending. Sorted by
+        scheduled date ascending.
+
+        :param tag: Only include task instances of tasks carrying this tag.
+        :param project: Only include task instances of tasks belonging to this project.
+        """
+        return list(self.iter_incomplete_task_instances(tag=tag, project=project))
+
+    def iter_incomplete_task_instances(self, tag=None, project=None, batch_size=1000):
+        """
+        Generates the same task instances as get_incomplete_task_instances. Task instances completed while generating
+        them are still generated.
+
+        :param tag: Only include task instances of tasks carrying this tag.
+        :param project: Only include task instances of tasks belonging to this project.
+        :param batch_size: Accepted for compatibility with Tasker; the pending index is read directly.
+        """
+        tasks = self.store.tasks
+        task_instances = self.store.task_instances
+
+        # A copy of the index, so that completing task instances while generating them doesn't skip any.
+        for ti_date, ti_id in list(self.store.pending):
+            task = tasks[task_instances[ti_id].task]
+            if self._matches(task, tag, project):
+                yield ScheduledTaskInstance(ti_id, task.name, ti_date, False)
@@ -1,5 +1,18 @@
 from base import Base
+from change import Change
+from pending_count import PendingCount, count_pending_task_instances
+from replica import Replica
+from replica_owner import ReplicaOwner
 from task import Task
+from task_dependency import TaskDependency
 from task_instance import TaskInstance
+from task_instance_block import TaskInstanceBlock
+from task_search import TASK_SEARCH_TABLE, has_search_index, task_search
+from task_statistics import TaskStatistics
+from task_tag import TaskTag
 
-__all__ = ['Base', 'Task', 'TaskInstance']
+__all__ = [
+    'Base', 'Change', 'PendingCount', 'Replica', 'ReplicaOwner', 'Task', 'TaskDependency', 'TaskInstance',
+    'TaskInstanceBlock', 'TaskStatistics', 'TaskTag', 'TASK_SEARCH_TABLE', 'count_pending_task_instances',
+    'has_search_index', 'task_search'
+]
@@ -0,0 +1,25 @@
+from sqlalchemy.schema import Column
+from sqlalchemy.types import Date, Integer, String, Text
+
+from base import Base
+
+
+class Change(Base):
+    """
+    Entry in the log of changes made to a database, used to synchronize databases with each other.
+
+    Ids differ between databases, so tasks are identified by name, and task instances by their task's name and date.
+    """
+    __tablename__ = 'changes'
+
+    CREATE = 'create'
+    SCHEDULE = 'schedule'
+    COMPLETE = 'complete'
+
+    seq = Column(Integer, primary_key=True)
+    origin = Column(String(32), nullable=False)
+    kind = Column(String(16), nullable=False)
+    task = Column(String(1024), nullable=False)
+    date = Column(Date, nullable=True)
+    data = Column(Text, nullable=True)
+    owner = Column(String(256), nullable=True)
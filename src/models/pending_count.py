@@ -0,0 +1,41 @@
+from sqlalchemy import event, func, select
+from sqlalchemy.schema import Column
+from sqlalchemy.types import Integer, String
+
+from base import Base
+from task_instance import TaskInstance
+
+
+class PendingCount(Base):
+    """
+    Number of task instances still pending for each owner, maintained as task instances are scheduled and completed,
+    so that it can be read without scanning them. Task instances without an owner are counted under ''.
+    """
+    __tablename__ = 'pendingcounts'
+
+    owner = Column(String(256), primary_key=True)
+    pending = Column(Integer, nullable=False, default=0)
+
+
+def count_pending_task_instances():
+    """
+    Returns a select of (owner, pending) rows counting the pending task instances of each owner, as they're stored in
+    the pendingcounts table.
+    """
+    owner = func.coalesce(TaskInstance.owner, '')
+    return select([owner, func.count()]).where(TaskInstance.done == False).group_by(owner)  # noqa: E712
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def initialize_pending_counts(target, connection, **kw):
+    """
+    Count the pending task instances of databases created before the counts were kept, the next time they're opened.
+    Once there are any pending task instances, there's always at least one count, so an empty table means that it
+    still needs to be filled in.
+    """
+    if connection.execute(select([PendingCount.owner]).limit(1)).first() is not None:
+        return
+
+    connection.execute(
+        PendingCount.__table__.insert().from_select(['owner', 'pending'], count_pending_task_instances())
+    )
@@ -0,0 +1,16 @@
+from sqlalchemy.schema import Column
+from sqlalchemy.types import Boolean, Integer, String
+
+from base import Base
+
+
+class Replica(Base):
+    """
+    A database taking part in synchronization. The local database has a row identifying itself, and every database it
+    has synchronized with has a row recording the last of its changes that have been applied here.
+    """
+    __tablename__ = 'replicas'
+
+    id = Column(String(32), primary_key=True)
+    local = Column(Boolean, nullable=False, default=False)
+    synced_seq = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,16 @@
+from sqlalchemy.schema import Column
+from sqlalchemy.types import Integer, String
+
+from base import Base
+
+
+class ReplicaOwner(Base):
+    """
+    The last change from another database applied here by a synchronization scoped to one owner. Changes to other
+    owners' tasks aren't transferred then, so the replica's own watermark can't move, but this owner's can.
+    """
+    __tablename__ = 'replicaowners'
+
+    replica = Column(String(32), primary_key=True)
+    owner = Column(String(256), primary_key=True)
+    synced_seq = Column(Integer, nullable=False, default=0)
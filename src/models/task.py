@@ -1,4 +1,4 @@
-from sqlalchemy.schema import Column
+from sqlalchemy.schema import Column, Index
 from sqlalchemy.types import Date, Integer, String
 
 from base import Base
@@ -6,8 +6,15 @@ from base import Base
 
 class Task(Base):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # MySQL can't index the full width of the name column, but a prefix is plenty for equality and prefix matches.
+        Index('ix_tasks_name', 'name', mysql_length=255),
+        Index('ix_tasks_owner_name', 'owner', 'name', mysql_length={'name': 255}),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(1024), nullable=False)
     cadence = Column(String(256), nullable=False)
     start = Column(Date, nullable=False)
+    project = Column(String(256), nullable=True, index=True)
+    owner = Column(String(256), nullable=True)
@@ -0,0 +1,20 @@
+from sqlalchemy.schema import Column, ForeignKey, Index
+from sqlalchemy.types import Integer
+
+from base import Base
+
+
+class TaskDependency(Base):
+    """
+    A task whose task instances have to wait for the task instances of another task, scheduled on or before the same
+    date, to be done.
+    """
+    __tablename__ = 'taskdependencies'
+    # The primary key covers looking up what a task depends on; the secondary index covers looking up the tasks that
+    # depend on a task.
+    __table_args__ = (
+        Index('ix_taskdependencies_depends_on', 'depends_on'),
+    )
+
+    task = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
+    depends_on = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
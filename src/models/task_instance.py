@@ -1,13 +1,21 @@
-from sqlalchemy.schema import Column, ForeignKey
-from sqlalchemy.types import Boolean, Date, Integer
+from sqlalchemy.schema import Column, ForeignKey, Index
+from sqlalchemy.types import Boolean, Date, Integer, String
 
 from base import Base
 
 
 class TaskInstance(Base):
     __tablename__ = 'taskinstances'
+    __table_args__ = (
+        Index('ix_taskinstances_task_date', 'task', 'date'),
+        Index('ix_taskinstances_done_date', 'done', 'date'),
+        # Copied from the task, so that an owner's scheduling and listing queries only scan that owner's rows.
+        Index('ix_taskinstances_owner_task_date', 'owner', 'task', 'date'),
+        Index('ix_taskinstances_owner_done_date', 'owner', 'done', 'date'),
+    )
 
     id = Column(Integer, primary_key=True)
     task = Column(Integer, ForeignKey("tasks.id"), nullable=False)
     date = Column(Date, nullable=False)
     done = Column(Boolean, default=False)
+    owner = Column(String(256), nullable=True)
@@ -0,0 +1,19 @@
+from sqlalchemy.schema import Column, ForeignKey, Index
+from sqlalchemy.types import Integer
+
+from base import Base
+
+
+class TaskInstanceBlock(Base):
+    """
+    A pending task instance that's waiting for another, pending task instance of a task it depends on. Maintained as
+    task instances are scheduled and completed, so that completing a task instance only has to look up the task
+    instances waiting for it, rather than re-evaluating every dependency.
+    """
+    __tablename__ = 'taskinstanceblocks'
+    __table_args__ = (
+        Index('ix_taskinstanceblocks_blocker', 'blocker'),
+    )
+
+    task_instance = Column(Integer, ForeignKey("taskinstances.id"), primary_key=True)
+    blocker = Column(Integer, ForeignKey("taskinstances.id"), primary_key=True)
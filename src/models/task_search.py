@@ -0,0 +1,68 @@
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import column, table
+
+from base import Base
+
+
+TASK_SEARCH_TABLE = 'tasks_fts'
+
+# Lightweight description of the FTS5 table for building queries. It isn't part of the declarative metadata, as it
+# only exists on SQLite, and is managed by create_search_index below.
+task_search = table(TASK_SEARCH_TABLE, column('rowid'), column('rank'))
+
+_CREATE_SEARCH_TABLE = (
+    "CREATE VIRTUAL TABLE {0} USING fts5(name, content='tasks', content_rowid='id')".format(TASK_SEARCH_TABLE)
+)
+
+# External content tables don't update themselves, so these keep the index in sync with the tasks table.
+_CREATE_SEARCH_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS {0}_ai AFTER INSERT ON tasks BEGIN '
+    '  INSERT INTO {0}(rowid, name) VALUES (new.id, new.name); '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS {0}_ad AFTER DELETE ON tasks BEGIN '
+    "  INSERT INTO {0}({0}, rowid, name) VALUES ('delete', old.id, old.name); "
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS {0}_au AFTER UPDATE OF name ON tasks BEGIN '
+    "  INSERT INTO {0}({0}, rowid, name) VALUES ('delete', old.id, old.name); "
+    '  INSERT INTO {0}(rowid, name) VALUES (new.id, new.name); '
+    'END',
+)
+
+_REBUILD_SEARCH_TABLE = "INSERT INTO {0}({0}) VALUES ('rebuild')".format(TASK_SEARCH_TABLE)
+
+
+def has_search_index(connection):
+    """
+    Return true if the full-text search index over task names exists in the connected database.
+
+    :param connection: An SQLAlchemy connection.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+
+    return connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{}'".format(TASK_SEARCH_TABLE)
+    ).first() is not None
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def create_search_index(target, connection, **kw):
+    """
+    Create the FTS5 index over task names on SQLite databases.
+
+    This runs on every create_all, so that databases created before the index existed get one (and have it populated
+    from the existing tasks) the next time they're opened. SQLite builds without FTS5 are left alone, and searching
+    falls back to LIKE queries.
+    """
+    if connection.dialect.name != 'sqlite' or has_search_index(connection):
+        return
+
+    try:
+        connection.execute(_CREATE_SEARCH_TABLE)
+    except OperationalError:
+        return
+
+    for statement in _CREATE_SEARCH_TRIGGERS:
+        connection.execute(statement.format(TASK_SEARCH_TABLE))
+    connection.execute(_REBUILD_SEARCH_TABLE)
@@ -0,0 +1,44 @@
+from sqlalchemy import cast, event, func, literal, select
+from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.types import Integer
+
+from base import Base
+from task import Task
+from task_instance import TaskInstance
+
+
+class TaskStatistics(Base):
+    """
+    Rollup of a task's history, maintained as task instances are scheduled and completed, so that reports don't need
+    to scan every task instance.
+    """
+    __tablename__ = 'taskstatistics'
+
+    task = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
+    scheduled = Column(Integer, nullable=False, default=0)
+    done = Column(Integer, nullable=False, default=0)
+    days_late = Column(Integer, nullable=False, default=0)
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def initialize_task_statistics(target, connection, **kw):
+    """
+    Roll up the history of each task of databases created before the rollup was kept, the next time they're opened.
+    Every task has a rollup from when it's created, so an empty table along with any tasks means that it still needs
+    to be filled in. Task instances don't record when they were completed, so days late start out at 0.
+    """
+    if connection.execute(select([TaskStatistics.task]).limit(1)).first() is not None:
+        return
+    if connection.execute(select([Task.id]).limit(1)).first() is None:
+        return
+
+    history = select([
+        Task.id,
+        func.count(TaskInstance.id),
+        func.coalesce(func.sum(cast(TaskInstance.done, Integer)), 0),
+        literal(0)
+    ]).select_from(Task.__table__.outerjoin(TaskInstance.__table__, TaskInstance.task == Task.id)).group_by(Task.id)
+
+    connection.execute(
+        TaskStatistics.__table__.insert().from_select(['task', 'scheduled', 'done', 'days_late'], history)
+    )
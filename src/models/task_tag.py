@@ -0,0 +1,16 @@
+from sqlalchemy.schema import Column, ForeignKey, Index
+from sqlalchemy.types import Integer, String
+
+from base import Base
+
+
+class TaskTag(Base):
+    __tablename__ = 'tasktags'
+    # The primary key leads with the tag, so filtering by tag is an index range scan; the secondary index covers
+    # looking up the tags of a single task.
+    __table_args__ = (
+        Index('ix_tasktags_task', 'task'),
+    )
+
+    tag = Column(String(256), primary_key=True)
+    task = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
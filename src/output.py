@@ -0,0 +1,95 @@
+import json
+from datetime import date
+
+
+# Keys aren't sorted, as that rules out the much faster C encoder.
+_json_encoder = json.JSONEncoder()
+
+
+class OutputFormats(object):
+    TEXT = 'text'
+    JSON = 'json'
+    JSONL = 'jsonl'
+    TSV = 'tsv'
+
+    ALL = [TEXT, JSON, JSONL, TSV]
+
+
+class BufferedWriter(object):
+    """
+    Collects small writes and passes them on to a stream in large chunks, so that writing a long listing isn't a call
+    per line.
+    """
+    def __init__(self, stream, buffer_size=65536):
+        """
+        :param stream: File to write to.
+        :param buffer_size: Number of bytes to collect before writing them to the stream.
+        """
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self._chunks = []
+        self._size = 0
+
+    def write(self, data):
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._chunks:
+            self.stream.write(''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+        self.stream.flush()
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def _json_object(ti, fields):
+    return _json_encoder.encode(dict((field, _json_value(getattr(ti, field))) for field in fields))
+
+
+def _tsv_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+
+    # Escaped the same way as PostgreSQL's text format, so that every row stays on one line.
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def write_task_instances(task_instances, output_format, stream, fields=('id', 'name', 'date')):
+    """
+    Write task instances to a stream in a machine readable format, one at a time as they're generated:
+
+        - json: A single JSON array of objects.
+        - jsonl: A JSON object per line.
+        - tsv: A header line of field names, and a line of tab separated values per task instance.
+
+    :param task_instances: Iterable of named tuples of task instances.
+    :param output_format: One of OutputFormats.JSON, OutputFormats.JSONL, or OutputFormats.TSV.
+    :param stream: File to write to.
+    :param fields: Names of the fields of each task instance to write.
+    """
+    writer = BufferedWriter(stream)
+
+    if output_format == OutputFormats.TSV:
+        writer.write('\t'.join(fields) + '\n')
+        for ti in task_instances:
+            writer.write('\t'.join(_tsv_value(getattr(ti, field)) for field in fields) + '\n')
+    elif output_format == OutputFormats.JSONL:
+        for ti in task_instances:
+            writer.write(_json_object(ti, fields) + '\n')
+    else:
+        separator = '[\n'
+        for ti in task_instances:
+            writer.write(separator)
+            writer.write(_json_object(ti, fields))
+            separator = ',\n'
+        writer.write('[]\n' if separator == '[\n' else '\n]\n')
+
+    writer.flush()
@@ -0,0 +1,189 @@
+import heapq
+import os
+import zlib
+
+from sqlalchemy.engine.url import make_url
+
+from tasker import ScheduledTaskInstance, Tasker
+
+
+class ShardingException(Exception):
+    pass
+
+
+def shard_database_uris(database_uri, shards):
+    """
+    Returns the URIs of the files a sharded SQLite database is split across, named after the database's own file, so
+    that ~/.tasker.sqlite with 4 shards is kept in ~/.tasker-0.sqlite through ~/.tasker-3.sqlite.
+
+    :param database_uri: SQLAlchemy URI of an SQLite database file.
+    :param shards: Number of files to split the database across.
+    :raises ShardingException: When the URI isn't for an SQLite database file.
+    """
+    url = make_url(database_uri)
+    if url.get_backend_name() != 'sqlite' or not url.database:
+        raise ShardingException('Only SQLite database files can be sharded, not {}.'.format(database_uri))
+
+    root, extension = os.path.splitext(url.database)
+    uris = []
+    for shard in xrange(shards):
+        url.database = '{}-{}{}'.format(root, shard, extension)
+        uris.append(str(url))
+
+    return uris
+
+
+class _ShardHooks(object):
+    """
+    Passes the events of one shard on to a HookPipeline, with the ids of their task instances made global.
+    """
+    def __init__(self, hooks, sharded_tasker, shard):
+        self.hooks = hooks
+        self.sharded_tasker = sharded_tasker
+        self.shard = shard
+
+    def emit(self, event):
+        self.hooks.emit(event._replace(id=self.sharded_tasker.global_id(self.shard, event.id)))
+
+
+class ShardedTasker(object):
+    """
+    Manages recurring tasks split across several databases, so that writes to different tasks don't wait on a single
+    database's lock, which is what limits how often SQLite can be written to.
+
+    Each task, and all of its task instances, lives in a single shard, chosen by a hash of the task's name. Task
+    instance ids are made unique across shards by interleaving them: the task instance with id 3 in shard 1 of 4 has
+    id 3 * 4 + 1 = 13. Completing a task instance only touches the shard it's in, and listings merge the already sorted
+    rows of each shard.
+
+    Each shard is a complete tasker database. Task dependencies, the change log, and statistics are kept per shard, and
+    aren't available through this class.
+    """
+    def __init__(self, databases, owner=None, hooks=None):
+        """
+        :param databases: SQLAlchemy database sessions of the shards, always in the same order.
+        :param owner: Optional owner to scope every shard to, as with Tasker.
+        :param hooks: Optional HookPipeline, given an event for each task instance scheduled or completed, with its
+            global id.
+        """
+        if not databases:
+            raise ShardingException('A sharded database needs at least one shard.')
+
+        self.owner = owner
+        self.hooks = hooks
+        self.shards = [
+            Tasker(database, owner=owner, hooks=_ShardHooks(hooks, self, i) if hooks else None)
+            for i, database in enumerate(databases)
+        ]
+
+    def global_id(self, shard, ti_id):
+        """
+        Returns the id unique across shards of a task instance, from its shard and its id within the shard.
+        """
+        return ti_id * len(self.shards) + shard
+
+    def local_id(self, ti_id):
+        """
+        Returns a tuple (shard, id within the shard) of a task instance, from its id unique across shards.
+        """
+        ti_id = int(ti_id)
+        return ti_id % len(self.shards), ti_id // len(self.shards)
+
+    def shard_for_name(self, name):
+        """
+        Returns the index of the shard that the task with this name is kept in.
+        """
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+
+        # crc32 rather than hash(), as it has to give the same shard in every process and on every platform.
+        return (zlib.crc32(name) & 0xffffffff) % len(self.shards)
+
+    def _globalize(self, shard, task_instance):
+        return ScheduledTaskInstance(
+            self.global_id(shard, task_instance.id), task_instance.name, task_instance.date, task_instance.done
+        )
+
+    def assert_cadence_valid(self, cadence):
+        self.shards[0].assert_cadence_valid(cadence)
+
+    def assert_name_unique(self, name):
+        self.shards[self.shard_for_name(name)].assert_name_unique(name)
+
+    def assert_start_date_valid(self, cadence, start_date):
+        self.shards[0].assert_start_date_valid(cadence, start_date)
+
+    def create_task(self, name, cadence, start_date, project=None, tags=None):
+        """
+        Create a task in the shard its name belongs to. Names are unique across shards, as a name always belongs to
+        the same shard.
+        """
+        self.shards[self.shard_for_name(name)].create_task(name, cadence, start_date, project=project, tags=tags)
+
+    def schedule_tasks(self, until_date=None):
+        """
+        Schedule the tasks of every shard, as Tasker.schedule_tasks.
+
+        :returns: A list of named tuples (id, name, date, done) of the task instances that were scheduled, with global
+            ids, sorted by date and id.
+        """
+        scheduled = [
+            self._globalize(i, ti) for i, tasker in enumerate(self.shards) for ti in tasker.schedule_tasks(until_date)
+        ]
+        return sorted(scheduled, key=lambda ti: (ti.date, ti.id))
+
+    def complete_task_instance(self, ti_id, tag=None, project=None):
+        """
+        Set the task instance with this global id to be "done", only touching the shard it's in.
+        """
+        # An id that isn't a number can't match a task instance, as with Tasker.
+        try:
+            shard, local_ti_id = self.local_id(ti_id)
+        except (TypeError, ValueError):
+            return
+
+        self.shards[shard].complete_task_instance(local_ti_id, tag=tag, project=project)
+
+    def get_done_task_instance_ids(self, ti_ids):
+        """
+        Returns the sorted list of global ids from the ones provided that belong to task instances that are done.
+        """
+        by_shard = {}
+        for ti_id in ti_ids:
+            shard, local_ti_id = self.local_id(ti_id)
+            by_shard.setdefault(shard, []).append(local_ti_id)
+
+        return sorted(
+            self.global_id(shard, local_ti_id)
+            for shard, local_ti_ids in by_shard.iteritems()
+            for local_ti_id in self.shards[shard].get_done_task_instance_ids(local_ti_ids)
+        )
+
+    def pending_count(self):
+        return sum(tasker.pending_count() for tasker in self.shards)
+
+    def get_incomplete_task_instances(self, tag=None, project=None):
+        """
+        Returns a list of named tuples (id, name, date, done) of the task instances still pending in every shard, with
+        global ids. Sorted by scheduled date ascending, and by shard within a date.
+        """
+        return list(self._merge([tasker.get_incomplete_task_instances(tag, project) for tasker in self.shards]))
+
+    def iter_incomplete_task_instances(self, tag=None, project=None, batch_size=1000):
+        """
+        Generates the same task instances as get_incomplete_task_instances, reading a batch at a time from each shard.
+        """
+        return self._merge([
+            tasker.iter_incomplete_task_instances(tag, project, batch_size=batch_size) for tasker in self.shards
+        ])
+
+    def _merge(self, shard_task_instances):
+        # Each shard's rows are already sorted by date, so a k-way merge is enough to sort them all, and only needs a
+        # row from each shard at a time.
+        def decorate(shard, task_instances):
+            for j, ti in enumerate(task_instances):
+                yield ti.date, shard, j, ti
+
+        merged = heapq.merge(*[decorate(i, tis) for i, tis in enumerate(shard_task_instances)])
+        for _, shard, _, ti in merged:
+            yield self._globalize(shard, ti)
@@ -0,0 +1,41 @@
+def _pull(destination, source):
+    """
+    Apply the changes made in one database since it was last synchronized with another, to that other database.
+
+    :returns: The number of changes that had an effect.
+    """
+    owners = set(tasker.owner for tasker in (destination, source) if tasker.owner is not None)
+    if len(owners) > 1:
+        # Scoped to different owners, neither side's changes are of interest to the other.
+        return 0
+
+    # When either side is scoped to an owner, only that owner's changes are transferred, so the watermark is kept for
+    # that owner alone.
+    owner = owners.pop() if owners else None
+    synced_seq = destination.get_synced_seq(source.replica_id, owner=owner)
+
+    # Read the end of the log before the changes, so that changes logged in between are left for the next sync, rather
+    # than skipped.
+    last_seq = source.get_last_change_seq()
+    changes = source.get_changes(
+        after_seq=synced_seq, until_seq=last_seq, exclude_origin=destination.replica_id, owner=owner
+    )
+
+    return destination.apply_changes(changes, source.replica_id, last_seq, owner=owner)
+
+
+def synchronize(local, remote):
+    """
+    Exchange changes between two databases, in both directions. Only the changes logged in each database since the
+    last time they synchronized are transferred, and changes are never sent back to the database they came from.
+
+    When either Tasker is scoped to an owner, only that owner's changes are exchanged.
+
+    :param local: Tasker of one of the databases.
+    :param remote: Tasker of the other database.
+    :returns: Tuple of the number of changes that had an effect on the local database, and on the remote database.
+    """
+    received = _pull(local, remote)
+    sent = _pull(remote, local)
+
+    return received, sent
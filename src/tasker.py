@@ -1,11 +1,27 @@
-from datetime import date
+import json
+import re
+from collections import Counter, OrderedDict, namedtuple
+from datetime import date, datetime
+from uuid import uuid4
 
-from sqlalchemy import func
-from sqlalchemy.types import Boolean
-from sqlalchemy.sql.expression import and_, literal_column
+from sqlalchemy import func, select
+from sqlalchemy.ext import baked
+from sqlalchemy.orm import aliased
+from sqlalchemy.types import Boolean, Integer, String
+from sqlalchemy.sql.expression import and_, bindparam, case, cast, exists, literal, literal_column, or_, text
+from sqlalchemy.sql.expression import type_coerce
+from sqlalchemy.util import LRUCache
 
+from export import load_numpy, read_columns
+from hooks import HookEvent, HookEvents
 from intervals.interval_factory import IntervalFactory, UnsupportedIntervalException
-from models import Task, TaskInstance
+from models import Change, PendingCount, Replica, ReplicaOwner, Task, TaskDependency, TaskInstance, TaskInstanceBlock
+from models import TaskStatistics, TaskTag
+from models import TASK_SEARCH_TABLE, count_pending_task_instances, has_search_index, task_search
+
+
+ScheduledTaskInstance = namedtuple('ScheduledTaskInstance', ['id', 'name', 'date', 'done'])
+ChangeRecord = namedtuple('ChangeRecord', ['seq', 'origin', 'kind', 'task', 'date', 'data', 'owner'])
 
 
 class TaskerException(Exception):
@@ -24,15 +40,134 @@ class InvalidCadenceException(TaskerException):
     pass
 
 
+class UnknownTaskException(TaskerException):
+    pass
+
+
+class DependencyCycleException(TaskerException):
+    pass
+
+
+# The queries run on every check and completion are built and compiled once, and reused with new parameters. Baked
+# queries cache ORM queries, and the compiled cache does the same for Core statements. Both are keyed by dialect, so
+# they're safe to share between databases.
+_bakery = baked.bakery()
+_compiled_cache = LRUCache(100)
+
+_UPDATE_STATISTICS = TaskStatistics.__table__.update() \
+    .where(TaskStatistics.task == bindparam('task_id')) \
+    .values(scheduled=TaskStatistics.scheduled + bindparam('add_scheduled'),
+            done=TaskStatistics.done + bindparam('add_done'),
+            days_late=TaskStatistics.days_late + bindparam('add_days_late'))
+_UPDATE_PENDING_COUNT = PendingCount.__table__.update() \
+    .where(PendingCount.owner == bindparam('owner_key')) \
+    .values(pending=PendingCount.pending + bindparam('add_pending'))
+_COMPLETE_TASK_INSTANCE = TaskInstance.__table__.update() \
+    .where(and_(TaskInstance.id == bindparam('ti_id'), TaskInstance.done == False)) \
+    .values(done=True)  # noqa: E712
+_UNBLOCK_TASK_INSTANCES = TaskInstanceBlock.__table__.delete() \
+    .where(TaskInstanceBlock.blocker == bindparam('ti_id'))
+_CLEAR_TASK_INSTANCE_BLOCKS = TaskInstanceBlock.__table__.delete() \
+    .where(TaskInstanceBlock.task_instance == bindparam('ti_id'))
+
+
+def _filter_tasks(query, tag=False, project=False, owner=False):
+    """
+    Restrict a query that already includes the tasks table to the tasks matching a tag, project, and/or owner, given
+    as the "tag", "project", and "owner" bound parameters.
+
+    :param query: The query to filter.
+    :param tag: Only include tasks carrying the tag.
+    :param project: Only include tasks belonging to the project.
+    :param owner: Only include tasks belonging to the owner.
+    """
+    if owner:
+        query = query.filter(Task.owner == bindparam('owner'))
+    if project:
+        query = query.filter(Task.project == bindparam('project'))
+    if tag:
+        query = query.join(TaskTag, and_(TaskTag.task == Task.id, TaskTag.tag == bindparam('tag')))
+
+    return query
+
+
+def _task_schedules_query(session, owner=False, min_task_id=False, task_ids=None):
+    """
+    Query for each task along with its latest task instance, optionally restricted to the owner from the "owner" bound
+    parameter, and to task ids from the "min_task_id" bound parameter.
+    """
+    max_ti_dates = session.query(TaskInstance.task, func.max(TaskInstance.date).label('date'))
+    scheduleable = session.query(Task.id, Task.name, Task.cadence, Task.start)
+
+    if owner:
+        max_ti_dates = max_ti_dates.filter(TaskInstance.owner == bindparam('owner'))
+        scheduleable = scheduleable.filter(Task.owner == bindparam('owner'))
+    if task_ids is not None:
+        max_ti_dates = max_ti_dates.filter(TaskInstance.task.in_(task_ids))
+        scheduleable = scheduleable.filter(Task.id.in_(task_ids))
+    if min_task_id:
+        max_ti_dates = max_ti_dates.filter(TaskInstance.task >= bindparam('min_task_id'))
+        scheduleable = scheduleable.filter(Task.id >= bindparam('min_task_id'))
+
+    max_ti_dates = max_ti_dates \
+        .group_by(TaskInstance.task) \
+        .subquery()
+    latest_tis = session \
+        .query(TaskInstance) \
+        .join(max_ti_dates, and_(
+            TaskInstance.task == max_ti_dates.c.task,
+            TaskInstance.date == max_ti_dates.c.date
+        )).subquery()
+
+    return scheduleable \
+        .add_columns(latest_tis.c.id.label('ti_id'),
+                     latest_tis.c.date,
+                     latest_tis.c.done,
+                     Task.owner) \
+        .outerjoin(latest_tis, Task.id == latest_tis.c.task) \
+        .order_by(Task.id)
+
+
+def _pending_task_instances_query(session, owner=False):
+    query = session \
+        .query(TaskInstance.id, TaskInstance.task, TaskInstance.date, Task.name, TaskInstance.owner) \
+        .join(Task, Task.id == TaskInstance.task) \
+        .filter(TaskInstance.done == False)  # noqa: E712
+
+    return query.filter(TaskInstance.owner == bindparam('owner')) if owner else query
+
+
+def _incomplete_task_instances_query(session, owner=False):
+    query = session \
+        .query(TaskInstance.id, Task.name, TaskInstance.date, literal_column('0', Boolean).label('done')) \
+        .join(Task, Task.id == TaskInstance.task) \
+        .filter(TaskInstance.done == False) \
+        .filter(~exists().where(TaskInstanceBlock.task_instance == TaskInstance.id))  # noqa: E712
+
+    return query.filter(TaskInstance.owner == bindparam('owner')) if owner else query
+
+
 class Tasker(object):
     """
     Class that manages recurring tasks in an SQLAlchemy managed database.
     """
-    def __init__(self, database):
+    def __init__(self, database, journal=None, owner=None, hooks=None):
         """
         :param database: An SQLAlchemy database session.
+        :param journal: Optional CompletionJournal. When provided, completed task instances are appended to it rather
+            than written to the database, until the journal is flushed.
+        :param owner: Optional owner to scope this Tasker to, in databases shared by several people. Tasks are created
+            for this owner, and only this owner's tasks are scheduled, listed, and completed. Without one, tasks are
+            created without an owner, and every task in the database is managed.
+        :param hooks: Optional HookPipeline, given an event for each task instance scheduled or completed, once it's
+            committed.
         """
         self.db = database
+        self.journal = journal
+        self.owner = owner
+        self.hooks = hooks
+        self._search_index = None
+        self._replica_id = None
 
     def _get_next_date(self, cadence, start_date, last_date):
         """
@@ -47,6 +182,150 @@ class Tasker(object):
 
         return IntervalFactory.get(cadence).next_interval(last_date)
 
+    @property
+    def _cache_statements(self):
+        # Session has this flag from SQLAlchemy 1.2 onwards; it can be set on sessions from older versions, too.
+        return getattr(self.db, 'enable_baked_queries', True)
+
+    def _baked(self, initial_fn, *args):
+        """
+        Returns a baked query, which is only cached if the session allows it.
+
+        :param initial_fn: Callable given the session, returning the query.
+        :param args: Values that initial_fn's query varies on, which are added to the cache key.
+        """
+        query = _bakery(initial_fn, *args)
+        if not self._cache_statements:
+            query.spoil(full=True)
+
+        return query
+
+    def _execute(self, statement, params):
+        """
+        Execute a Core statement in the session's transaction, reusing its compiled form if the session allows it.
+        """
+        connection = self.db.connection()
+        if self._cache_statements:
+            connection = connection.execution_options(compiled_cache=_compiled_cache)
+
+        return connection.execute(statement, params)
+
+    def _update_statistics(self, task_id, scheduled=0, done=0, days_late=0):
+        """
+        Add to the statistics rollup of a task, creating its row if it doesn't exist yet. Doesn't commit, so that the
+        rollup is updated in the same transaction as the task instances it describes.
+        """
+        updated = self._execute(_UPDATE_STATISTICS, {
+            'task_id': task_id,
+            'add_scheduled': scheduled,
+            'add_done': done,
+            'add_days_late': days_late
+        }).rowcount
+
+        if not updated:
+            self.db.add(TaskStatistics(task=task_id, scheduled=scheduled, done=done, days_late=days_late))
+            self.db.flush()
+
+    def _update_pending_counts(self, pending):
+        """
+        Add to the counts of pending task instances, creating rows for owners that don't have one yet. Doesn't commit.
+
+        :param pending: Counter of the number of task instances to add, keyed by owner.
+        """
+        for owner, add_pending in pending.iteritems():
+            owner_key = owner if owner is not None else ''
+            updated = self._execute(_UPDATE_PENDING_COUNT, {
+                'owner_key': owner_key,
+                'add_pending': add_pending
+            }).rowcount
+
+            if not updated:
+                self.db.add(PendingCount(owner=owner_key, pending=add_pending))
+                self.db.flush()
+
+    def _emit(self, events):
+        """
+        Send events to the hooks, if there are any. Called once the changes they describe are committed.
+
+        :param events: List of HookEvents.
+        """
+        if self.hooks:
+            for event in events:
+                self.hooks.emit(event)
+
+    @property
+    def replica_id(self):
+        """
+        Id identifying this database when synchronizing with others.
+        """
+        return self._ensure_replica()
+
+    def _ensure_replica(self):
+        """
+        Get this database's replica id, assigning one if it doesn't have one yet. When one is assigned, everything
+        already in the database is added to the change log, so that it can be synchronized too. Write operations call
+        this before making any changes, so that those changes aren't logged twice.
+        """
+        if self._replica_id is None:
+            replica = self._baked(lambda session: session.query(Replica.id).filter(Replica.local == True))  # noqa: E712
+            replica += lambda q: q.order_by(Replica.id)
+            replica = replica(self.db).first()
+            if replica is None:
+                replica = Replica(id=uuid4().hex, local=True, synced_seq=0)
+                self.db.add(replica)
+                self._replica_id = replica.id
+                self._log_history()
+                self.db.commit()
+
+            self._replica_id = replica.id
+
+        return self._replica_id
+
+    def _log_change(self, kind, task, owner, ti_date=None, data=None, origin=None):
+        """
+        Add an entry to the change log. Doesn't commit, so that it's logged in the same transaction as the change.
+
+        :param kind: One of Change.CREATE, Change.SCHEDULE, or Change.COMPLETE.
+        :param task: Name of the task changed.
+        :param owner: Owner of the task changed.
+        :param ti_date: Date of the task instance changed, if any.
+        :param data: Optional dictionary of details about the change.
+        :param origin: Replica id of the database the change was first made in, when not this one.
+        """
+        self.db.add(Change(
+            origin=origin or self.replica_id,
+            kind=kind,
+            task=task,
+            owner=owner,
+            date=ti_date,
+            data=json.dumps(data, sort_keys=True) if data is not None else None
+        ))
+
+    def _log_history(self):
+        """
+        Add everything in the database to the change log.
+        """
+        tags = {}
+        for tag in self.db.query(TaskTag).order_by(TaskTag.task, TaskTag.tag):
+            tags.setdefault(tag.task, []).append(tag.tag)
+
+        for task in self.db.query(Task).order_by(Task.id):
+            self._log_change(Change.CREATE, task.name, task.owner, data={
+                'cadence': task.cadence,
+                'start': task.start.isoformat(),
+                'project': task.project,
+                'tags': tags.get(task.id, [])
+            })
+
+        tis = self.db \
+            .query(Task.name, Task.owner, TaskInstance.date, TaskInstance.done) \
+            .join(TaskInstance, TaskInstance.task == Task.id) \
+            .order_by(TaskInstance.date, TaskInstance.id)
+        for ti in tis:
+            self._log_change(Change.SCHEDULE, ti.name, ti.owner, ti.date)
+            if ti.done:
+                self._log_change(Change.COMPLETE, ti.name, ti.owner, ti.date, data={'days_late': 0})
+
     def assert_cadence_valid(self, cadence):
         """
         Ensure that the provided cadence exists in the set of supported cadences.
@@ -60,11 +339,14 @@ class Tasker(object):
 
     def assert_name_unique(self, name):
         """
-        Ensure that a task by this name doesn't already exist in the tasks list.
+        Ensure that a task by this name doesn't already exist in the tasks list (of this Tasker's owner, if it has one).
 
         :raises DuplicateNameException: When a task with this name already exists.
         """
-        task = self.db.query(Task).filter(Task.name == name).first()
+        task = self.db.query(Task).filter(Task.name == name)
+        if self.owner is not None:
+            task = task.filter(Task.owner == self.owner)
+        task = task.first()
 
         if task:
             raise DuplicateNameException('Task "{}" already exists.'.format(name))
@@ -80,80 +362,771 @@ class Tasker(object):
                 'Cadence {} and start date: {} could lose task instances.'.format(cadence, start_date)
             )
 
-    def create_task(self, name, cadence, start_date):
+    def create_task(self, name, cadence, start_date, project=None, tags=None):
         """
         Create a task that will be used to derive task instances.
 
         :param name: The name of the task.
         :param cadence: How often this task will schedule itself to create task instances.
         :param start_date: The date for which the first task instance should create itself.
+        :param project: Optional project the task belongs to.
+        :param tags: Optional iterable of tags to attach to the task.
         """
         self.assert_cadence_valid(cadence)
         self.assert_start_date_valid(cadence, start_date)
         self.assert_name_unique(name)
 
-        self.db.add(Task(name=name, cadence=cadence, start=start_date))
+        self._ensure_replica()
+        self._add_task(name, cadence, start_date, project, sorted(set(tags or [])), self.owner)
         self.db.commit()
 
-    def schedule_tasks(self, until_date=None):
+    def _add_task(self, name, cadence, start_date, project, tags, owner, origin=None):
+        """
+        Add a task and its tags, and log its creation. Doesn't commit.
+        """
+        task = Task(name=name, cadence=cadence, start=start_date, project=project, owner=owner)
+        self.db.add(task)
+
+        if tags:
+            # Flush to get the task's id, so that tags can be attached within the same transaction.
+            self.db.flush()
+            for tag in tags:
+                self.db.add(TaskTag(tag=tag, task=task.id))
+
+        self._log_change(Change.CREATE, name, owner, data={
+            'cadence': cadence,
+            'start': start_date.isoformat(),
+            'project': project,
+            'tags': tags
+        }, origin=origin)
+
+    def _get_task_id(self, name):
+        """
+        Returns the id of the task with a name (of this Tasker's owner, if it has one).
+
+        :raises UnknownTaskException: When there's no task with this name.
+        """
+        task_id = self.db.query(Task.id).filter(Task.name == name)
+        if self.owner is not None:
+            task_id = task_id.filter(Task.owner == self.owner)
+        task_id = task_id.scalar()
+
+        if task_id is None:
+            raise UnknownTaskException('Task "{}" doesn\'t exist.'.format(name))
+
+        return task_id
+
+    def _depends_on(self, task_id, other_task_id):
+        """
+        Returns true if a task depends on another, directly or through other tasks, or they're the same task. Only
+        walks the dependencies reachable from the task, a level at a time.
+        """
+        seen = set([task_id])
+        frontier = seen
+        while frontier:
+            if other_task_id in frontier:
+                return True
+
+            frontier = set(
+                depends_on for depends_on, in self.db
+                .query(TaskDependency.depends_on)
+                .filter(TaskDependency.task.in_(frontier))
+            ) - seen
+            seen.update(frontier)
+
+        return False
+
+    def add_dependency(self, name, dependency_name):
+        """
+        Make a task's instances wait for the instances of another task, scheduled on or before the same date, to be
+        done. Until then, they're left out of the incomplete task instances. Task instances that are already pending
+        start waiting right away.
+
+        :param name: Name of the task that has to wait.
+        :param dependency_name: Name of the task it has to wait for.
+        :raises UnknownTaskException: When either task doesn't exist.
+        :raises DependencyCycleException: When the other task already waits for this one, so neither could ever be
+            done.
+        """
+        task_id = self._get_task_id(name)
+        dependency_id = self._get_task_id(dependency_name)
+
+        if self._depends_on(dependency_id, task_id):
+            raise DependencyCycleException('Task "{}" already waits for "{}".'.format(dependency_name, name))
+
+        dependency = self.db.query(TaskDependency).filter(
+            TaskDependency.task == task_id, TaskDependency.depends_on == dependency_id
+        ).first()
+        if dependency is not None:
+            return
+
+        self.db.add(TaskDependency(task=task_id, depends_on=dependency_id))
+
+        blocker = aliased(TaskInstance)
+        blocks = self.db \
+            .query(TaskInstance.id, blocker.id) \
+            .join(blocker, and_(blocker.task == dependency_id,
+                                blocker.done == False,  # noqa: E712
+                                blocker.date <= TaskInstance.date)) \
+            .filter(TaskInstance.task == task_id, TaskInstance.done == False)  # noqa: E712
+        self.db.add_all([TaskInstanceBlock(task_instance=ti_id, blocker=blocker_id) for ti_id, blocker_id in blocks])
+
+        self.db.commit()
+
+    def remove_dependency(self, name, dependency_name):
+        """
+        Stop a task's instances from waiting for the instances of another task.
+
+        :param name: Name of the task that waits.
+        :param dependency_name: Name of the task it waits for.
+        :raises UnknownTaskException: When either task doesn't exist.
+        """
+        task_id = self._get_task_id(name)
+        dependency_id = self._get_task_id(dependency_name)
+
+        self.db.query(TaskDependency) \
+            .filter(TaskDependency.task == task_id, TaskDependency.depends_on == dependency_id) \
+            .delete(synchronize_session=False)
+        task_tis = self.db.query(TaskInstance.id).filter(TaskInstance.task == task_id)
+        dependency_tis = self.db.query(TaskInstance.id).filter(TaskInstance.task == dependency_id)
+        self.db.query(TaskInstanceBlock) \
+            .filter(TaskInstanceBlock.task_instance.in_(task_tis), TaskInstanceBlock.blocker.in_(dependency_tis)) \
+            .delete(synchronize_session=False)
+
+        self.db.commit()
+
+    def get_dependencies(self):
+        """
+        Returns a list of tuples (name, dependency name) of the tasks (of this Tasker's owner, if it has one) that wait
+        for other tasks, sorted by name.
+        """
+        dependency = aliased(Task)
+        query = self.db \
+            .query(Task.name, dependency.name) \
+            .join(TaskDependency, TaskDependency.task == Task.id) \
+            .join(dependency, dependency.id == TaskDependency.depends_on)
+        if self.owner is not None:
+            query = query.filter(Task.owner == self.owner)
+
+        return query.order_by(Task.name, dependency.name).all()
+
+    def search(self, query, tag=None, project=None):
+        """
+        Returns a list of named tuples (id, name, cadence, start) of the tasks whose names contain every word in the
+        query, matching words by prefix.
+
+        SQLite databases use the FTS5 index over task names, and results are ordered by relevance. Other databases
+        (and SQLite builds without FTS5) fall back to LIKE queries, ordered by name.
+
+        :param query: Words to search for.
+        :param tag: Only include tasks carrying this tag.
+        :param project: Only include tasks belonging to this project.
+        """
+        words = re.findall(r'\w+', query, re.UNICODE)
+        if not words:
+            return []
+
+        if self._search_index is None:
+            self._search_index = has_search_index(self.db.connection())
+
+        results = self.db.query(Task.id, Task.name, Task.cadence, Task.start)
+
+        if self._search_index:
+            match = ' '.join('"{}"*'.format(word) for word in words)
+            results = results \
+                .join(task_search, task_search.c.rowid == Task.id) \
+                .filter(text('{} MATCH :match'.format(TASK_SEARCH_TABLE)).bindparams(match=match)) \
+                .order_by(task_search.c.rank, Task.id)
+        else:
+            for word in (w.replace('_', '\\_') for w in words):
+                # Matches the word at the start of the name, or of any later word in it. The second pattern's leading
+                # wildcard means every task's name is scanned, so the index on the name column isn't used either way.
+                results = results.filter(or_(
+                    Task.name.like('{}%'.format(word), escape='\\'),
+                    Task.name.like('% {}%'.format(word), escape='\\')
+                ))
+            results = results.order_by(Task.name, Task.id)
+
+        return _filter_tasks(results, tag=tag is not None, project=project is not None, owner=self.owner is not None) \
+            .params(tag=tag, project=project, owner=self.owner) \
+            .all()
+
+    def get_task_schedules(self, task_ids=None, min_task_id=None):
+        """
+        Returns a list of named tuples (id, name, cadence, start, ti_id, date, done, owner) of tasks, along with their
+        most recently scheduled task instance, if any. Sorted by task id ascending.
+
+        :param task_ids: Only include these tasks.
+        :param min_task_id: Only include tasks with ids greater than or equal to this one.
+        """
+        by_owner = self.owner is not None
+        by_min_task_id = min_task_id is not None
+
+        # Lists of ids can't be bound parameters with this version of SQLAlchemy, so those queries aren't cached.
+        if task_ids is None:
+            query = self._baked(
+                lambda session: _task_schedules_query(session, by_owner, by_min_task_id), by_owner, by_min_task_id
+            )(self.db)
+        else:
+            query = _task_schedules_query(self.db, by_owner, by_min_task_id, task_ids)
+
+        return query.params(owner=self.owner, min_task_id=min_task_id).all()
+
+    def get_next_date(self, task_schedule):
+        """
+        Returns the date that the next task instance of a task should be scheduled on, or None if it's waiting on its
+        latest task instance to be completed, or will never be scheduled again.
+
+        :param task_schedule: A row returned from get_task_schedules.
+        """
+        if task_schedule.done is False:
+            return None
+
+        next_date = self._get_next_date(task_schedule.cadence, task_schedule.start, task_schedule.date)
+        if next_date == task_schedule.date:
+            return None
+
+        return next_date
+
+    def schedule_tasks(self, until_date=None, task_ids=None):
         """
         Search through the list of all tasks, and ensure that if a task could be scheduled on or before today's date,
         that it exists in the database with the earliest of possible dates. i.e. The next task instance should be
         scheduled if it's not in the future.
+
+        Any completions pending in the journal are flushed first, so that their tasks' next instances can be scheduled.
+
+        :param until_date: Schedule task instances up to and including this date. Defaults to today.
+        :param task_ids: Only schedule these tasks.
+        :returns: A list of named tuples (id, name, date, done) of the task instances that were scheduled.
         """
-        max_ti_dates = self.db \
-            .query(TaskInstance.task, func.max(TaskInstance.date).label('date')) \
-            .group_by(TaskInstance.task) \
-            .subquery()
-        latest_tis = self.db \
-            .query(TaskInstance) \
-            .join(max_ti_dates, and_(
-                TaskInstance.task == max_ti_dates.c.task,
-                TaskInstance.date == max_ti_dates.c.date
-            )).subquery()
-        scheduleable = self.db \
-            .query(Task.id,
-                   Task.name,
-                   Task.cadence,
-                   Task.start,
-                   latest_tis.c.date,
-                   latest_tis.c.done) \
-            .outerjoin(latest_tis, Task.id == latest_tis.c.task) \
-            .order_by(Task.id)
+        self.flush_journal()
+        self._ensure_replica()
 
         if not until_date:
             until_date = date.today()
 
-        # This could probably be cleaned up a lot, likely by fixing the query, more than anything.
-        for row in scheduleable.all():
+        scheduled = []
+        pending = Counter()
+        for row in self.get_task_schedules(task_ids=task_ids):
             # Three possible cases.
             #    - The most recent ti is done. (Check date and maybe create a new one)
             #    - The most recent ti is not done. (Leave it)
             #    - There has never been a ti. (Make one)
-            next_date = self._get_next_date(row.cadence, row.start, row.date)
-            if next_date == row.date or next_date > until_date:
+            next_date = self.get_next_date(row)
+            if next_date is None or next_date > until_date:
                 continue
 
-            if next_date <= until_date and row.done is not False:
-                self.db.add(TaskInstance(task=row.id, date=next_date))
+            ti = TaskInstance(task=row.id, date=next_date, owner=row.owner)
+            self.db.add(ti)
+            self._update_statistics(row.id, scheduled=1)
+            self._log_change(Change.SCHEDULE, row.name, row.owner, next_date)
+            scheduled.append((ti, row))
+            pending[row.owner] += 1
+
+        self._update_pending_counts(pending)
+
+        # Flush so that the new task instances have ids to return, as they're expired once committed.
+        self.db.flush()
+        self._block_task_instances([(new_ti.id, new_ti.task, new_ti.date) for new_ti, _ in scheduled])
+        events = [
+            HookEvent(HookEvents.SCHEDULED, new_ti.id, row.name, new_ti.date, row.owner) for new_ti, row in scheduled
+        ]
 
         self.db.commit()
+        self._emit(events)
+        return [ScheduledTaskInstance(event.id, event.name, event.date, False) for event in events]
+
+    def get_done_task_instance_ids(self, ti_ids):
+        """
+        Returns the sorted list of ids from the ones provided that belong to task instances that are done, including
+        those pending in the journal.
+
+        :param ti_ids: Ids of the task instances to check.
+        """
+        if not ti_ids:
+            return []
+
+        done = self.db \
+            .query(TaskInstance.id) \
+            .filter(TaskInstance.id.in_(ti_ids), TaskInstance.done == True)  # noqa: E712
+        done = set(ti.id for ti in done)
 
-    def complete_task_instance(self, ti_id):
+        if self.journal:
+            done.update(set(self.journal.pending()).intersection(ti_ids))
+
+        return sorted(done)
+
+    def complete_task_instance(self, ti_id, tag=None, project=None):
         """
         Set the provided task instance to be "done"
 
         :param ti_id: The id for the task instance.
+        :param tag: Only complete the task instance if its task carries this tag.
+        :param project: Only complete the task instance if its task belongs to this project.
+        """
+        by_tag, by_project, by_owner = tag is not None, project is not None, self.owner is not None
+
+        # Checking the tag, project, or owner needs the database anyway, so there's nothing to gain by journaling.
+        if self.journal and not (by_tag or by_project or by_owner):
+            # An id that isn't a number can't match a task instance, so there's nothing to journal.
+            try:
+                ti_id = int(ti_id)
+            except (TypeError, ValueError):
+                return
+
+            self.journal.append(ti_id)
+            return
+
+        pending = self._baked(lambda session: _pending_task_instances_query(session, by_owner), by_owner)
+        pending += lambda q: q.filter(TaskInstance.id == bindparam('ti_id'))
+        if by_tag or by_project:
+            pending.add_criteria(lambda q: _filter_tasks(q, tag=by_tag, project=by_project), by_tag, by_project)
+
+        pending = pending(self.db).params(ti_id=ti_id, tag=tag, project=project, owner=self.owner)
+        completed = self._complete_task_instances(pending.all())
+        self.db.commit()
+        self._emit([HookEvent(HookEvents.COMPLETED, ti.id, ti.name, ti.date, ti.owner) for ti in completed])
+
+    def _complete_task_instances(self, pending):
+        """
+        Set task instances to be "done", and add them to the statistics rollup. Doesn't commit.
+
+        :param pending: Named tuples (id, task, date, name, owner) of the pending task instances to complete.
+        :returns: The list of those that were completed by this call, rather than done already.
+        """
+        self._ensure_replica()
+
+        today = date.today()
+        completed_pending = Counter()
+        completed_tis = []
+        for ti in pending:
+            # Only count the completion if this is the update that actually completed the task instance.
+            completed = self._execute(_COMPLETE_TASK_INSTANCE, {'ti_id': ti.id}).rowcount
+            if completed:
+                days_late = max(0, (today - ti.date).days)
+                self._update_statistics(ti.task, done=1, days_late=days_late)
+                self._log_change(Change.COMPLETE, ti.name, ti.owner, ti.date, data={'days_late': days_late})
+                completed_pending[ti.owner] -= 1
+                completed_tis.append(ti)
+                self._unblock_task_instance(ti.id)
+
+        self._update_pending_counts(completed_pending)
+        return completed_tis
+
+    def _block_task_instances(self, task_instances):
+        """
+        Record the pending task instances that newly scheduled task instances have to wait for, and those that have to
+        wait for them. Doesn't commit.
+
+        :param task_instances: List of (id, task, date) tuples of pending task instances that were just scheduled.
+        """
+        dependencies = self.db.query(TaskDependency.task, TaskDependency.depends_on).all() if task_instances else None
+        if not dependencies:
+            return
+
+        dependents = set(task_id for task_id, _ in dependencies)
+        depended_on = set(depends_on for _, depends_on in dependencies)
+
+        blocks = set()
+        for ti_id, task_id, ti_date in task_instances:
+            if task_id in dependents:
+                blockers = self.db \
+                    .query(TaskInstance.id) \
+                    .join(TaskDependency, TaskDependency.depends_on == TaskInstance.task) \
+                    .filter(TaskDependency.task == task_id,
+                            TaskInstance.done == False,  # noqa: E712
+                            TaskInstance.date <= ti_date)
+                blocks.update((ti_id, blocker_id) for blocker_id, in blockers)
+
+            if task_id in depended_on:
+                blocked = self.db \
+                    .query(TaskInstance.id) \
+                    .join(TaskDependency, TaskDependency.task == TaskInstance.task) \
+                    .filter(TaskDependency.depends_on == task_id,
+                            TaskInstance.done == False,  # noqa: E712
+                            TaskInstance.date >= ti_date)
+                blocks.update((blocked_id, ti_id) for blocked_id, in blocked)
+
+        self.db.add_all([TaskInstanceBlock(task_instance=blocked_id, blocker=ti_id) for blocked_id, ti_id in blocks])
+
+    def _unblock_task_instance(self, ti_id):
+        """
+        Remove the blocks on and by a task instance that's just been completed. Only the blocks involving it are
+        touched, which the indexes find directly. Doesn't commit.
+        """
+        self._execute(_UNBLOCK_TASK_INSTANCES, {'ti_id': ti_id})
+        self._execute(_CLEAR_TASK_INSTANCE_BLOCKS, {'ti_id': ti_id})
+
+    def flush_journal(self):
+        """
+        Write all completions pending in the journal to the database in a single transaction.
+
+        :returns: The list of task instance ids that were flushed.
+        """
+        if not self.journal:
+            return []
+
+        return self.journal.flush(self._apply_journal)
+
+    def _apply_journal(self, ti_ids):
+        by_owner = self.owner is not None
+
+        # Keep well under the bound parameter limits of databases like SQLite.
+        completed = []
+        for i in xrange(0, len(ti_ids), 500):
+            pending = _pending_task_instances_query(self.db, by_owner).filter(TaskInstance.id.in_(ti_ids[i:i + 500]))
+            completed.extend(self._complete_task_instances(pending.params(owner=self.owner).all()))
+
+        self.db.commit()
+        self._emit([HookEvent(HookEvents.COMPLETED, ti.id, ti.name, ti.date, ti.owner) for ti in completed])
+
+    def get_last_change_seq(self):
+        """
+        Returns the sequence number of the latest entry in the change log, or 0 if it's empty.
+        """
+        self._ensure_replica()
+        return self.db.query(func.max(Change.seq)).scalar() or 0
+
+    def get_changes(self, after_seq=0, until_seq=None, exclude_origin=None, owner=None):
+        """
+        Returns a list of named tuples (seq, origin, kind, task, date, data, owner) of entries in the change log, sorted
+        by sequence number ascending. Only includes changes to this Tasker's owner's tasks, if it has one.
+
+        :param after_seq: Only include entries with sequence numbers greater than this.
+        :param until_seq: Only include entries with sequence numbers up to and including this.
+        :param exclude_origin: Leave out changes that were first made in the database with this replica id.
+        :param owner: Only include changes to this owner's tasks, when this Tasker doesn't have an owner.
+        """
+        self._ensure_replica()
+
+        owner = self.owner if self.owner is not None else owner
+        query = self.db \
+            .query(Change.seq, Change.origin, Change.kind, Change.task, Change.date, Change.data, Change.owner) \
+            .filter(Change.seq > after_seq)
+        if owner is not None:
+            query = query.filter(Change.owner == owner)
+        if until_seq is not None:
+            query = query.filter(Change.seq <= until_seq)
+        if exclude_origin is not None:
+            query = query.filter(Change.origin != exclude_origin)
+
+        return [ChangeRecord(*row) for row in query.order_by(Change.seq)]
+
+    def get_synced_seq(self, replica_id, owner=None):
+        """
+        Returns the sequence number of the latest change from another database that has been applied here, or 0 if
+        the databases have never synchronized.
+
+        :param replica_id: The replica id of the other database.
+        :param owner: Only consider the changes to this owner's tasks, which synchronizing scoped to that owner may
+            have applied further than the rest.
+        """
+        synced_seq = self.db.query(Replica.synced_seq).filter(Replica.id == replica_id).scalar() or 0
+        if owner is None:
+            return synced_seq
+
+        owner_synced_seq = self.db \
+            .query(ReplicaOwner.synced_seq) \
+            .filter(ReplicaOwner.replica == replica_id, ReplicaOwner.owner == owner) \
+            .scalar()
+        return max(synced_seq, owner_synced_seq or 0)
+
+    def apply_changes(self, changes, replica_id, synced_seq, owner=None):
+        """
+        Apply entries from another database's change log, in a single transaction. Changes are merged so that applying
+        the same changes in any order, any number of times, gives the same result:
+
+            - Tasks are only created if there isn't one with the same name already.
+            - Task instances are only scheduled if their task doesn't already have one on the same date.
+            - Task instances are completed, and scheduled first if needed, unless they're done already.
+
+        Tasks are matched by name and owner. When this Tasker has an owner, changes to other owners' tasks are skipped.
+
+        Changes that had an effect are added to this database's change log, keeping their origin, so that they can be
+        passed along to other databases.
+
+        :param changes: Change records, as returned from get_changes.
+        :param replica_id: The replica id of the database the changes came from.
+        :param synced_seq: Sequence number to record as the latest change applied from that database.
+        :param owner: Record synced_seq only for this owner's changes, as the changes were only those to its tasks.
+        :returns: The number of changes that had an effect.
+        """
+        self._ensure_replica()
+
+        applied = 0
+        pending = Counter()
+        scheduled = []
+        for change in changes:
+            if self.owner is not None and change.owner != self.owner:
+                continue
+
+            data = json.loads(change.data) if change.data is not None else {}
+            task_id = self.db.query(Task.id).filter(Task.name == change.task, Task.owner == change.owner).scalar()
+
+            if change.kind == Change.CREATE:
+                if task_id is None:
+                    start_date = datetime.strptime(data['start'], '%Y-%m-%d').date()
+                    self._add_task(
+                        change.task,
+                        data['cadence'],
+                        start_date,
+                        data['project'],
+                        data['tags'],
+                        change.owner,
+                        origin=change.origin
+                    )
+                    applied += 1
+                continue
+
+            if task_id is None:
+                continue
+
+            ti = self.db.query(TaskInstance).filter(TaskInstance.task == task_id, TaskInstance.date == change.date)
+            ti = ti.first()
+
+            if change.kind == Change.SCHEDULE and ti is None:
+                ti = TaskInstance(task=task_id, date=change.date, done=False, owner=change.owner)
+                self.db.add(ti)
+                self._update_statistics(task_id, scheduled=1)
+                pending[change.owner] += 1
+                scheduled.append(ti)
+            elif change.kind == Change.COMPLETE and (ti is None or not ti.done):
+                if ti is None:
+                    self.db.add(TaskInstance(task=task_id, date=change.date, done=True, owner=change.owner))
+                    self._update_statistics(task_id, scheduled=1)
+                else:
+                    ti.done = True
+                    pending[change.owner] -= 1
+                    self.db.flush()
+                    self._unblock_task_instance(ti.id)
+                self._update_statistics(task_id, done=1, days_late=data.get('days_late', 0))
+            else:
+                continue
+
+            self._log_change(change.kind, change.task, change.owner, change.date, data or None, origin=change.origin)
+            applied += 1
+
+        self._update_pending_counts(pending)
+        self.db.flush()
+        self._block_task_instances([(new_ti.id, new_ti.task, new_ti.date) for new_ti in scheduled if not new_ti.done])
+
+        if owner is None:
+            replica = self.db.query(Replica).filter(Replica.id == replica_id).first()
+            if replica is None:
+                self.db.add(Replica(id=replica_id, local=False, synced_seq=synced_seq))
+            else:
+                replica.synced_seq = max(replica.synced_seq, synced_seq)
+        else:
+            replica = self.db.query(ReplicaOwner) \
+                .filter(ReplicaOwner.replica == replica_id, ReplicaOwner.owner == owner) \
+                .first()
+            if replica is None:
+                self.db.add(ReplicaOwner(replica=replica_id, owner=owner, synced_seq=synced_seq))
+            else:
+                replica.synced_seq = max(replica.synced_seq, synced_seq)
+
+        self.db.commit()
+        return applied
+
+    def rebuild_statistics(self):
         """
-        self.db.query(TaskInstance).filter(TaskInstance.id == ti_id).update({'done': True})
+        Recompute the statistics rollup of every task (of this Tasker's owner, if it has one) from its task instances,
+        along with the count of pending task instances. Databases from before the rollup existed have it filled in
+        when they're opened, so this is for bringing it back in line with task instances that were changed directly.
+
+        Task instances don't record when they were completed, so days late can't be recovered from history; the
+        existing total for a task is kept as is.
+        """
+        tasks = self.db.query(Task.id)
+        if self.owner is not None:
+            tasks = tasks.filter(Task.owner == self.owner)
+
+        days_late = dict(self.db.query(TaskStatistics.task, TaskStatistics.days_late))
+        history = self.db \
+            .query(Task.id,
+                   func.count(TaskInstance.id),
+                   func.sum(cast(TaskInstance.done, Integer))) \
+            .outerjoin(TaskInstance, TaskInstance.task == Task.id) \
+            .filter(Task.id.in_(tasks)) \
+            .group_by(Task.id)
+
+        self.db.query(TaskStatistics) \
+            .filter(TaskStatistics.task.in_(tasks)) \
+            .delete(synchronize_session=False)
+        for task_id, scheduled, done in history:
+            self.db.add(TaskStatistics(
+                task=task_id, scheduled=scheduled, done=done or 0, days_late=days_late.get(task_id, 0)
+            ))
+
+        pending_counts = count_pending_task_instances()
+        old_pending_counts = self.db.query(PendingCount)
+        if self.owner is not None:
+            pending_counts = pending_counts.where(TaskInstance.owner == self.owner)
+            old_pending_counts = old_pending_counts.filter(PendingCount.owner == self.owner)
+
+        old_pending_counts.delete(synchronize_session=False)
+        self.db.execute(PendingCount.__table__.insert().from_select(['owner', 'pending'], pending_counts))
+
         self.db.commit()
 
-    def get_incomplete_task_instances(self):
+    def get_statistics(self, by_cadence=False):
         """
-        Returns a list of named tuples of the task instances that are still pending. Sorted by scheduled date ascending.
+        Returns a list of named tuples (id, name, cadence, scheduled, done, days_late) of the statistics rollup of each
+        task (of this Tasker's owner, if it has one), sorted by task id. Only reads the rollup, so this doesn't scale
+        with the number of task instances.
+
+        :param by_cadence: Instead aggregate the statistics of all tasks sharing a cadence, returning named tuples
+            (cadence, scheduled, done, days_late) sorted by cadence.
         """
-        return self.db \
-            .query(TaskInstance.id, Task.name, TaskInstance.date, literal_column('0', Boolean)) \
-            .join(Task, Task.id == TaskInstance.task) \
-            .filter(TaskInstance.done == False) \
-            .order_by(TaskInstance.date).all()  # noqa: E712 (== operator with boolean not allowed for regular Python)
+        scheduled = func.coalesce(TaskStatistics.scheduled, 0)
+        done = func.coalesce(TaskStatistics.done, 0)
+        days_late = func.coalesce(TaskStatistics.days_late, 0)
+
+        if by_cadence:
+            scheduled, done, days_late = func.sum(scheduled), func.sum(done), func.sum(days_late)
+            query = self.db \
+                .query(Task.cadence, scheduled.label('scheduled'), done.label('done'), days_late.label('days_late')) \
+                .group_by(Task.cadence) \
+                .order_by(Task.cadence)
+        else:
+            query = self.db \
+                .query(Task.id,
+                       Task.name,
+                       Task.cadence,
+                       scheduled.label('scheduled'),
+                       done.label('done'),
+                       days_late.label('days_late')) \
+                .order_by(Task.id)
+
+        if self.owner is not None:
+            query = query.filter(Task.owner == self.owner)
+
+        return query.outerjoin(TaskStatistics, TaskStatistics.task == Task.id).all()
+
+    def pending_count(self):
+        """
+        Returns the number of task instances still pending (of this Tasker's owner, if it has one). Only reads the
+        maintained counts, so this doesn't scale with the number of task instances. New task instances aren't
+        scheduled first, so this is the count as of the last time tasks were scheduled.
+        """
+        by_owner = self.owner is not None
+
+        query = self._baked(lambda session: session.query(func.coalesce(func.sum(PendingCount.pending), 0)))
+        if by_owner:
+            query += lambda q: q.filter(PendingCount.owner == bindparam('owner'))
+        count = query(self.db).params(owner=self.owner).scalar()
+
+        # Completions that haven't been flushed yet still count, but only if they were pending to begin with.
+        journaled = self.journal.pending() if self.journal else None
+        for i in xrange(0, len(journaled or []), 500):
+            journaled_pending = self.db \
+                .query(func.count(TaskInstance.id)) \
+                .filter(TaskInstance.id.in_(journaled[i:i + 500]), TaskInstance.done == False)  # noqa: E712
+            if self.owner is not None:
+                journaled_pending = journaled_pending.filter(TaskInstance.owner == self.owner)
+            count -= journaled_pending.scalar()
+
+        return count
+
+    def get_incomplete_task_instances(self, tag=None, project=None):
+        """
+        Returns a list of named tuples (id, name, date, done) of the task instances that are still pending. Sorted by
+        scheduled date ascending.
+
+        :param tag: Only include task instances of tasks carrying this tag.
+        :param project: Only include task instances of tasks belonging to this project.
+        """
+        task_instances = self._incomplete_task_instances(tag, project).all()
+
+        # Completions that haven't been flushed yet still count. There are few of them, so they're left out here,
+        # rather than in the query, which keeps the query cacheable.
+        journaled = set(self.journal.pending()) if self.journal else None
+        if journaled:
+            task_instances = [ti for ti in task_instances if ti.id not in journaled]
+
+        return task_instances
+
+    def iter_incomplete_task_instances(self, tag=None, project=None, batch_size=1000):
+        """
+        Generates the same task instances as get_incomplete_task_instances, fetching them from the database a batch at
+        a time, so that long listings can be processed without holding them all in memory.
+
+        :param tag: Only include task instances of tasks carrying this tag.
+        :param project: Only include task instances of tasks belonging to this project.
+        :param batch_size: Number of task instances to fetch at a time.
+        """
+        journaled = set(self.journal.pending()) if self.journal else None
+
+        for ti in self._incomplete_task_instances(tag, project, batch_size=batch_size):
+            if not journaled or ti.id not in journaled:
+                yield ti
+
+    def _incomplete_task_instances(self, tag, project, batch_size=None):
+        by_tag, by_project, by_owner = tag is not None, project is not None, self.owner is not None
+
+        query = self._baked(lambda session: _incomplete_task_instances_query(session, by_owner), by_owner)
+        if by_tag or by_project:
+            query.add_criteria(lambda q: _filter_tasks(q, tag=by_tag, project=by_project), by_tag, by_project)
+        query += lambda q: q.order_by(TaskInstance.date)
+        if batch_size is not None:
+            query.add_criteria(lambda q: q.yield_per(batch_size), batch_size)
+
+        return query(self.db).params(tag=tag, project=project, owner=self.owner)
+
+    def export_columns(self, batch_size=10000):
+        """
+        Returns every task instance (of this Tasker's owner, if it has one) as a column per field, in typed NumPy
+        arrays, sorted by id:
+
+            - id: int32 task instance ids.
+            - task: int32 ids of their tasks.
+            - date: datetime64[D] scheduled dates.
+            - done: bool, including completions pending in the journal.
+            - cadence: int8 codes of their tasks' cadences, indexing into cadence_names.
+            - cadence_names: The name of each cadence code.
+
+        Rows are read from a streamed Core cursor a batch at a time, and dates and cadences are left for NumPy and the
+        database to convert, so that there's never a Python object per task instance beyond the current batch.
+
+        :param batch_size: Number of task instances to read at a time.
+        :raises ExportException: When NumPy isn't installed.
+        """
+        numpy = load_numpy()
+
+        cadence_names = [row.cadence for row in self.db.query(Task.cadence).distinct().order_by(Task.cadence)]
+        if cadence_names:
+            cadence_code = case([(Task.cadence == name, i) for i, name in enumerate(cadence_names)], else_=-1)
+        else:
+            cadence_code = literal(-1)
+
+        # Without their column types, SQLite's dates are read as strings and booleans as integers, which NumPy converts
+        # far more quickly than SQLAlchemy converts each of them to a Python object.
+        query = select([
+            TaskInstance.id,
+            TaskInstance.task,
+            type_coerce(TaskInstance.date, String),
+            type_coerce(TaskInstance.done, Integer),
+            cadence_code
+        ]).select_from(TaskInstance.__table__.join(Task.__table__, Task.id == TaskInstance.task))
+        count = select([func.count(TaskInstance.id)])
+        if self.owner is not None:
+            query = query.where(TaskInstance.owner == self.owner)
+            count = count.where(TaskInstance.owner == self.owner)
+
+        connection = self.db.connection()
+        result = connection.execution_options(stream_results=True).execute(query.order_by(TaskInstance.id))
+        columns = read_columns(
+            result,
+            ['int32', 'int32', 'datetime64[D]', 'bool', 'int8'],
+            batch_size=batch_size,
+            size_hint=connection.execute(count).scalar()
+        )
+        columns = OrderedDict(zip(['id', 'task', 'date', 'done', 'cadence'], columns))
+
+        journaled = self.journal.pending() if self.journal else None
+        if journaled:
+            columns['done'][numpy.in1d(columns['id'], journaled)] = True
+
+        columns['cadence_names'] = numpy.array(cadence_names, dtype='S')
+        return columns
@@ -0,0 +1,137 @@
+import heapq
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+
+def print_notification(ti, stream=None):
+    """
+    Notification hook that prints task instances to stdout (or another stream) as they become due.
+    """
+    stream = stream or sys.stdout
+    print >> stream, '({}) {} [tasker complete {}]'.format(ti.date, ti.name, ti.id)
+    stream.flush()
+
+
+def command_notification(command):
+    """
+    Returns a notification hook that runs a command for each task instance as it becomes due. The task instance's
+    name, date and id are appended to the command's arguments.
+
+    :param command: List of program arguments.
+    """
+    def notify(ti):
+        subprocess.call(list(command) + [ti.name, str(ti.date), str(ti.id)])
+
+    return notify
+
+
+class TaskWatcher(object):
+    """
+    Schedules task instances as they become due, and sends a notification for each one.
+
+    Rather than scheduling every task on every tick, the date each task is next due on is kept in a heap, and only the
+    tasks at the front of the heap are scheduled when their date arrives. Tasks waiting on their latest task instance
+    to be completed are kept aside, keyed by that task instance, so picking up completions only requires checking
+    those task instances. New tasks are picked up by looking past the highest task id seen so far.
+    """
+    def __init__(self, tasker, notify=print_notification, poll_interval=60, now=datetime.now, sleep=time.sleep):
+        """
+        :param tasker: The Tasker to schedule task instances with.
+        :param notify: Callable given a named tuple (id, name, date, done) for every task instance that's scheduled.
+        :param poll_interval: Maximum number of seconds to go without checking for new tasks and completions.
+        :param now: Callable returning the current datetime.
+        :param sleep: Callable that sleeps for the given number of seconds.
+        """
+        self.tasker = tasker
+        self.notify = notify
+        self.poll_interval = poll_interval
+        self.now = now
+        self.sleep = sleep
+
+        self._due = []
+        self._waiting = {}
+        self._next_task_id = 0
+
+    def _track(self, task_schedules):
+        for row in task_schedules:
+            self._next_task_id = max(self._next_task_id, row.id + 1)
+
+            next_date = self.tasker.get_next_date(row)
+            if next_date is not None:
+                heapq.heappush(self._due, (next_date, row.id))
+            elif row.done is False:
+                self._waiting[row.ti_id] = row.id
+
+    def load(self):
+        """
+        Load the next due date of every task.
+        """
+        self._due = []
+        self._waiting = {}
+        self._next_task_id = 0
+        self._track(self.tasker.get_task_schedules())
+
+    def refresh(self):
+        """
+        Pick up tasks created, and task instances completed, since the last refresh.
+        """
+        # End the transaction the last refresh read in, which databases like MySQL would otherwise keep reading the
+        # same snapshot of.
+        self.tasker.db.rollback()
+
+        # Completions only count once they're in the database, so write any that are waiting in the journal.
+        self.tasker.flush_journal()
+
+        self._track(self.tasker.get_task_schedules(min_task_id=self._next_task_id))
+
+        done = self.tasker.get_done_task_instance_ids(list(self._waiting))
+        if done:
+            self._track(self.tasker.get_task_schedules(task_ids=[self._waiting.pop(ti_id) for ti_id in done]))
+
+    def run_pending(self):
+        """
+        Schedule the tasks that are due, and send notifications for the task instances created.
+
+        :returns: The list of task instances created.
+        """
+        today = self.now().date()
+
+        task_ids = set()
+        while self._due and self._due[0][0] <= today:
+            task_ids.add(heapq.heappop(self._due)[1])
+
+        if not task_ids:
+            return []
+
+        scheduled = self.tasker.schedule_tasks(until_date=today, task_ids=list(task_ids))
+
+        # Something else may have scheduled or completed these tasks in the meantime, so take their state from the
+        # database, rather than assuming what it'll be.
+        self._track(self.tasker.get_task_schedules(task_ids=list(task_ids)))
+
+        for ti in scheduled:
+            self.notify(ti)
+
+        return scheduled
+
+    def seconds_until_due(self):
+        """
+        Returns the number of seconds until the next task is due, capped at the poll interval.
+        """
+        if not self._due:
+            return self.poll_interval
+
+        due = datetime.combine(self._due[0][0], datetime.min.time())
+        return max(0, min(self.poll_interval, (due - self.now()).total_seconds()))
+
+    def run(self):
+        """
+        Watch tasks until interrupted.
+        """
+        self.load()
+        while True:
+            self.run_pending()
+            self.sleep(self.seconds_until_due())
+            self.refresh()
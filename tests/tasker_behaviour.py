@@ -0,0 +1,366 @@
+from datetime import date, timedelta
+
+from src.tasker import DuplicateNameException, InvalidCadenceException, InvalidStartDateException
+from src.tasker import ScheduledTaskInstance
+
+
+class TaskerBehaviour(object):
+    """
+    Tests of the behaviour every tasker engine shares, through their public methods alone. Mixed into a TestCase that
+    implements create_tasker, returning taskers that share the same storage for each test.
+    """
+    def create_tasker(self, owner=None):
+        raise NotImplementedError()
+
+    def _schedules(self, tasker):
+        return [(s.id, s.ti_id, s.date, s.done) for s in tasker.get_task_schedules()]
+
+    def test_create_task(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Fix bike', 'once', date(2016, 11, 2))
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+
+        self.assertEqual(tasker.get_task_schedules(), [
+            (1, 'Fix bike', 'once', date(2016, 11, 2), None, None, None, None),
+            (2, 'Make coffee', 'daily', date(2016, 11, 3), None, None, None, None),
+            (3, 'Get gas', 'weekly', date(2016, 11, 5), None, None, None, None),
+            (4, 'Pay bills', 'monthly', date(2016, 11, 4), None, None, None, None)
+        ])
+
+    def test_create_task_invalid(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        self.assertRaises(DuplicateNameException, tasker.create_task, 'Make coffee', 'daily', date(2016, 11, 3))
+        self.assertRaises(InvalidStartDateException, tasker.create_task, 'Pay bills', 'monthly', date(2016, 10, 29))
+        self.assertRaises(InvalidCadenceException, tasker.create_task, 'Pay bills', 'random', date(2016, 10, 29))
+
+    def test_schedule_tasks(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Fix bike', 'once', date(2016, 11, 2))
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+
+        self.assertEqual(tasker.schedule_tasks(), [
+            ScheduledTaskInstance(1, 'Fix bike', date(2016, 11, 2), False),
+            ScheduledTaskInstance(2, 'Make coffee', date(2016, 11, 3), False),
+            ScheduledTaskInstance(3, 'Get gas', date(2016, 11, 5), False),
+            ScheduledTaskInstance(4, 'Pay bills', date(2016, 11, 4), False)
+        ])
+        self.assertEqual(tasker.schedule_tasks(), [])
+
+    def test_schedule_tasks_nothing_exists(self):
+        tasker = self.create_tasker()
+
+        self.assertEqual(tasker.schedule_tasks(), [])
+        self.assertEqual(tasker.get_incomplete_task_instances(), [])
+
+    def test_schedule_tasks_new_year(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Pay bills', 'monthly', date(2016, 12, 4))
+
+        tasker.schedule_tasks()
+        tasker.complete_task_instance(1)
+
+        self.assertEqual(tasker.schedule_tasks(until_date=date(2017, 1, 4)), [
+            ScheduledTaskInstance(2, 'Pay bills', date(2017, 1, 4), False)
+        ])
+        self.assertEqual(tasker.get_done_task_instance_ids([1, 2]), [1])
+
+    def test_schedule_tasks_repeated(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+
+        tasker.schedule_tasks()
+        tasker.schedule_tasks()
+        tasker.schedule_tasks()
+
+        self.assertEqual(tasker.get_incomplete_task_instances(), [
+            (1, 'Make coffee', date(2016, 11, 3), False),
+            (3, 'Pay bills', date(2016, 11, 4), False),
+            (2, 'Get gas', date(2016, 11, 5), False)
+        ])
+
+    def test_schedule_tasks_repeated_tasks_done(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Fix bike', 'once', date(2016, 11, 2))
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+
+        tasker.schedule_tasks(until_date=date(2016, 11, 5))
+        for ti_id in xrange(1, 5):
+            tasker.complete_task_instance(ti_id)
+        tasker.schedule_tasks(until_date=date(2016, 12, 31))
+        tasker.schedule_tasks(until_date=date(2016, 12, 31))
+
+        self.assertEqual(self._schedules(tasker), [
+            (1, 1, date(2016, 11, 2), True),
+            (2, 5, date(2016, 11, 4), False),
+            (3, 6, date(2016, 11, 12), False),
+            (4, 7, date(2016, 12, 4), False)
+        ])
+        self.assertEqual(tasker.get_done_task_instance_ids(range(1, 8)), [1, 2, 3, 4])
+
+    def test_complete_task_instance(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.schedule_tasks(until_date=date(2016, 11, 3))
+
+        tasker.complete_task_instance('1')
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(2)
+        tasker.complete_task_instance('abc')
+
+        self.assertEqual(self._schedules(tasker), [(1, 1, date(2016, 11, 3), True)])
+        self.assertEqual(tasker.get_incomplete_task_instances(), [])
+
+    def test_get_incomplete_task_instances(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+
+        tasker.schedule_tasks()
+
+        self.assertEqual(tasker.get_incomplete_task_instances(), [
+            (1, 'Make coffee', date(2016, 11, 3), False),
+            (3, 'Pay bills', date(2016, 11, 4), False),
+            (2, 'Get gas', date(2016, 11, 5), False)
+        ])
+
+    def test_tasker_full_scenario(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+
+        tasker.schedule_tasks()
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(2)
+        tasker.complete_task_instance(3)
+        tasker.schedule_tasks(until_date=date(2016, 11, 11))
+
+        self.assertEqual(tasker.get_incomplete_task_instances(), [(4, 'Make coffee', date(2016, 11, 4), False)])
+
+        tasker.schedule_tasks()
+        self.assertEqual(tasker.get_incomplete_task_instances(), [
+            (4, 'Make coffee', date(2016, 11, 4), False),
+            (5, 'Get gas', date(2016, 11, 12), False),
+            (6, 'Pay bills', date(2016, 12, 4), False)
+        ])
+
+    def test_tasker_full_scenario_schedule_complete(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+
+        tasker.schedule_tasks()
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(2)
+
+        # Neither task is due again by then.
+        self.assertEqual(tasker.schedule_tasks(until_date=date(2016, 11, 11)), [])
+        self.assertEqual(tasker.get_incomplete_task_instances(), [])
+        self.assertEqual(tasker.get_done_task_instance_ids([1, 2]), [1, 2])
+
+    def test_get_incomplete_task_instances_filtered(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3), project='home', tags=['kitchen'])
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5), project='car', tags=['errand'])
+        tasker.create_task('Buy milk', 'weekly', date(2016, 11, 4), project='home', tags=['errand', 'kitchen'])
+
+        tasker.schedule_tasks()
+
+        self.assertEqual(tasker.get_incomplete_task_instances(project='home'), [
+            (1, 'Make coffee', date(2016, 11, 3), False),
+            (3, 'Buy milk', date(2016, 11, 4), False)
+        ])
+        self.assertEqual(tasker.get_incomplete_task_instances(tag='errand'), [
+            (3, 'Buy milk', date(2016, 11, 4), False),
+            (2, 'Get gas', date(2016, 11, 5), False)
+        ])
+        self.assertEqual(tasker.get_incomplete_task_instances(tag='kitchen', project='home'), [
+            (1, 'Make coffee', date(2016, 11, 3), False),
+            (3, 'Buy milk', date(2016, 11, 4), False)
+        ])
+        self.assertEqual(tasker.get_incomplete_task_instances(tag='kitchen', project='car'), [])
+
+    def test_complete_task_instance_filtered(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3), project='home', tags=['kitchen'])
+        tasker.schedule_tasks(until_date=date(2016, 11, 3))
+
+        tasker.complete_task_instance(1, project='car')
+        tasker.complete_task_instance(1, tag='errand')
+        self.assertEqual(tasker.get_done_task_instance_ids([1]), [])
+
+        tasker.complete_task_instance(1, tag='kitchen', project='home')
+        self.assertEqual(tasker.get_done_task_instance_ids([1]), [1])
+
+    def test_search(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Pay phone bill', 'monthly', date(2016, 11, 4), project='home')
+        tasker.create_task('Phone mom', 'weekly', date(2016, 11, 5), tags=['family'])
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+
+        self.assertEqual([t.name for t in tasker.search('bill PAY')], ['Pay phone bill'])
+        self.assertEqual([t.name for t in tasker.search('phone', tag='family')], ['Phone mom'])
+        self.assertEqual([t.name for t in tasker.search('phone', project='home')], ['Pay phone bill'])
+        self.assertEqual(tasker.search('coffee'), [(3, 'Make coffee', 'daily', date(2016, 11, 3))])
+        self.assertEqual(tasker.search('tea'), [])
+        self.assertEqual(tasker.search('hone'), [])
+        self.assertEqual(tasker.search(' "* '), [])
+
+    def test_statistics(self):
+        tasker = self.create_tasker()
+
+        yesterday = date.today() - timedelta(days=1)
+        tasker.create_task('Make coffee', 'daily', yesterday)
+        tasker.create_task('Get gas', 'weekly', date.today())
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+        tasker.create_task('Fix bike', 'once', date.today() + timedelta(days=1))
+
+        tasker.schedule_tasks()
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(2)
+        tasker.schedule_tasks()
+
+        self.assertEqual(tasker.get_statistics(), [
+            (1, 'Make coffee', 'daily', 2, 1, 1),
+            (2, 'Get gas', 'weekly', 1, 1, 0),
+            (3, 'Pay bills', 'monthly', 1, 0, 0),
+            (4, 'Fix bike', 'once', 0, 0, 0)
+        ])
+        self.assertEqual(tasker.get_statistics(by_cadence=True), [
+            ('daily', 2, 1, 1),
+            ('monthly', 1, 0, 0),
+            ('once', 0, 0, 0),
+            ('weekly', 1, 1, 0)
+        ])
+
+    def test_schedule_tasks_by_id(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+
+        self.assertEqual(tasker.schedule_tasks(task_ids=[1, 3]), [
+            ScheduledTaskInstance(1, 'Make coffee', date(2016, 11, 3), False),
+            ScheduledTaskInstance(2, 'Pay bills', date(2016, 11, 4), False)
+        ])
+        self.assertEqual(tasker.schedule_tasks(task_ids=[1, 3]), [])
+        self.assertEqual(tasker.schedule_tasks(), [ScheduledTaskInstance(3, 'Get gas', date(2016, 11, 5), False)])
+
+    def test_get_task_schedules(self):
+        tasker = self.create_tasker()
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Fix bike', 'once', date(2016, 11, 2))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+
+        tasker.schedule_tasks(until_date=date(2016, 11, 3))
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(2)
+
+        schedules = tasker.get_task_schedules()
+        self.assertEqual(schedules, [
+            (1, 'Make coffee', 'daily', date(2016, 11, 3), 1, date(2016, 11, 3), True, None),
+            (2, 'Fix bike', 'once', date(2016, 11, 2), 2, date(2016, 11, 2), True, None),
+            (3, 'Get gas', 'weekly', date(2016, 11, 5), None, None, None, None)
+        ])
+        self.assertEqual([tasker.get_next_date(s) for s in schedules], [date(2016, 11, 4), None, date(2016, 11, 5)])
+
+        self.assertEqual([s.id for s in tasker.get_task_schedules(task_ids=[1, 3])], [1, 3])
+        self.assertEqual([s.id for s in tasker.get_task_schedules(min_task_id=2)], [2, 3])
+        self.assertEqual(tasker.get_done_task_instance_ids([1, 2, 3]), [1, 2])
+
+    def test_owner_scoping(self):
+        everyone = self.create_tasker()
+        alice = self.create_tasker(owner='alice')
+        bob = self.create_tasker(owner='bob')
+
+        alice.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        bob.create_task('Make coffee', 'daily', date(2016, 11, 4))
+        bob.create_task('Get gas', 'weekly', date(2016, 11, 5))
+
+        self.assertRaises(DuplicateNameException, alice.create_task, 'Make coffee', 'weekly', date(2016, 11, 3))
+        self.assertRaises(DuplicateNameException, everyone.create_task, 'Get gas', 'weekly', date(2016, 11, 3))
+
+        self.assertEqual(alice.schedule_tasks(until_date=date(2016, 11, 5)), [
+            ScheduledTaskInstance(1, 'Make coffee', date(2016, 11, 3), False)
+        ])
+        self.assertEqual(bob.schedule_tasks(until_date=date(2016, 11, 5)), [
+            ScheduledTaskInstance(2, 'Make coffee', date(2016, 11, 4), False),
+            ScheduledTaskInstance(3, 'Get gas', date(2016, 11, 5), False)
+        ])
+
+        self.assertEqual(alice.get_incomplete_task_instances(), [(1, 'Make coffee', date(2016, 11, 3), False)])
+        self.assertEqual([ti.id for ti in everyone.get_incomplete_task_instances()], [1, 2, 3])
+
+        # Owners can't complete each other's task instances.
+        alice.complete_task_instance(2)
+        bob.complete_task_instance(2)
+        self.assertEqual(everyone.get_done_task_instance_ids([1, 2, 3]), [2])
+
+        self.assertEqual([s.name for s in bob.search('coffee')], ['Make coffee'])
+        self.assertEqual(alice.get_statistics(), [(1, 'Make coffee', 'daily', 1, 0, 0)])
+        self.assertEqual([s.owner for s in everyone.get_task_schedules()], ['alice', 'bob', 'bob'])
+
+    def test_pending_count(self):
+        tasker = self.create_tasker()
+        bob = self.create_tasker(owner='bob')
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Fix bike', 'once', date(2016, 11, 2))
+        bob.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        self.assertEqual(tasker.pending_count(), 0)
+
+        tasker.schedule_tasks(until_date=date(2016, 11, 5))
+        self.assertEqual(tasker.pending_count(), 3)
+        self.assertEqual(bob.pending_count(), 1)
+
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(1)
+        bob.complete_task_instance(3)
+        self.assertEqual(tasker.pending_count(), 1)
+        self.assertEqual(bob.pending_count(), 0)
+
+        tasker.schedule_tasks(until_date=date(2016, 11, 5))
+        self.assertEqual(tasker.pending_count(), 2)
+        self.assertEqual(tasker.pending_count(), len(tasker.get_incomplete_task_instances()))
+
+    def test_iter_incomplete_task_instances(self):
+        tasker = self.create_tasker()
+
+        for i in xrange(5):
+            tasker.create_task('Task {}'.format(i), 'daily', date(2016, 11, 5 - i), project='home' if i % 2 else None)
+        tasker.schedule_tasks(until_date=date(2016, 11, 5))
+
+        task_instances = tasker.iter_incomplete_task_instances(batch_size=2)
+        self.assertEqual(next(task_instances), (5, 'Task 4', date(2016, 11, 1), False))
+        self.assertEqual(list(task_instances), tasker.get_incomplete_task_instances()[1:])
+
+        self.assertEqual(
+            list(tasker.iter_incomplete_task_instances(project='home')),
+            tasker.get_incomplete_task_instances(project='home')
+        )
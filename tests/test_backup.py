@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date
+from StringIO import StringIO
+from unittest import TestCase
+
+from src.backup import BackupException, backup_sqlite, dump_database, print_progress
+from src.database import create_session
+from src.models import Task
+from src.tasker import Tasker
+
+
+class BackupTest(TestCase):
+    def setUp(self):
+        super(BackupTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'tasker.sqlite')
+        self.backup_path = os.path.join(self.temp_dir, 'backup')
+
+        self.db = create_session('sqlite:///{}'.format(self.db_path))
+        self.tasker = Tasker(self.db)
+        self.tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        self.tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        self.tasker.schedule_tasks(until_date=date(2016, 11, 5))
+
+    def tearDown(self):
+        super(BackupTest, self).tearDown()
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_backup_sqlite(self):
+        progress = []
+        backup_sqlite(self.db_path, self.backup_path, pages_per_step=1, progress=lambda *args: progress.append(args))
+
+        total = progress[-1][1]
+        self.assertEqual(progress, [(i, total) for i in xrange(1, total + 1)])
+        self.assertFalse(os.path.exists('{}.tmp'.format(self.backup_path)))
+
+        backup_db = create_session('sqlite:///{}'.format(self.backup_path))
+        try:
+            self.assertEqual(backup_db.query(Task.name).order_by(Task.id).all(), [('Make coffee',), ('Get gas',)])
+        finally:
+            backup_db.close()
+
+    def test_backup_sqlite_waits_for_writer(self):
+        connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        connection.isolation_level = None
+        connection.execute('BEGIN EXCLUSIVE')
+        threading.Timer(0.2, connection.execute, ['ROLLBACK']).start()
+
+        backup_sqlite(self.db_path, self.backup_path)
+        connection.close()
+
+        backup_db = create_session('sqlite:///{}'.format(self.backup_path))
+        try:
+            self.assertEqual(backup_db.query(Task).count(), 2)
+        finally:
+            backup_db.close()
+
+    def test_backup_sqlite_missing_source(self):
+        self.assertRaises(
+            BackupException, backup_sqlite, os.path.join(self.temp_dir, 'missing.sqlite'), self.backup_path
+        )
+        self.assertFalse(os.path.exists(self.backup_path))
+
+    def test_backup_sqlite_failure_removes_copy(self):
+        source_path = os.path.join(self.temp_dir, 'notes.txt')
+        with open(source_path, 'w') as f:
+            f.write('Buy milk' * 1000)
+
+        self.assertRaises(BackupException, backup_sqlite, source_path, self.backup_path)
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ['notes.txt', 'tasker.sqlite'])
+
+    def test_backup_sqlite_locked_too_long(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.isolation_level = None
+        connection.execute('BEGIN EXCLUSIVE')
+        try:
+            start = time.time()
+            self.assertRaises(BackupException, backup_sqlite, self.db_path, self.backup_path, busy_timeout=0.1)
+            self.assertLess(time.time() - start, 1)
+        finally:
+            connection.execute('ROLLBACK')
+            connection.close()
+
+        self.assertEqual(os.listdir(self.temp_dir), ['tasker.sqlite'])
+
+    def test_dump_database(self):
+        progress = []
+        dump_database(
+            'sqlite:///{}'.format(self.db_path),
+            self.backup_path,
+            batch_size=2,
+            progress=lambda *args: progress.append(args)
+        )
+
+        with open(self.backup_path) as f:
+            lines = [json.loads(line) for line in f]
+
+        self.assertEqual(progress[-1], (len(lines), len(lines)))
+
+        tables = [line['table'] for line in lines]
+        self.assertLess(tables.index('tasks'), tables.index('taskinstances'))
+        self.assertIn({'table': 'taskinstances', 'row': {'id': 1, 'task': 1, 'date': '2016-11-03', 'done': False,
+                                                         'owner': None}}, lines)
+
+    def test_dump_database_snapshot(self):
+        # Write-ahead logging lets another connection commit while the dump is reading.
+        writer = sqlite3.connect(self.db_path, timeout=0)
+        writer.isolation_level = None
+        writer.execute('PRAGMA journal_mode=WAL')
+        self.addCleanup(writer.close)
+
+        def write_once(dumped, total):
+            if dumped == 1:
+                writer.execute("INSERT INTO tasks (name, cadence, start) VALUES ('Pay bills', 'monthly', '2016-11-04')")
+
+        dump_database('sqlite:///{}'.format(self.db_path), self.backup_path, batch_size=1, progress=write_once)
+
+        with open(self.backup_path) as f:
+            names = [row['row']['name'] for row in (json.loads(line) for line in f) if row['table'] == 'tasks']
+        self.assertEqual(names, ['Make coffee', 'Get gas'])
+
+    def test_print_progress(self):
+        stream = StringIO()
+        times = iter([10, 12, 14])
+        report = print_progress('rows', stream=stream, clock=lambda: next(times))
+
+        report(50, 100)
+        report(100, 100)
+
+        self.assertEqual(stream.getvalue(), '\r50 of 100 rows copied (25 rows/s)\r100 of 100 rows copied (25 rows/s)\n')
@@ -1,12 +1,21 @@
+import json
 import os
+import shutil
+import tempfile
+import threading
 from datetime import date
+from StringIO import StringIO
 from subprocess import Popen, PIPE
 from unittest import TestCase
 
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 
+from src.cli import TaskerCli, run
+from src.database import create_database_engine, create_session
 from src.models import Base, Task, TaskInstance
+from src.tasker import Tasker
 
 CLI_ENTER_TASK_NAME_STRING = 'Enter task name: '
 CLI_ENTER_CADENCE_STRING = 'Available cadences:\n  1. Once\n  2. Daily\n  3. Weekly\n  4. Monthly\nSelect cadence: '
@@ -54,8 +63,8 @@ class CliTest(TestCase):
 
         return session()
 
-    def _call_cli(self, cli_args, stdin=None):
-        full_command = ['python', self.cli_path, '--database', self.db_uri] + cli_args
+    def _call_cli(self, cli_args, stdin=None, cli_path=None):
+        full_command = ['python', cli_path or self.cli_path, '--database', self.db_uri] + cli_args
 
         env = os.environ.copy()
         env['PYTHONPATH'] = self.root_dir
@@ -237,3 +246,373 @@ class CliTest(TestCase):
         task_instances = self._connect_db().query(TaskInstance).all()
 
         self.assertEqual(task_instances, [TaskInstance(id=1, task=1, date=date(2017, 11, 6), done=True)])
+
+    def test_check_filtered(self):
+        self._call_cli(['create', '--project', 'home', '--tag', 'kitchen'], stdin='Make coffee\ndaily\n2017-11-06\n')
+        self._call_cli(['create', '--tag', 'errand'], stdin='Get gas\nweekly\n2017-11-07\n')
+
+        val = self._call_cli(['check', '--tag', 'errand'])
+
+        output_str = '{}    2. (2017-11-07) Get gas\n{}'.format(
+            THINGS_TO_DO_STRING, self.complete_task_string.replace('complete N', 'complete --tag "errand" N')
+        )
+        self.assertEqual(val, (0, output_str, ''))
+
+        val = self._call_cli(['complete', '--project', 'home', '2'])
+        self.assertEqual(val, (0, '', ''))
+
+        val = self._call_cli(['complete', '--project', 'home', '1'])
+        self.assertEqual(val, (0, '', ''))
+
+        task_instances = self._connect_db().query(TaskInstance).all()
+
+        self.assertEqual(task_instances, [
+            TaskInstance(id=1, task=1, date=date(2017, 11, 6), done=True),
+            TaskInstance(id=2, task=2, date=date(2017, 11, 7), done=False)
+        ])
+
+    def test_find(self):
+        self._call_cli(['create'], stdin='Pay phone bill\nmonthly\n2017-11-06\n')
+        self._call_cli(['create'], stdin='Phone mom\nweekly\n2017-11-07\n')
+
+        val = self._call_cli(['find', 'phone', 'pay'])
+        self.assertEqual(val, (0, '    1. Pay phone bill (monthly)\n', ''))
+
+        val = self._call_cli(['find', 'mow'])
+        self.assertEqual(val, (0, '', ''))
+
+    def test_stats(self):
+        self._call_cli(['create'], stdin='Do some things\ndaily\n2017-11-06\n')
+        self._call_cli(['create'], stdin='Do other things\nweekly\n2017-11-07\n')
+        self._call_cli(['check'])
+        self._call_cli(['complete', '1'])
+
+        val = self._call_cli(['stats'])
+        days_late = (date.today() - date(2017, 11, 6)).days
+        output_str = (
+            '    1. Do some things (daily): 1 of 1 done (100%), {:.1f} days late on average\n'
+            '    2. Do other things (weekly): 0 of 1 done (0%), 0.0 days late on average\n'
+        ).format(days_late)
+        self.assertEqual(val, (0, output_str, ''))
+
+        val = self._call_cli(['stats', '--rebuild', '--by-cadence'])
+        output_str = (
+            '  daily: 1 of 1 done (100%), {:.1f} days late on average\n'
+            '  weekly: 0 of 1 done (0%), 0.0 days late on average\n'
+        ).format(days_late)
+        self.assertEqual(val, (0, output_str, ''))
+
+    def test_check_multiple_databases(self):
+        other_db_path = os.path.join(self.test_root_dir, 'tasker_tests_other.sqlite')
+        other_db_uri = 'sqlite:///{}'.format(other_db_path)
+        self.addCleanup(os.unlink, other_db_path)
+
+        self._call_cli(['create'], stdin='Do some things\ndaily\n2017-11-07\n')
+        Tasker(create_session(other_db_uri)).create_task('Do other things', 'daily', date(2017, 11, 6))
+
+        val = self._call_cli(['--database', other_db_uri, 'check'])
+
+        output_str = '{}    1. (2017-11-06) Do other things [{}]\n    1. (2017-11-07) Do some things [{}]\n{}'.format(
+            THINGS_TO_DO_STRING,
+            other_db_uri,
+            self.db_uri,
+            'To complete any task, use:\n    {} --database SOURCE complete N\n'.format(self.cli_path)
+        )
+        self.assertEqual(val, (0, output_str, ''))
+
+        val = self._call_cli(['--database', other_db_uri, 'complete', '1'])
+        self.assertEqual(val[0], 2)
+        self.assertIn('complete only supports a single --database', val[2])
+
+        databases_file_path = os.path.join(self.test_root_dir, 'tasker_tests_databases')
+        self.addCleanup(os.unlink, databases_file_path)
+        with open(databases_file_path, 'w') as f:
+            f.write('# Shared with the laptop\n{}\n\n'.format(other_db_uri))
+
+        self.assertEqual(self._call_cli(['--databases-file', databases_file_path, 'check']), (0, output_str, ''))
+
+        val = self._call_cli(['--databases-file', os.path.join(self.test_root_dir, 'missing'), 'check'])
+        self.assertEqual(val[0], 2)
+        self.assertIn('can\'t read --databases-file', val[2])
+
+    def test_argument_starting_with_at(self):
+        self._call_cli(['--owner', '@home', 'create'], stdin='Do some things\ndaily\n2017-11-07\n')
+
+        val = self._call_cli(['--owner', '@home', 'check'])
+        self.assertEqual(val[0], 0)
+        self.assertIn('1. (2017-11-07) Do some things', val[1])
+
+    def test_complete_journaled(self):
+        journal_path = os.path.join(self.test_root_dir, 'tasker_tests.journal')
+        self.addCleanup(lambda: os.path.exists(journal_path) and os.unlink(journal_path))
+
+        self._call_cli(['create'], stdin='Do some things\ndaily\n2017-11-06\n')
+        self._call_cli(['create'], stdin='Do other things\ndaily\n2017-11-06\n')
+        val = self._call_cli(['--journal', journal_path, 'check'])
+
+        output_str = '{}    1. (2017-11-06) Do some things\n    2. (2017-11-06) Do other things\n{}'.format(
+            THINGS_TO_DO_STRING,
+            self.complete_task_string.replace('complete N', '--journal "{}" complete N'.format(journal_path))
+        )
+        self.assertEqual(val, (0, output_str, ''))
+
+        val = self._call_cli(['--journal', journal_path, 'complete', '1'])
+        self.assertEqual(val, (0, '', ''))
+        val = self._call_cli(['--journal', journal_path, 'complete', 'abc'])
+        self.assertEqual(val, (0, '', ''))
+
+        task_instances = self._connect_db().query(TaskInstance).filter(TaskInstance.done == True).all()  # noqa: E712
+        self.assertEqual(task_instances, [])
+
+        val = self._call_cli(['--journal', journal_path, 'sync'])
+        self.assertEqual(val, (0, '', ''))
+
+        task_instances = self._connect_db().query(TaskInstance).filter(TaskInstance.done == True).all()  # noqa: E712
+        self.assertEqual(task_instances, [TaskInstance(id=1, task=1, date=date(2017, 11, 6), done=True)])
+
+    def test_sync_databases(self):
+        other_db_path = os.path.join(self.test_root_dir, 'tasker_tests_other.sqlite')
+        other_db_uri = 'sqlite:///{}'.format(other_db_path)
+        self.addCleanup(os.unlink, other_db_path)
+
+        self._call_cli(['create'], stdin='Do some things\ndaily\n2017-11-06\n')
+        Tasker(create_session(other_db_uri)).create_task('Do other things', 'daily', date(2017, 11, 6))
+
+        val = self._call_cli(['sync', other_db_uri])
+        self.assertEqual(val, (0, 'Received 1 and sent 1 changes.\n', ''))
+
+        tasks = self._connect_db().query(Task).all()
+
+        self.assertEqual(tasks, [
+            Task(id=1, name='Do some things', cadence='daily', start=date(2017, 11, 6)),
+            Task(id=2, name='Do other things', cadence='daily', start=date(2017, 11, 6))
+        ])
+
+    def test_owner(self):
+        self._call_cli(['--owner', 'alice', 'create'], stdin='Make coffee\ndaily\n2017-11-06\n')
+        self._call_cli(['--owner', 'bob', 'create'], stdin='Make coffee\ndaily\n2017-11-07\n')
+
+        val = self._call_cli(['--owner', 'bob', 'check'])
+
+        output_str = '{}    1. (2017-11-07) Make coffee\n{}'.format(
+            THINGS_TO_DO_STRING, self.complete_task_string.replace('complete N', '--owner "bob" complete N')
+        )
+        self.assertEqual(val, (0, output_str, ''))
+
+        val = self._call_cli(['--owner', 'alice', 'complete', '1'])
+        self.assertEqual(val, (0, '', ''))
+
+        task_instances = self._connect_db().query(TaskInstance).all()
+
+        self.assertEqual(task_instances, [
+            TaskInstance(id=1, task=2, date=date(2017, 11, 7), done=False, owner='bob')
+        ])
+
+    def test_backup(self):
+        backup_path = os.path.join(self.test_root_dir, 'tasker_tests_backup.sqlite')
+        self.addCleanup(lambda: os.path.exists(backup_path) and os.unlink(backup_path))
+
+        self._call_cli(['create'], stdin='Do some things\ndaily\n2017-11-06\n')
+
+        val = self._call_cli(['backup', backup_path])
+        self.assertEqual(val[:2], (0, ''))
+        self.assertIn(' pages copied (', val[2])
+
+        tasks = create_session('sqlite:///{}'.format(backup_path)).query(Task).all()
+
+        self.assertEqual(tasks, [Task(id=1, name='Do some things', cadence='daily', start=date(2017, 11, 6))])
+
+        val = self._call_cli(['backup', '--jsonl', backup_path])
+        self.assertEqual(val[:2], (0, ''))
+        self.assertIn('rows copied (', val[2])
+
+        with open(backup_path) as f:
+            self.assertIn('"name": "Do some things"', f.read())
+
+    def test_count(self):
+        main_path = os.path.join(self.root_dir, 'src', 'main.py')
+
+        # The database doesn't exist yet, so the fast path passes this on to the full interface.
+        val = self._call_cli(['count'], cli_path=main_path)
+        self.assertEqual(val, (0, '0\n', ''))
+
+        self._call_cli(['create'], stdin='Do some things\ndaily\n2017-11-06\n')
+        self._call_cli(['create'], stdin='Do other things\ndaily\n2017-11-06\n')
+        self._call_cli(['check'])
+
+        self.assertEqual(self._call_cli(['count']), (0, '2\n', ''))
+        self.assertEqual(self._call_cli(['count'], cli_path=main_path), (0, '2\n', ''))
+        self.assertEqual(self._call_cli(['--owner', 'bob', 'count'], cli_path=main_path), (0, '0\n', ''))
+
+        self._call_cli(['complete', '1'])
+
+        self.assertEqual(self._call_cli(['count']), (0, '1\n', ''))
+        self.assertEqual(self._call_cli(['count'], cli_path=main_path), (0, '1\n', ''))
+
+    def test_hooks(self):
+        log_path = os.path.join(self.test_root_dir, 'tasker_tests_hooks.log')
+        self.addCleanup(lambda: os.path.exists(log_path) and os.unlink(log_path))
+
+        self._call_cli(['create'], stdin='Do some things\ndaily\n2017-11-06\n')
+        self._call_cli(['--hook-log', log_path, 'check'])
+        self._call_cli(['--hook-log', log_path, 'complete', '1'])
+
+        # The hooks run in the background, but the process doesn't exit until they're done.
+        with open(log_path) as f:
+            self.assertEqual([json.loads(line) for line in f], [
+                {'event': 'scheduled', 'id': 1, 'name': 'Do some things', 'date': '2017-11-06', 'owner': None},
+                {'event': 'completed', 'id': 1, 'name': 'Do some things', 'date': '2017-11-06', 'owner': None}
+            ])
+
+    def test_check_formats(self):
+        self._call_cli(['create'], stdin='Do some things\ndaily\n2017-11-06\n')
+        self._call_cli(['create'], stdin='Do other things\nweekly\n2017-11-07\n')
+
+        val = self._call_cli(['check', '--format', 'json'])
+        self.assertEqual(val[0], 0)
+        self.assertEqual(json.loads(val[1]), [
+            {'id': 1, 'name': 'Do some things', 'date': '2017-11-06'},
+            {'id': 2, 'name': 'Do other things', 'date': '2017-11-07'}
+        ])
+
+        val = self._call_cli(['check', '--format', 'jsonl', '--tag', 'none'])
+        self.assertEqual(val, (0, '', ''))
+
+        val = self._call_cli(['check', '--format', 'tsv'])
+        output_str = 'id\tname\tdate\n1\tDo some things\t2017-11-06\n2\tDo other things\t2017-11-07\n'
+        self.assertEqual(val, (0, output_str, ''))
+
+    def test_depend(self):
+        self._call_cli(['create'], stdin='Collect invoices\nmonthly\n2017-11-01\n')
+        self._call_cli(['create'], stdin='Pay bills\nmonthly\n2017-11-03\n')
+
+        val = self._call_cli(['depend', 'Pay bills', 'Collect invoices'])
+        self.assertEqual(val, (0, '', ''))
+
+        val = self._call_cli(['depend', 'Collect invoices', 'Pay bills'])
+        self.assertEqual(val, (255, '', 'Task "Pay bills" already waits for "Collect invoices".\n'))
+
+        val = self._call_cli(['depend'])
+        self.assertEqual(val, (0, 'Pay bills waits for Collect invoices\n', ''))
+
+        val = self._call_cli(['check'])
+        self.assertEqual(val, (0, '{}    1. (2017-11-01) Collect invoices\n{}'.format(
+            THINGS_TO_DO_STRING, self.complete_task_string
+        ), ''))
+
+    def test_shards(self):
+        shard_paths = [os.path.join(self.test_root_dir, 'tasker_tests-{}.sqlite'.format(i)) for i in xrange(2)]
+        for path in shard_paths:
+            self.addCleanup(lambda path=path: os.path.exists(path) and os.unlink(path))
+
+        # Make coffee is kept in the first shard, and Review code in the second.
+        self._call_cli(['--shards', '2', 'create'], stdin='Make coffee\ndaily\n2017-11-06\n')
+        self._call_cli(['--shards', '2', 'create'], stdin='Review code\ndaily\n2017-11-06\n')
+        self.assertFalse(os.path.exists(self.db_path))
+
+        val = self._call_cli(['--shards', '2', 'check'])
+        self.assertEqual(val, (0, '{}    2. (2017-11-06) Make coffee\n    3. (2017-11-06) Review code\n{}'.format(
+            THINGS_TO_DO_STRING, self.complete_task_string.replace('complete N', '--shards 2 complete N')
+        ), ''))
+
+        self.assertEqual(self._call_cli(['--shards', '2', 'complete', '3']), (0, '', ''))
+        self.assertEqual(self._call_cli(['--shards', '2', 'complete', 'abc']), (0, '', ''))
+        self.assertEqual(self._call_cli(['--shards', '2', 'count']), (0, '1\n', ''))
+
+        val = self._call_cli(['--shards', '2', 'stats'])
+        self.assertEqual(val[0], 2)
+        self.assertIn('stats doesn\'t support --shards', val[2])
+
+
+class CliRunTest(TestCase):
+    def setUp(self):
+        super(CliRunTest, self).setUp()
+        self.engine = create_database_engine('sqlite://')
+
+    def tearDown(self):
+        super(CliRunTest, self).tearDown()
+        self.engine.dispose()
+
+    def _run(self, argv, stdin=''):
+        stdout, stderr = StringIO(), StringIO()
+        status = run(argv, stdin=StringIO(stdin), stdout=stdout, stderr=stderr, database=self.engine, program='tasker')
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_run(self):
+        val = self._run(['create'], stdin='Do some things\nonce\n2017-11-06\n')
+        self.assertEqual(val, (0, '{}{}{}'.format(
+            CLI_ENTER_TASK_NAME_STRING, CLI_ENTER_CADENCE_STRING, CLI_ENTER_START_DATE_STRING
+        ), ''))
+
+        val = self._run(['check'])
+        self.assertEqual(val, (0, '{}    1. (2017-11-06) Do some things\n{}'.format(
+            THINGS_TO_DO_STRING, 'To complete any task, use:\n    tasker --database "sqlite://" complete N\n'
+        ), ''))
+
+        self.assertEqual(self._run(['complete', '1']), (0, '', ''))
+        self.assertEqual(self._run(['--format', 'jsonl', 'check'])[0], 2)
+        self.assertEqual(self._run(['check', '--format', 'tsv']), (0, 'id\tname\tdate\n', ''))
+
+    def test_run_with_session(self):
+        db = sessionmaker(bind=self.engine)()
+        Tasker(db).create_task('Do some things', 'daily', date(2017, 11, 6))
+
+        stdout = StringIO()
+        self.assertEqual(run(['count'], stdout=stdout, database=db), 0)
+        self.assertEqual(stdout.getvalue(), '0\n')
+
+        # The session is left open for its owner to keep using.
+        self.assertEqual(len(Tasker(db).schedule_tasks(until_date=date(2017, 11, 6))), 1)
+
+    def test_run_errors(self):
+        status, stdout, stderr = self._run([])
+        self.assertEqual((status, stdout), (2, ''))
+        self.assertIn('usage: tasker', stderr)
+
+        status, stdout, stderr = self._run(['complete'])
+        self.assertEqual((status, stdout), (2, ''))
+        self.assertIn('usage: tasker complete', stderr)
+
+        status, stdout, stderr = self._run(['--help'])
+        self.assertEqual((status, stderr), (0, ''))
+        self.assertIn('usage: tasker', stdout)
+
+        self.assertEqual(self._run(['create'], stdin='Do some things\n'), (-1, '{}{}\n'.format(
+            CLI_ENTER_TASK_NAME_STRING, CLI_ENTER_CADENCE_STRING
+        ), ''))
+        val = self._run(['depend', 'Pay bills', 'Collect invoices'])
+        self.assertEqual(val, (-1, '', 'Task "Pay bills" doesn\'t exist.\n'))
+
+    def test_run_hook_errors(self):
+        self._run(['create'], stdin='Do some things\nonce\n2017-11-06\n')
+
+        log_path = os.path.join(tempfile.gettempdir(), 'missing', 'hooks.log')
+        status, _, stderr = self._run(['--hook-log', log_path, 'check'])
+        self.assertEqual(status, 0)
+        self.assertIn('Hook for scheduled event of Do some things failed', stderr)
+
+    def test_hooks_closed_when_database_fails(self):
+        threads = threading.active_count()
+
+        self.assertRaises(
+            OperationalError, TaskerCli, 'sqlite:////missing/tasker.sqlite', hooks=[lambda event: None]
+        )
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_run_export(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('NumPy isn\'t installed')
+
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        destination = os.path.join(temp_dir, 'tasks.npz')
+
+        self._run(['create'], stdin='Do some things\nonce\n2017-11-06\n')
+        self._run(['check'])
+        self.assertEqual(self._run(['export', '--npz', destination]), (0, '', ''))
+
+        archive = numpy.load(destination)
+        self.assertEqual(archive['id'].tolist(), [1])
+        self.assertEqual(archive['cadence_names'][archive['cadence']].tolist(), ['once'])
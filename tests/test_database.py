@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import TestCase
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from src.database import create_session, upgrade_schema
+from src.models import Base
+from src.tasker import Tasker
+
+
+class DatabaseTest(TestCase):
+    def setUp(self):
+        super(DatabaseTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_uri = 'sqlite:///{}'.format(os.path.join(self.temp_dir, 'tasker.sqlite'))
+
+    def tearDown(self):
+        super(DatabaseTest, self).tearDown()
+        shutil.rmtree(self.temp_dir)
+
+    def test_create_session_upgrades_schema(self):
+        # The tables as they were created by the first versions of tasker.
+        engine = create_engine(self.db_uri)
+        engine.execute(
+            'CREATE TABLE tasks (id INTEGER NOT NULL, name VARCHAR(1024) NOT NULL, cadence VARCHAR(32) NOT NULL, '
+            'start DATE NOT NULL, PRIMARY KEY (id))'
+        )
+        engine.execute(
+            'CREATE TABLE taskinstances (id INTEGER NOT NULL, task INTEGER NOT NULL, date DATE NOT NULL, '
+            'done BOOLEAN NOT NULL, PRIMARY KEY (id), FOREIGN KEY(task) REFERENCES tasks (id))'
+        )
+        engine.execute("INSERT INTO tasks VALUES (1, 'Make coffee', 'daily', '2016-11-03')")
+        engine.execute("INSERT INTO taskinstances VALUES (1, 1, '2016-11-03', 1)")
+        engine.dispose()
+
+        db = create_session(self.db_uri)
+        try:
+            inspector = inspect(db.get_bind())
+            columns = [c['name'] for c in inspector.get_columns('taskinstances')]
+            indexes = [i['name'] for i in inspector.get_indexes('taskinstances')]
+            self.assertIn('owner', columns)
+            self.assertIn('ix_taskinstances_owner_task_date', indexes)
+
+            tasker = Tasker(db)
+            self.assertEqual(tasker.schedule_tasks(until_date=date(2016, 11, 4))[0].date, date(2016, 11, 4))
+        finally:
+            db.close()
+
+    def test_create_session_counts_pending_task_instances(self):
+        db = create_session(self.db_uri)
+        try:
+            tasker = Tasker(db)
+            tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+            Tasker(db, owner='bob').create_task('Get gas', 'weekly', date(2016, 11, 5))
+            tasker.schedule_tasks(until_date=date(2016, 11, 5))
+
+            # Simulate a database from before the counts were kept.
+            db.execute('DROP TABLE pendingcounts')
+            db.commit()
+        finally:
+            db.close()
+
+        db = create_session(self.db_uri)
+        try:
+            self.assertEqual(Tasker(db).pending_count(), 2)
+            self.assertEqual(Tasker(db, owner='bob').pending_count(), 1)
+        finally:
+            db.close()
+
+    def test_create_session_rolls_up_task_statistics(self):
+        db = create_session(self.db_uri)
+        try:
+            tasker = Tasker(db)
+            tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+            tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+            tasker.schedule_tasks(until_date=date(2016, 11, 4))
+            tasker.complete_task_instance(1)
+            tasker.schedule_tasks(until_date=date(2016, 11, 4))
+
+            # Simulate a database from before the rollup was kept.
+            db.execute('DROP TABLE taskstatistics')
+            db.commit()
+        finally:
+            db.close()
+
+        db = create_session(self.db_uri)
+        try:
+            self.assertEqual(Tasker(db).get_statistics(), [
+                (1, 'Make coffee', 'daily', 2, 1, 0),
+                (2, 'Get gas', 'weekly', 0, 0, 0)
+            ])
+        finally:
+            db.close()
+
+    def test_upgrade_schema(self):
+        # The tables as they were created by the first versions of tasker.
+        engine = create_engine(self.db_uri)
+        engine.execute(
+            'CREATE TABLE tasks (id INTEGER NOT NULL, name VARCHAR(1024) NOT NULL, cadence VARCHAR(32) NOT NULL, '
+            'start DATE NOT NULL, PRIMARY KEY (id))'
+        )
+        engine.execute("INSERT INTO tasks VALUES (1, 'Make coffee', 'daily', '2016-11-03')")
+
+        upgrade_schema(engine)
+        upgrade_schema(engine)
+        Base.metadata.create_all(engine)
+
+        inspector = inspect(engine)
+        self.assertIn('project', [c['name'] for c in inspector.get_columns('tasks')])
+        self.assertIn('ix_tasks_project', [i['name'] for i in inspector.get_indexes('tasks')])
+
+        db = sessionmaker(bind=engine)()
+        try:
+            tasker = Tasker(db)
+            tasker.create_task('Get gas', 'weekly', date(2016, 11, 5), project='car')
+            tasker.schedule_tasks()
+            self.assertEqual([ti.name for ti in tasker.get_incomplete_task_instances()], ['Make coffee', 'Get gas'])
+            self.assertEqual([ti.name for ti in tasker.get_incomplete_task_instances(project='car')], ['Get gas'])
+        finally:
+            db.close()
+            engine.dispose()
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import TestCase, skipIf
+
+from src.database import create_session
+from src.export import ExportException, read_columns, write_columns
+from src.journal import CompletionJournal
+from src.tasker import Tasker
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@skipIf(numpy is None, 'NumPy isn\'t installed')
+class ExportTest(TestCase):
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+
+        self.db = create_session('sqlite://')
+        self.tasker = Tasker(self.db)
+        self.tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        self.tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        self.tasker.schedule_tasks(until_date=date(2016, 11, 5))
+        self.tasker.complete_task_instance(1)
+        self.tasker.schedule_tasks(until_date=date(2016, 11, 5))
+
+    def tearDown(self):
+        super(ExportTest, self).tearDown()
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_export_columns(self):
+        columns = self.tasker.export_columns(batch_size=2)
+
+        self.assertEqual(columns.keys(), ['id', 'task', 'date', 'done', 'cadence', 'cadence_names'])
+        self.assertEqual([columns[name].dtype for name in columns], [
+            numpy.dtype('int32'),
+            numpy.dtype('int32'),
+            numpy.dtype('datetime64[D]'),
+            numpy.dtype('bool'),
+            numpy.dtype('int8'),
+            numpy.dtype('S6')
+        ])
+
+        self.assertEqual(columns['id'].tolist(), [1, 2, 3])
+        self.assertEqual(columns['task'].tolist(), [1, 2, 1])
+        self.assertEqual(columns['date'].tolist(), [date(2016, 11, 3), date(2016, 11, 5), date(2016, 11, 4)])
+        self.assertEqual(columns['done'].tolist(), [True, False, False])
+        self.assertEqual(columns['cadence_names'][columns['cadence']].tolist(), ['daily', 'weekly', 'daily'])
+
+    def test_export_columns_owner_and_journal(self):
+        journal = CompletionJournal(os.path.join(self.temp_dir, 'journal'))
+        Tasker(self.db, owner='bob').create_task('Pay bills', 'monthly', date(2016, 11, 4))
+        Tasker(self.db, owner='bob').schedule_tasks(until_date=date(2016, 11, 5))
+
+        bob = Tasker(self.db, owner='bob', journal=journal)
+        journal.append(4)
+        columns = bob.export_columns()
+
+        self.assertEqual(columns['id'].tolist(), [4])
+        self.assertEqual(columns['done'].tolist(), [True])
+        self.assertEqual(columns['cadence_names'][columns['cadence']].tolist(), ['monthly'])
+
+    def test_export_columns_empty(self):
+        columns = Tasker(create_session('sqlite://')).export_columns()
+
+        self.assertEqual([len(column) for column in columns.values()], [0] * 6)
+
+    def test_read_columns_grows(self):
+        result = self.db.connection().execute('SELECT id, date FROM taskinstances ORDER BY id')
+        ids, dates = read_columns(result, ['int32', 'datetime64[D]'], batch_size=1, size_hint=1)
+
+        self.assertEqual(ids.tolist(), [1, 2, 3])
+        self.assertEqual(dates.tolist(), [date(2016, 11, 3), date(2016, 11, 5), date(2016, 11, 4)])
+
+    def test_write_columns(self):
+        columns = self.tasker.export_columns()
+        path = os.path.join(self.temp_dir, 'export')
+
+        write_columns(columns, path)
+        write_columns(columns, path)
+        self.assertEqual(sorted(os.listdir(path)), sorted('{}.npy'.format(name) for name in columns))
+
+        dates = numpy.load(os.path.join(path, 'date.npy'), mmap_mode='r')
+        self.assertIsInstance(dates, numpy.memmap)
+        self.assertEqual(dates.tolist(), columns['date'].tolist())
+
+        write_columns(columns, '{}.npz'.format(path), npz=True)
+        archive = numpy.load('{}.npz'.format(path))
+        self.assertEqual(sorted(archive.files), sorted(columns))
+        self.assertEqual(archive['done'].tolist(), columns['done'].tolist())
+        write_columns(columns, '{}.npz'.format(path), npz=True)
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ['export', 'export.npz'])
+
+    def test_write_columns_keeps_other_files(self):
+        columns = self.tasker.export_columns()
+        path = os.path.join(self.temp_dir, 'documents')
+        os.mkdir(path)
+        with open(os.path.join(path, 'thesis.txt'), 'w') as f:
+            f.write('Chapter 1')
+        with open(os.path.join(self.temp_dir, 'notes.txt'), 'w') as f:
+            f.write('Buy milk')
+
+        self.assertRaises(ExportException, write_columns, columns, path)
+        self.assertRaises(ExportException, write_columns, columns, path, npz=True)
+        self.assertRaises(ExportException, write_columns, columns, os.path.join(self.temp_dir, 'notes.txt'))
+        self.assertRaises(ExportException, write_columns, columns, os.path.join(self.temp_dir, 'notes.txt'), npz=True)
+
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ['documents', 'notes.txt'])
+        self.assertEqual(os.listdir(path), ['thesis.txt'])
+        with open(os.path.join(self.temp_dir, 'notes.txt')) as f:
+            self.assertEqual(f.read(), 'Buy milk')
+
+    def test_export_without_numpy(self):
+        import src.export
+        load_numpy = src.export.load_numpy
+        self.addCleanup(setattr, src.export, 'load_numpy', load_numpy)
+
+        def missing_numpy():
+            raise ExportException('Exporting needs NumPy')
+        src.export.load_numpy = missing_numpy
+
+        self.assertRaises(ExportException, write_columns, {}, os.path.join(self.temp_dir, 'export'))
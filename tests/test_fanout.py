@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import TestCase
+
+from src.database import create_session
+from src.fanout import check_databases, SourcedTaskInstance
+from src.tasker import Tasker
+
+
+class FanoutTest(TestCase):
+    def setUp(self):
+        super(FanoutTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_uris = [
+            'sqlite:///{}'.format(os.path.join(self.temp_dir, '{}.sqlite'.format(name)))
+            for name in ('personal', 'team', 'oncall')
+        ]
+
+    def tearDown(self):
+        super(FanoutTest, self).tearDown()
+        shutil.rmtree(self.temp_dir)
+
+    def _tasker(self, db_uri):
+        return Tasker(create_session(db_uri))
+
+    def test_check_databases(self):
+        self._tasker(self.db_uris[0]).create_task('Make coffee', 'daily', date(2016, 11, 3))
+        self._tasker(self.db_uris[0]).create_task('Get gas', 'weekly', date(2016, 11, 5))
+        self._tasker(self.db_uris[1]).create_task('Pay bills', 'monthly', date(2016, 11, 4), tags=['money'])
+        self._tasker(self.db_uris[1]).create_task('Review code', 'daily', date(2016, 11, 3))
+
+        tis = check_databases(self.db_uris, until_date=date(2016, 11, 30))
+
+        self.assertEqual(tis, [
+            SourcedTaskInstance(self.db_uris[0], 1, 'Make coffee', date(2016, 11, 3), False),
+            SourcedTaskInstance(self.db_uris[1], 2, 'Review code', date(2016, 11, 3), False),
+            SourcedTaskInstance(self.db_uris[1], 1, 'Pay bills', date(2016, 11, 4), False),
+            SourcedTaskInstance(self.db_uris[0], 2, 'Get gas', date(2016, 11, 5), False)
+        ])
+
+        tis = check_databases(self.db_uris, until_date=date(2016, 11, 30), tag='money')
+
+        self.assertEqual(tis, [SourcedTaskInstance(self.db_uris[1], 1, 'Pay bills', date(2016, 11, 4), False)])
+
+    def test_check_databases_nothing_exists(self):
+        self.assertEqual(check_databases(self.db_uris), [])
+        self.assertEqual(check_databases([]), [])
@@ -0,0 +1,169 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from datetime import date
+from StringIO import StringIO
+from unittest import TestCase
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.hooks import _close_open_pipelines, _open_pipelines, HookEvent, HookEvents, HookPipeline, log_hook, webhook
+from src.models import Base
+from src.tasker import Tasker
+
+
+class RecordingHook(object):
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+    __call__ = emit
+
+
+class HooksTest(TestCase):
+    def setUp(self):
+        super(HooksTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.event = HookEvent(HookEvents.SCHEDULED, 1, 'Make coffee', date(2016, 11, 3), None)
+
+    def tearDown(self):
+        super(HooksTest, self).tearDown()
+        shutil.rmtree(self.temp_dir)
+
+    def test_pipeline_runs_hooks(self):
+        first, second = RecordingHook(), RecordingHook()
+        pipeline = HookPipeline([first])
+        pipeline.add_hook(second)
+
+        pipeline.emit(self.event)
+        pipeline.close()
+
+        self.assertEqual(first.events, [self.event])
+        self.assertEqual(second.events, [self.event])
+
+    def test_pipeline_closed_at_exit(self):
+        hook = RecordingHook()
+        pipeline = HookPipeline([hook])
+        closed = HookPipeline()
+        closed.close()
+
+        # Closed pipelines aren't kept around until the process exits.
+        self.assertIn(pipeline, _open_pipelines)
+        self.assertNotIn(closed, _open_pipelines)
+
+        pipeline.emit(self.event)
+        _close_open_pipelines()
+        self.assertEqual(hook.events, [self.event])
+        self.assertNotIn(pipeline, _open_pipelines)
+
+    def test_pipeline_emit_after_close(self):
+        errors = StringIO()
+        hook = RecordingHook()
+        pipeline = HookPipeline([hook], workers=1, max_pending=1, errors=errors)
+        pipeline.close()
+
+        # The workers have stopped, so these would otherwise wait on the full queue forever.
+        emitter = threading.Thread(target=lambda: [pipeline.emit(self.event) for _ in xrange(3)])
+        emitter.daemon = True
+        emitter.start()
+        emitter.join(1)
+        self.assertFalse(emitter.is_alive())
+
+        self.assertEqual(hook.events, [])
+        self.assertEqual(errors.getvalue(), 'Hook pipeline is closed, dropped scheduled event of Make coffee\n' * 3)
+
+    def test_pipeline_back_pressure(self):
+        release = threading.Event()
+        pipeline = HookPipeline([lambda event: release.wait()], workers=1, max_pending=1)
+
+        # One call is taken by the worker, and one fills the queue, so the third has to wait.
+        emitter = threading.Thread(target=lambda: [pipeline.emit(self.event) for _ in xrange(3)])
+        emitter.start()
+        emitter.join(0.2)
+        self.assertTrue(emitter.is_alive())
+
+        release.set()
+        emitter.join()
+        pipeline.close()
+
+    def test_pipeline_timeout(self):
+        errors = StringIO()
+        release = threading.Event()
+        pipeline = HookPipeline([lambda event: release.wait()], workers=1, timeout=0.05, errors=errors)
+
+        start = time.time()
+        pipeline.emit(self.event)
+        pipeline.emit(self.event)
+        pipeline.close()
+        release.set()
+
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(errors.getvalue(), 'Hook for scheduled event of Make coffee timed out after 0.05s\n' * 2)
+
+    def test_pipeline_reports_failures(self):
+        errors = StringIO()
+        pipeline = HookPipeline([lambda event: 1 / 0], errors=errors)
+
+        pipeline.emit(self.event)
+        pipeline.close()
+
+        self.assertIn('Hook for scheduled event of Make coffee failed: ', errors.getvalue())
+
+    def test_webhook(self):
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+
+        webhook('http://127.0.0.1:{}/tasker'.format(server.server_port))(self.event)
+        thread.join()
+
+        self.assertEqual(received, [
+            {'event': 'scheduled', 'id': 1, 'name': 'Make coffee', 'date': '2016-11-03', 'owner': None}
+        ])
+
+    def test_log_hook(self):
+        path = os.path.join(self.temp_dir, 'events.log')
+        hook = log_hook(path)
+
+        hook(self.event)
+        hook(self.event._replace(kind=HookEvents.COMPLETED))
+
+        with open(path) as f:
+            self.assertEqual([json.loads(line)['event'] for line in f], ['scheduled', 'completed'])
+
+    def test_tasker_emits_events(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine)()
+
+        hooks = RecordingHook()
+        tasker = Tasker(db, hooks=hooks)
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+
+        tasker.schedule_tasks(until_date=date(2016, 11, 3))
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(1)
+
+        self.assertEqual(hooks.events, [
+            HookEvent(HookEvents.SCHEDULED, 1, 'Make coffee', date(2016, 11, 3), None),
+            HookEvent(HookEvents.COMPLETED, 1, 'Make coffee', date(2016, 11, 3), None)
+        ])
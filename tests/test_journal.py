@@ -0,0 +1,114 @@
+import fcntl
+import glob
+import os
+import shutil
+import tempfile
+import time
+from threading import Thread
+from unittest import TestCase
+
+from src.journal import CompletionJournal
+
+
+class CompletionJournalTest(TestCase):
+    def setUp(self):
+        super(CompletionJournalTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'journal')
+        self.journal = CompletionJournal(self.path)
+
+    def tearDown(self):
+        super(CompletionJournalTest, self).tearDown()
+        shutil.rmtree(self.temp_dir)
+
+    def test_append_pending(self):
+        self.assertEqual(self.journal.pending(), [])
+
+        self.journal.append(3)
+        self.journal.append('1')
+        self.journal.append(3)
+
+        self.assertEqual(self.journal.pending(), [1, 3])
+        self.assertEqual(CompletionJournal(self.path).pending(), [1, 3])
+
+    def test_pending_ignores_partial_entry(self):
+        self.journal.append(1)
+        with open(self.path, 'a') as f:
+            f.write('2')
+
+        self.assertEqual(self.journal.pending(), [1])
+
+    def test_flush(self):
+        self.journal.append(2)
+        self.journal.append(1)
+
+        applied = []
+        self.assertEqual(self.journal.flush(applied.append), [1, 2])
+        self.assertEqual(applied, [[1, 2]])
+        self.assertEqual(self.journal.pending(), [])
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+        self.assertEqual(self.journal.flush(applied.append), [])
+        self.assertEqual(applied, [[1, 2]])
+
+    def test_flush_failure_keeps_entries(self):
+        self.journal.append(1)
+
+        def fail(ids):
+            # Completions made while flushing go to a new journal.
+            self.journal.append(2)
+            self.assertEqual(self.journal.pending(), [1, 2])
+            raise RuntimeError()
+
+        self.assertRaises(RuntimeError, self.journal.flush, fail)
+        self.assertEqual(self.journal.pending(), [1, 2])
+
+        applied = []
+        self.journal.flush(applied.append)
+        self.assertEqual(applied, [[1, 2]])
+        self.assertEqual(self.journal.pending(), [])
+
+    def _lock_journal(self):
+        """
+        Open and lock the journal, as an append in progress in another process would.
+        """
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.addCleanup(os.close, fd)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _start(self, target, *args):
+        thread = Thread(target=target, args=args)
+        thread.start()
+        # Give the thread time to block on the lock.
+        time.sleep(0.1)
+        return thread
+
+    def test_flush_waits_for_append(self):
+        self.journal.append(1)
+        fd = self._lock_journal()
+
+        applied = []
+        thread = self._start(self.journal.flush, applied.append)
+        self.assertEqual(applied, [])
+
+        os.write(fd, '2\n')
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        thread.join()
+
+        self.assertEqual(applied, [[1, 2]])
+        self.assertEqual(self.journal.pending(), [])
+
+    def test_append_after_claim(self):
+        fd = self._lock_journal()
+        thread = self._start(self.journal.append, 1)
+
+        # A flush claims and reads the journal the append opened, before the append can write to it.
+        claimed_path = '{}.claimed.flushing'.format(self.path)
+        os.rename(self.path, claimed_path)
+        os.unlink(claimed_path)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        thread.join()
+
+        self.assertEqual(self.journal.pending(), [1])
+        self.assertEqual(glob.glob('{}.*'.format(self.path)), [])
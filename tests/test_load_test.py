@@ -0,0 +1,21 @@
+from unittest import TestCase
+
+from benchmarks.load_test import _percentile
+
+
+class LoadTestTest(TestCase):
+    def test_percentile(self):
+        self.assertEqual(_percentile([], 50), 0)
+
+        self.assertEqual(_percentile([3], 1), 3)
+        self.assertEqual(_percentile([3], 50), 3)
+        self.assertEqual(_percentile([3], 100), 3)
+
+        values = range(1, 101)
+        self.assertEqual(_percentile(values, 0), 1)
+        self.assertEqual(_percentile(values, 95.5), 96)
+        self.assertEqual(_percentile(values, 100), 100)
+
+        # Percentiles that land on a whole rank take that rank's value, not the next one.
+        self.assertEqual([_percentile(values, p) for p in xrange(1, 101)], range(1, 101))
+        self.assertEqual(_percentile(range(1, 11), 70), 7)
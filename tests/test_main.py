@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import TestCase
+
+from src.database import create_session
+from src.journal import CompletionJournal
+from src.main import DEFAULT_DATABASE_PATH, _parse_count_args, count_pending
+from src.tasker import Tasker
+
+
+class MainTest(TestCase):
+    def setUp(self):
+        super(MainTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'tasker.sqlite')
+        self.db_uri = 'sqlite:///{}'.format(self.db_path)
+
+    def tearDown(self):
+        super(MainTest, self).tearDown()
+        shutil.rmtree(self.temp_dir)
+
+    def test_parse_count_args(self):
+        self.assertEqual(_parse_count_args(['count']), (None, None, None))
+        self.assertEqual(_parse_count_args(['-d', 'sqlite:///a', '--owner=bob', '-j', 'j', 'count']),
+                         ('sqlite:///a', 'bob', 'j'))
+
+        self.assertIsNone(_parse_count_args(['check']))
+        self.assertIsNone(_parse_count_args(['count', '--help']))
+        self.assertIsNone(_parse_count_args(['-d', 'sqlite:///a', '-d', 'sqlite:///b', 'count']))
+        self.assertIsNone(_parse_count_args(['@arguments', 'count']))
+        self.assertIsNone(_parse_count_args(['--database']))
+
+    def test_count_pending(self):
+        db = create_session(self.db_uri)
+        try:
+            tasker = Tasker(db)
+            tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+            Tasker(db, owner='bob').create_task('Get gas', 'weekly', date(2016, 11, 5))
+            tasker.schedule_tasks(until_date=date(2016, 11, 5))
+
+            journal_path = os.path.join(self.temp_dir, 'journal')
+            CompletionJournal(journal_path).append(1)
+
+            self.assertEqual(count_pending(['-d', self.db_uri, 'count']), 2)
+            self.assertEqual(count_pending(['-d', self.db_uri, '-o', 'bob', 'count']), 1)
+            self.assertEqual(count_pending(['-d', self.db_uri, '-j', journal_path, 'count']), 1)
+            self.assertEqual(count_pending(['-d', self.db_uri, '-j', journal_path, '-o', 'bob', 'count']), 1)
+
+            self.assertEqual(
+                count_pending(['-d', self.db_uri, '-j', journal_path, 'count']),
+                Tasker(db, journal=CompletionJournal(journal_path)).pending_count()
+            )
+        finally:
+            db.close()
+
+    def test_count_pending_needs_full_interface(self):
+        self.assertIsNone(count_pending(['-d', self.db_uri, 'count']))
+        self.assertIsNone(count_pending(['-d', 'mysql://tasker@localhost/tasker', 'count']))
+        self.assertIsNone(count_pending(['-d', 'sqlite://', 'count']))
+
+        # A database from before the counts were kept.
+        with open(self.db_path, 'w'):
+            pass
+        self.assertIsNone(count_pending(['-d', self.db_uri, 'count']))
+
+    def test_default_database(self):
+        self.assertEqual(DEFAULT_DATABASE_PATH, os.path.join(os.path.expanduser('~'), '.tasker.sqlite'))
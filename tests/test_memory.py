@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import TestCase
+
+from src.memory import MemoryStore, MemoryTasker
+from tests.tasker_behaviour import TaskerBehaviour
+
+
+class MemoryTaskerBehaviourTest(TaskerBehaviour, TestCase):
+    def setUp(self):
+        super(MemoryTaskerBehaviourTest, self).setUp()
+        self.store = MemoryStore()
+
+    def create_tasker(self, owner=None):
+        return MemoryTasker(self.store, owner=owner)
+
+
+class MemoryStoreTest(TestCase):
+    def setUp(self):
+        super(MemoryStoreTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'tasker.snapshot')
+
+    def tearDown(self):
+        super(MemoryStoreTest, self).tearDown()
+        shutil.rmtree(self.temp_dir)
+
+    def _fill(self, store):
+        tasker = MemoryTasker(store)
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3), project='home', tags=['kitchen'])
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        tasker.schedule_tasks(until_date=date(2016, 11, 5))
+        tasker.complete_task_instance(1)
+        tasker.schedule_tasks(until_date=date(2016, 11, 5))
+
+    def _state(self, store):
+        tasker = MemoryTasker(store)
+        return tasker.get_task_schedules(), tasker.get_incomplete_task_instances(tag='kitchen'), \
+            tasker.get_statistics(), tasker.pending_count()
+
+    def test_reload_from_log(self):
+        store = MemoryStore(self.path)
+        self._fill(store)
+        store.close()
+
+        self.assertFalse(os.path.exists(self.path))
+        with open(store.log_path) as f:
+            self.assertEqual(len(f.readlines()), 6)
+
+        reloaded = MemoryStore(self.path)
+        self.assertEqual(self._state(reloaded), self._state(store))
+
+        # New ids carry on from the reloaded ones.
+        MemoryTasker(reloaded).create_task('Pay bills', 'monthly', date(2016, 11, 4))
+        self.assertEqual(MemoryTasker(reloaded).schedule_tasks(until_date=date(2016, 11, 5))[0].id, 4)
+
+    def test_reload_from_snapshot(self):
+        store = MemoryStore(self.path, snapshot_interval=4)
+        self._fill(store)
+        store.close()
+
+        # The snapshot taken after the fourth change emptied the log.
+        with open(store.log_path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+        reloaded = MemoryStore(self.path)
+        self.assertEqual(self._state(reloaded), self._state(store))
+
+    def test_reload_skips_changes_in_snapshot(self):
+        store = MemoryStore(self.path)
+        self._fill(store)
+
+        # As if the process stopped after writing the snapshot, but before emptying the log.
+        with open(store.log_path) as f:
+            log = f.read()
+        store.snapshot()
+        store.close()
+        with open(store.log_path, 'w') as f:
+            f.write(log)
+            f.write('[7, "complete", 2')
+
+        reloaded = MemoryStore(self.path)
+        self.assertEqual(self._state(reloaded), self._state(store))
+
+        # The partly written change is cut from the log, so changes made after reloading can be read back.
+        MemoryTasker(reloaded).create_task('Pay bills', 'monthly', date(2016, 11, 4))
+        reloaded.close()
+        self.assertEqual(self._state(MemoryStore(self.path)), self._state(reloaded))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import json
+from datetime import date
+from StringIO import StringIO
+from unittest import TestCase
+
+from src.output import BufferedWriter, OutputFormats, write_task_instances
+from src.tasker import ScheduledTaskInstance
+
+
+class CountingStream(StringIO):
+    def __init__(self):
+        StringIO.__init__(self)
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        StringIO.write(self, data)
+
+
+class OutputTest(TestCase):
+    def setUp(self):
+        super(OutputTest, self).setUp()
+        self.task_instances = [
+            ScheduledTaskInstance(1, u'Make coffee', date(2016, 11, 3), False),
+            ScheduledTaskInstance(2, u'Get gas\tand\nmilk ☕', date(2016, 11, 5), False)
+        ]
+
+    def _write(self, task_instances, output_format):
+        stream = StringIO()
+        write_task_instances(iter(task_instances), output_format, stream)
+        return stream.getvalue()
+
+    def test_json(self):
+        output = self._write(self.task_instances, OutputFormats.JSON)
+        self.assertEqual(json.loads(output), [
+            {'id': 1, 'name': 'Make coffee', 'date': '2016-11-03'},
+            {'id': 2, 'name': u'Get gas\tand\nmilk ☕', 'date': '2016-11-05'}
+        ])
+        self.assertEqual(json.loads(self._write([], OutputFormats.JSON)), [])
+
+    def test_jsonl(self):
+        output = self._write(self.task_instances, OutputFormats.JSONL)
+        self.assertEqual([json.loads(line)['id'] for line in output.splitlines()], [1, 2])
+        self.assertEqual(self._write([], OutputFormats.JSONL), '')
+
+    def test_tsv(self):
+        self.assertEqual(self._write(self.task_instances, OutputFormats.TSV), (
+            'id\tname\tdate\n'
+            '1\tMake coffee\t2016-11-03\n'
+            '2\tGet gas\\tand\\nmilk \xe2\x98\x95\t2016-11-05\n'
+        ))
+
+    def test_buffered_writer(self):
+        stream = CountingStream()
+        writer = BufferedWriter(stream, buffer_size=10)
+
+        for _ in xrange(10):
+            writer.write('abcd')
+        writer.flush()
+
+        self.assertEqual(stream.getvalue(), 'abcd' * 10)
+        self.assertEqual(stream.writes, 4)
@@ -0,0 +1,91 @@
+from datetime import date
+from unittest import TestCase
+
+from src.database import create_session
+from src.hooks import HookEvent, HookEvents
+from src.models import TaskInstance
+from src.sharding import ShardedTasker, ShardingException, shard_database_uris
+from src.tasker import DuplicateNameException, ScheduledTaskInstance
+
+
+class _RecordedHooks(object):
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+class ShardingTest(TestCase):
+    def setUp(self):
+        super(ShardingTest, self).setUp()
+        self.dbs = [create_session('sqlite://') for _ in xrange(3)]
+        self.hooks = _RecordedHooks()
+        self.tasker = ShardedTasker(self.dbs, hooks=self.hooks)
+
+        # Pay bills and Review code hash to shard 0, Make coffee to shard 1, and Get gas to shard 2.
+        self.tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        self.tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        self.tasker.create_task('Pay bills', 'monthly', date(2016, 11, 4))
+        self.tasker.create_task('Review code', 'daily', date(2016, 11, 3))
+
+    def test_create_task_routes_by_name(self):
+        self.assertEqual([self.tasker.shard_for_name(name) for name in ('Pay bills', 'Make coffee', 'Get gas')],
+                         [0, 1, 2])
+        self.assertEqual(self.tasker.shard_for_name(u'Pay bills'), 0)
+
+        self.assertEqual([[task.name for task in tasker.get_task_schedules()] for tasker in self.tasker.shards], [
+            ['Pay bills', 'Review code'],
+            ['Make coffee'],
+            ['Get gas']
+        ])
+
+        self.assertRaises(DuplicateNameException, self.tasker.create_task, 'Get gas', 'daily', date(2016, 11, 3))
+
+    def test_schedule_tasks(self):
+        self.assertEqual(self.tasker.schedule_tasks(until_date=date(2016, 11, 3)), [
+            ScheduledTaskInstance(3, 'Review code', date(2016, 11, 3), False),
+            ScheduledTaskInstance(4, 'Make coffee', date(2016, 11, 3), False)
+        ])
+
+        self.assertEqual(self.dbs[1].query(TaskInstance.id).all(), [(1,)])
+        self.assertEqual(self.hooks.events, [
+            HookEvent(HookEvents.SCHEDULED, 3, 'Review code', date(2016, 11, 3), None),
+            HookEvent(HookEvents.SCHEDULED, 4, 'Make coffee', date(2016, 11, 3), None)
+        ])
+
+    def test_get_incomplete_task_instances(self):
+        self.tasker.schedule_tasks(until_date=date(2016, 11, 3))
+        self.tasker.schedule_tasks(until_date=date(2016, 11, 5))
+
+        expected = [
+            ScheduledTaskInstance(3, 'Review code', date(2016, 11, 3), False),
+            ScheduledTaskInstance(4, 'Make coffee', date(2016, 11, 3), False),
+            ScheduledTaskInstance(6, 'Pay bills', date(2016, 11, 4), False),
+            ScheduledTaskInstance(5, 'Get gas', date(2016, 11, 5), False)
+        ]
+        self.assertEqual(self.tasker.get_incomplete_task_instances(), expected)
+        self.assertEqual(list(self.tasker.iter_incomplete_task_instances(batch_size=1)), expected)
+
+    def test_complete_task_instance(self):
+        self.tasker.schedule_tasks(until_date=date(2016, 11, 5))
+        self.assertEqual(self.tasker.pending_count(), 4)
+
+        self.tasker.complete_task_instance('4')
+        self.tasker.complete_task_instance('abc')
+
+        self.assertEqual(self.dbs[1].query(TaskInstance.done).all(), [(True,)])
+        self.assertEqual(self.dbs[0].query(TaskInstance.done).all(), [(False,), (False,)])
+        self.assertEqual(self.tasker.pending_count(), 3)
+        self.assertEqual(self.tasker.get_done_task_instance_ids([3, 4, 5]), [4])
+        self.assertEqual(self.hooks.events[-1], HookEvent(HookEvents.COMPLETED, 4, 'Make coffee', date(2016, 11, 3),
+                                                          None))
+
+    def test_shard_database_uris(self):
+        self.assertEqual(shard_database_uris('sqlite:////home/user/.tasker.sqlite', 2), [
+            'sqlite:////home/user/.tasker-0.sqlite',
+            'sqlite:////home/user/.tasker-1.sqlite'
+        ])
+
+        self.assertRaises(ShardingException, shard_database_uris, 'sqlite://', 2)
+        self.assertRaises(ShardingException, shard_database_uris, 'postgresql://localhost/tasker', 2)
@@ -0,0 +1,169 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import TestCase
+
+from src.database import create_session
+from src.models import Change, Task, TaskInstance, TaskTag
+from src.sync import synchronize
+from src.tasker import Tasker
+
+
+class SyncTest(TestCase):
+    def setUp(self):
+        super(SyncTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+
+        self.laptop_db = create_session('sqlite:///{}'.format(os.path.join(self.temp_dir, 'laptop.sqlite')))
+        self.workstation_db = create_session('sqlite:///{}'.format(os.path.join(self.temp_dir, 'workstation.sqlite')))
+
+        self.laptop = Tasker(self.laptop_db)
+        self.workstation = Tasker(self.workstation_db)
+
+    def tearDown(self):
+        super(SyncTest, self).tearDown()
+        self.laptop_db.close()
+        self.workstation_db.close()
+        shutil.rmtree(self.temp_dir)
+
+    @staticmethod
+    def _task_instances(db):
+        return db \
+            .query(Task.name, TaskInstance.date, TaskInstance.done) \
+            .join(TaskInstance, TaskInstance.task == Task.id) \
+            .order_by(TaskInstance.date, Task.name) \
+            .all()
+
+    def test_synchronize(self):
+        self.laptop.create_task('Make coffee', 'daily', date(2016, 11, 3), project='home', tags=['kitchen'])
+        self.workstation.create_task('Get gas', 'weekly', date(2016, 11, 5))
+
+        self.assertEqual(synchronize(self.laptop, self.workstation), (1, 1))
+
+        self.assertEqual(
+            self.workstation_db.query(Task.name, Task.cadence, Task.start, Task.project).order_by(Task.name).all(),
+            [('Get gas', 'weekly', date(2016, 11, 5), None), ('Make coffee', 'daily', date(2016, 11, 3), 'home')]
+        )
+        self.assertEqual(self.workstation_db.query(TaskTag.tag).all(), [('kitchen',)])
+
+        # Both schedule the same instances, and complete different ones.
+        self.laptop.schedule_tasks(until_date=date(2016, 11, 5))
+        self.workstation.schedule_tasks(until_date=date(2016, 11, 5))
+        self.laptop.complete_task_instance(1)
+        self.workstation.complete_task_instance(1)
+        self.laptop.schedule_tasks(until_date=date(2016, 11, 5))
+
+        self.assertEqual(synchronize(self.laptop, self.workstation), (1, 2))
+
+        expected = [
+            ('Make coffee', date(2016, 11, 3), True),
+            ('Make coffee', date(2016, 11, 4), False),
+            ('Get gas', date(2016, 11, 5), True)
+        ]
+        self.assertEqual(self._task_instances(self.laptop_db), expected)
+        self.assertEqual(self._task_instances(self.workstation_db), expected)
+        self.assertEqual(
+            [(row.name, row.scheduled, row.done) for row in self.laptop.get_statistics()],
+            [('Make coffee', 2, 1), ('Get gas', 1, 1)]
+        )
+
+        # Nothing's exchanged twice.
+        self.assertEqual(synchronize(self.laptop, self.workstation), (0, 0))
+        self.assertEqual(self.laptop.get_changes(after_seq=self.workstation.get_synced_seq(self.laptop.replica_id)), [])
+
+    def test_synchronize_only_sends_deltas(self):
+        self.laptop.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        synchronize(self.laptop, self.workstation)
+
+        self.laptop.schedule_tasks(until_date=date(2016, 11, 3))
+
+        synced_seq = self.workstation.get_synced_seq(self.laptop.replica_id)
+        self.assertEqual(
+            [(c.kind, c.task, c.date) for c in self.laptop.get_changes(after_seq=synced_seq)],
+            [(Change.SCHEDULE, 'Make coffee', date(2016, 11, 3))]
+        )
+
+        self.assertEqual(synchronize(self.workstation, self.laptop), (1, 0))
+
+    def test_synchronize_through_third_database(self):
+        phone_db = create_session('sqlite:///{}'.format(os.path.join(self.temp_dir, 'phone.sqlite')))
+        self.addCleanup(phone_db.close)
+        phone = Tasker(phone_db)
+
+        self.laptop.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        synchronize(self.laptop, self.workstation)
+        synchronize(self.workstation, phone)
+
+        phone.schedule_tasks(until_date=date(2016, 11, 3))
+        phone.complete_task_instance(1)
+        synchronize(phone, self.workstation)
+        synchronize(self.workstation, self.laptop)
+
+        self.assertEqual(self._task_instances(self.laptop_db), [('Make coffee', date(2016, 11, 3), True)])
+        self.assertEqual(synchronize(self.laptop, phone), (0, 0))
+
+    def test_synchronize_existing_database(self):
+        # Simulate a database from before the change log existed.
+        self.laptop.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        self.laptop.schedule_tasks(until_date=date(2016, 11, 3))
+        self.laptop.complete_task_instance(1)
+        self.laptop_db.query(Change).delete()
+        self.laptop_db.execute('DELETE FROM replicas')
+        self.laptop_db.commit()
+
+        synchronize(Tasker(self.laptop_db), self.workstation)
+
+        self.assertEqual(self._task_instances(self.workstation_db), [('Make coffee', date(2016, 11, 3), True)])
+
+    def test_synchronize_owners(self):
+        Tasker(self.laptop_db, owner='alice').create_task('Make coffee', 'daily', date(2016, 11, 3))
+        Tasker(self.laptop_db, owner='bob').create_task('Make coffee', 'daily', date(2016, 11, 4))
+
+        self.assertEqual(synchronize(Tasker(self.workstation_db, owner='bob'), self.laptop), (1, 0))
+
+        self.assertEqual(self.workstation_db.query(Task.name, Task.start, Task.owner).all(), [
+            ('Make coffee', date(2016, 11, 4), 'bob')
+        ])
+
+        self.assertEqual(synchronize(self.workstation, self.laptop), (1, 0))
+
+        self.assertEqual(self.workstation_db.query(Task.name, Task.start, Task.owner).order_by(Task.id).all(), [
+            ('Make coffee', date(2016, 11, 4), 'bob'),
+            ('Make coffee', date(2016, 11, 3), 'alice')
+        ])
+
+    def test_synchronize_owner_only_sends_deltas(self):
+        alice = Tasker(self.workstation_db, owner='alice')
+        Tasker(self.laptop_db, owner='alice').create_task('Make coffee', 'daily', date(2016, 11, 3))
+        Tasker(self.laptop_db, owner='bob').create_task('Get gas', 'weekly', date(2016, 11, 5))
+        self.assertEqual(synchronize(alice, self.laptop), (1, 0))
+
+        read = []
+        get_changes = self.laptop.get_changes
+        self.laptop.get_changes = lambda *args, **kwargs: read.extend(get_changes(*args, **kwargs)) or read
+
+        # Other owners' changes don't hold back the next sync of this owner's.
+        self.assertEqual(synchronize(alice, self.laptop), (0, 0))
+        self.assertEqual(read, [])
+
+        Tasker(self.laptop_db, owner='alice').schedule_tasks(until_date=date(2016, 11, 3))
+        self.assertEqual(synchronize(alice, self.laptop), (1, 0))
+        self.assertEqual([(c.kind, c.task, c.owner) for c in read], [(Change.SCHEDULE, 'Make coffee', 'alice')])
+
+        # Syncing every owner afterwards still picks up the other owners' changes.
+        self.assertEqual(synchronize(self.workstation, self.laptop), (1, 0))
+
+    def test_synchronize_dependencies(self):
+        self.laptop.create_task('Collect invoices', 'monthly', date(2016, 11, 1))
+        self.laptop.create_task('Pay bills', 'monthly', date(2016, 11, 3))
+        synchronize(self.laptop, self.workstation)
+        self.workstation.add_dependency('Pay bills', 'Collect invoices')
+
+        self.laptop.schedule_tasks(until_date=date(2016, 11, 3))
+        synchronize(self.laptop, self.workstation)
+        self.assertEqual([ti.name for ti in self.workstation.get_incomplete_task_instances()], ['Collect invoices'])
+
+        self.laptop.complete_task_instance(1)
+        synchronize(self.laptop, self.workstation)
+        self.assertEqual([ti.name for ti in self.workstation.get_incomplete_task_instances()], ['Pay bills'])
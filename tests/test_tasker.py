@@ -1,11 +1,34 @@
-from datetime import date
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
 from unittest import TestCase
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from src.models import Base, Task
+from src.journal import CompletionJournal
+from src.models import Base, PendingCount, Task, TaskInstanceBlock, TaskStatistics, TaskTag, TASK_SEARCH_TABLE
 from src.tasker import Tasker, DuplicateNameException, InvalidStartDateException, InvalidCadenceException, TaskInstance
+from src.tasker import DependencyCycleException, UnknownTaskException
+from tests.tasker_behaviour import TaskerBehaviour
+
+
+class TaskerBehaviourTest(TaskerBehaviour, TestCase):
+    def setUp(self):
+        super(TaskerBehaviourTest, self).setUp()
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+
+    def create_tasker(self, owner=None):
+        return Tasker(self.db, owner=owner)
+
+
+class UncachedTaskerBehaviourTest(TaskerBehaviourTest):
+    def setUp(self):
+        super(UncachedTaskerBehaviourTest, self).setUp()
+        self.db.enable_baked_queries = False
 
 
 class TaskerTest(TestCase):
@@ -224,3 +247,303 @@ class TaskerTest(TestCase):
             TaskInstance(id=2, task=2, date=date(2016, 11, 4), done=True),
             TaskInstance(id=1, task=1, date=date(2016, 11, 5), done=True)
         ])
+
+    def test_create_task_project_tags(self):
+        tasker = Tasker(self.db)
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3), project='home', tags=['kitchen', 'morning'])
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+
+        tasks = self.db.query(Task).order_by(Task.id).all()
+        tags = self.db.query(TaskTag).order_by(TaskTag.tag).all()
+
+        self.assertEqual(tasks, [
+            Task(id=1, name='Make coffee', cadence='daily', start=date(2016, 11, 3), project='home'),
+            Task(id=2, name='Get gas', cadence='weekly', start=date(2016, 11, 5), project=None)
+        ])
+        self.assertEqual(tags, [TaskTag(tag='kitchen', task=1), TaskTag(tag='morning', task=1)])
+
+    def _create_search_tasks(self, tasker):
+        tasker.create_task('Pay phone bill', 'monthly', date(2016, 11, 4), project='home')
+        tasker.create_task('Phone mom', 'weekly', date(2016, 11, 5), tags=['family'])
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+
+    def test_search_ranked(self):
+        tasker = Tasker(self.db)
+        self._create_search_tasks(tasker)
+
+        # The search index ranks closer matches first.
+        self.assertEqual([t.name for t in tasker.search('pho')], ['Phone mom', 'Pay phone bill'])
+
+    def test_search_like_fallback(self):
+        tasker = Tasker(self.db)
+        tasker._search_index = False
+        self._create_search_tasks(tasker)
+
+        self.assertEqual([t.name for t in tasker.search('pho')], ['Pay phone bill', 'Phone mom'])
+        self.assertEqual([t.name for t in tasker.search('bill PAY')], ['Pay phone bill'])
+        self.assertEqual([t.name for t in tasker.search('hone')], [])
+        self.assertEqual([t.name for t in tasker.search('phone', tag='family')], ['Phone mom'])
+        self.assertEqual(tasker.search('coffee'), [(3, 'Make coffee', 'daily', date(2016, 11, 3))])
+
+    def test_search_index_follows_updates(self):
+        tasker = Tasker(self.db)
+        self._create_search_tasks(tasker)
+
+        self.db.query(Task).filter(Task.id == 3).update({'name': 'Make tea'})
+        self.db.query(Task).filter(Task.id == 1).delete()
+        self.db.commit()
+
+        self.assertEqual([t.name for t in tasker.search('tea')], ['Make tea'])
+        self.assertEqual([t.name for t in tasker.search('coffee')], [])
+        self.assertEqual([t.name for t in tasker.search('phone')], ['Phone mom'])
+
+    def test_search_index_built_for_existing_database(self):
+        tasker = Tasker(self.db)
+
+        self.db.execute('DROP TABLE {}'.format(TASK_SEARCH_TABLE))
+        for suffix in ('ai', 'ad', 'au'):
+            self.db.execute('DROP TRIGGER {}_{}'.format(TASK_SEARCH_TABLE, suffix))
+        self.db.commit()
+        self._create_search_tasks(tasker)
+
+        Base.metadata.create_all(self.db.get_bind())
+
+        self.assertEqual([t.name for t in Tasker(self.db).search('coffee')], ['Make coffee'])
+
+    def test_rebuild_statistics(self):
+        tasker = Tasker(self.db)
+
+        tasker.create_task('Make coffee', 'daily', date.today() - timedelta(days=2))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+
+        tasker.schedule_tasks()
+        tasker.complete_task_instance(1)
+        tasker.schedule_tasks()
+
+        expected = [(1, 'Make coffee', 'daily', 2, 1, 2), (2, 'Get gas', 'weekly', 1, 0, 0)]
+        self.assertEqual(tasker.get_statistics(), expected)
+
+        tasker.rebuild_statistics()
+        self.assertEqual(tasker.get_statistics(), expected)
+
+        # History from before the rollup existed is counted, but its lateness is unknown.
+        self.db.query(TaskStatistics).delete()
+        self.db.commit()
+
+        tasker.rebuild_statistics()
+        self.assertEqual(tasker.get_statistics(), [
+            (1, 'Make coffee', 'daily', 2, 1, 0),
+            (2, 'Get gas', 'weekly', 1, 0, 0)
+        ])
+
+    def test_complete_task_instance_journaled(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        journal = CompletionJournal(os.path.join(temp_dir, 'journal'))
+        tasker = Tasker(self.db, journal=journal)
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+
+        tasker.schedule_tasks(until_date=date(2016, 11, 5))
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance('abc')
+
+        # Nothing's written to the database, but pending completions are still taken into account.
+        self.assertEqual(journal.pending(), [1])
+        self.assertEqual(self.db.query(TaskInstance).filter(TaskInstance.done == True).all(), [])  # noqa: E712
+        self.assertEqual(tasker.get_incomplete_task_instances(), [(2, 'Get gas', date(2016, 11, 5), False)])
+
+        tasker.complete_task_instance(2)
+        self.assertEqual(tasker.get_incomplete_task_instances(), [])
+        self.assertEqual(tasker.flush_journal(), [1, 2])
+        self.assertEqual(journal.pending(), [])
+
+        tasker.schedule_tasks(until_date=date(2016, 11, 5))
+
+        tis = self.db.query(TaskInstance).order_by(TaskInstance.id).all()
+        self.assertEqual(tis, [
+            TaskInstance(id=1, task=1, date=date(2016, 11, 3), done=True),
+            TaskInstance(id=2, task=2, date=date(2016, 11, 5), done=True),
+            TaskInstance(id=3, task=1, date=date(2016, 11, 4), done=False)
+        ])
+        self.assertEqual([(row.scheduled, row.done) for row in tasker.get_statistics()], [(2, 1), (1, 1)])
+
+    def test_schedule_tasks_flushes_journal(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        journal = CompletionJournal(os.path.join(temp_dir, 'journal'))
+        tasker = Tasker(self.db, journal=journal)
+
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+
+        tasker.schedule_tasks(until_date=date(2016, 11, 4))
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(1)
+        tasker.schedule_tasks(until_date=date(2016, 11, 4))
+
+        self.assertEqual(journal.pending(), [])
+        self.assertEqual(tasker.get_incomplete_task_instances(), [(2, 'Make coffee', date(2016, 11, 4), False)])
+        self.assertEqual([(row.scheduled, row.done) for row in tasker.get_statistics()], [(2, 1)])
+
+    def test_owner_rows(self):
+        alice = Tasker(self.db, owner='alice')
+        bob = Tasker(self.db, owner='bob')
+
+        alice.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        bob.create_task('Make coffee', 'daily', date(2016, 11, 4))
+        alice.schedule_tasks(until_date=date(2016, 11, 4))
+        bob.schedule_tasks(until_date=date(2016, 11, 4))
+        bob.complete_task_instance(2)
+
+        # Task instances carry their task's owner, as do the changes logged for them.
+        self.assertEqual(self.db.query(TaskInstance.id, TaskInstance.owner, TaskInstance.done).all(), [
+            (1, 'alice', False), (2, 'bob', True)
+        ])
+        self.assertEqual([c.owner for c in alice.get_changes()], ['alice', 'alice'])
+
+    def test_cached_queries_bindings(self):
+        alice = Tasker(self.db, owner='alice')
+        bob = Tasker(self.db, owner='bob')
+
+        alice.create_task('Make coffee', 'once', date(2016, 11, 3), project='home', tags=['morning'])
+        alice.create_task('Get gas', 'once', date(2016, 11, 4), project='car', tags=['errands'])
+        bob.create_task('Pay bills', 'once', date(2016, 11, 5), project='home', tags=['errands'])
+        self.tasker.schedule_tasks(until_date=date(2016, 11, 5))
+
+        def names(task_instances):
+            return [ti.name for ti in task_instances]
+
+        # Each query runs again with other bindings, which reuses its cached statement, but not its rows.
+        everyone = self.tasker
+        for _ in range(2):
+            self.assertEqual(names(alice.get_incomplete_task_instances()), ['Make coffee', 'Get gas'])
+            self.assertEqual(names(bob.get_incomplete_task_instances()), ['Pay bills'])
+            self.assertEqual(names(everyone.get_incomplete_task_instances()), ['Make coffee', 'Get gas', 'Pay bills'])
+            self.assertEqual(names(alice.get_incomplete_task_instances(tag='errands')), ['Get gas'])
+            self.assertEqual(names(bob.get_incomplete_task_instances(tag='errands')), ['Pay bills'])
+            self.assertEqual(names(bob.get_incomplete_task_instances(tag='morning')), [])
+            self.assertEqual(names(alice.get_incomplete_task_instances(project='home')), ['Make coffee'])
+            self.assertEqual(names(alice.get_incomplete_task_instances(project='car')), ['Get gas'])
+            self.assertEqual(names(bob.get_task_schedules()), ['Pay bills'])
+            self.assertEqual(names(alice.get_task_schedules()), ['Make coffee', 'Get gas'])
+            self.assertEqual([alice.pending_count(), bob.pending_count()], [2, 1])
+
+        alice.complete_task_instance(3)
+        bob.complete_task_instance(1)
+        alice.complete_task_instance(1, tag='errands')
+        alice.complete_task_instance(2, project='home')
+        self.assertEqual(names(self.tasker.get_incomplete_task_instances()), ['Make coffee', 'Get gas', 'Pay bills'])
+
+        alice.complete_task_instance(1, tag='morning')
+        bob.complete_task_instance(3, project='home')
+        self.assertEqual(names(self.tasker.get_incomplete_task_instances()), ['Get gas'])
+
+    def test_owner_rebuild_statistics(self):
+        alice = Tasker(self.db, owner='alice')
+        bob = Tasker(self.db, owner='bob')
+
+        alice.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        bob.create_task('Get gas', 'weekly', date(2016, 11, 5))
+
+        self.db.query(TaskStatistics).delete()
+        self.db.commit()
+
+        alice.rebuild_statistics()
+        self.assertEqual(self.tasker.get_statistics(), [
+            (1, 'Make coffee', 'daily', 0, 0, 0),
+            (2, 'Get gas', 'weekly', 0, 0, 0)
+        ])
+        self.assertEqual(self.db.query(TaskStatistics.task).all(), [(1,)])
+
+    def test_pending_count_journaled(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        tasker = Tasker(self.db, journal=CompletionJournal(os.path.join(temp_dir, 'journal')))
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Fix bike', 'once', date(2016, 11, 2))
+        tasker.schedule_tasks(until_date=date(2016, 11, 3))
+
+        tasker.complete_task_instance(1)
+        tasker.complete_task_instance(1)
+        self.assertEqual(tasker.pending_count(), 1)
+
+        tasker.flush_journal()
+        tasker.complete_task_instance(1)
+        self.assertEqual(tasker.pending_count(), 1)
+
+    def test_rebuild_pending_count(self):
+        tasker = Tasker(self.db)
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.create_task('Fix bike', 'once', date(2016, 11, 2))
+        tasker.schedule_tasks(until_date=date(2016, 11, 3))
+
+        self.db.query(PendingCount).delete()
+        self.db.commit()
+        self.assertEqual(tasker.pending_count(), 0)
+
+        tasker.rebuild_statistics()
+        self.assertEqual(tasker.pending_count(), 2)
+
+    def test_dependencies(self):
+        tasker = Tasker(self.db)
+
+        tasker.create_task('Collect invoices', 'monthly', date(2016, 11, 1))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 3))
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        tasker.add_dependency('Pay bills', 'Collect invoices')
+
+        tasker.schedule_tasks(until_date=date(2016, 11, 3))
+        self.assertEqual(
+            [ti.name for ti in tasker.get_incomplete_task_instances()], ['Collect invoices', 'Make coffee']
+        )
+        self.assertEqual(tasker.pending_count(), 3)
+
+        # Only the task instances waiting for the completed one are unblocked.
+        tasker.complete_task_instance(3)
+        self.assertEqual(self.db.query(TaskInstanceBlock.task_instance, TaskInstanceBlock.blocker).all(), [(2, 1)])
+
+        tasker.complete_task_instance(1)
+        self.assertEqual([ti.name for ti in tasker.get_incomplete_task_instances()], ['Pay bills'])
+        self.assertEqual(self.db.query(TaskInstanceBlock).all(), [])
+
+        # A task instance scheduled after the one it waits for is done isn't blocked.
+        tasker.complete_task_instance(2)
+        tasker.schedule_tasks(until_date=date(2016, 12, 1))
+        self.assertEqual([(ti.name, ti.date) for ti in tasker.get_incomplete_task_instances()], [
+            ('Make coffee', date(2016, 11, 4)),
+            ('Collect invoices', date(2016, 12, 1))
+        ])
+        tasker.schedule_tasks(until_date=date(2016, 12, 3))
+        self.assertNotIn('Pay bills', [ti.name for ti in tasker.get_incomplete_task_instances()])
+
+    def test_add_dependency_blocks_pending(self):
+        tasker = Tasker(self.db)
+
+        tasker.create_task('Collect invoices', 'monthly', date(2016, 11, 1))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 3))
+        tasker.schedule_tasks(until_date=date(2016, 11, 3))
+
+        tasker.add_dependency('Pay bills', 'Collect invoices')
+        tasker.add_dependency('Pay bills', 'Collect invoices')
+        self.assertEqual([ti.name for ti in tasker.get_incomplete_task_instances()], ['Collect invoices'])
+        self.assertEqual(tasker.get_dependencies(), [('Pay bills', 'Collect invoices')])
+
+        tasker.remove_dependency('Pay bills', 'Collect invoices')
+        self.assertEqual([ti.name for ti in tasker.get_incomplete_task_instances()], ['Collect invoices', 'Pay bills'])
+        self.assertEqual(tasker.get_dependencies(), [])
+
+    def test_add_dependency_invalid(self):
+        tasker = Tasker(self.db)
+
+        tasker.create_task('Collect invoices', 'monthly', date(2016, 11, 1))
+        tasker.create_task('Pay bills', 'monthly', date(2016, 11, 3))
+        tasker.create_task('File taxes', 'monthly', date(2016, 11, 4))
+        tasker.add_dependency('Pay bills', 'Collect invoices')
+        tasker.add_dependency('File taxes', 'Pay bills')
+
+        self.assertRaises(DependencyCycleException, tasker.add_dependency, 'Collect invoices', 'File taxes')
+        self.assertRaises(DependencyCycleException, tasker.add_dependency, 'Pay bills', 'Pay bills')
+        self.assertRaises(UnknownTaskException, tasker.add_dependency, 'Pay bills', 'Buy stamps')
@@ -0,0 +1,174 @@
+import os
+import shutil
+import tempfile
+from datetime import date, datetime
+from unittest import TestCase
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from src.database import create_database_engine, create_session
+from src.journal import CompletionJournal
+from src.tasker import Tasker, ScheduledTaskInstance
+from src.watcher import TaskWatcher
+
+
+class TaskWatcherTest(TestCase):
+    def setUp(self):
+        super(TaskWatcherTest, self).setUp()
+
+        self.tasker = Tasker(create_session('sqlite://'))
+        self.current_time = datetime(2016, 11, 3, 9, 30)
+        self.notifications = []
+
+        self.watcher = TaskWatcher(
+            self.tasker, notify=self.notifications.append, poll_interval=300, now=lambda: self.current_time
+        )
+
+    def test_run_pending(self):
+        self.tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        self.tasker.create_task('Get gas', 'weekly', date(2016, 11, 5))
+        self.tasker.create_task('Fix bike', 'once', date(2016, 11, 2))
+
+        self.watcher.load()
+        self.assertEqual(self.watcher.run_pending(), [
+            ScheduledTaskInstance(1, 'Make coffee', date(2016, 11, 3), False),
+            ScheduledTaskInstance(2, 'Fix bike', date(2016, 11, 2), False)
+        ])
+        self.assertEqual(self.notifications, [
+            ScheduledTaskInstance(1, 'Make coffee', date(2016, 11, 3), False),
+            ScheduledTaskInstance(2, 'Fix bike', date(2016, 11, 2), False)
+        ])
+
+        # Nothing else is due until Get gas.
+        self.assertEqual(self.watcher.run_pending(), [])
+        self.assertEqual(self.watcher.seconds_until_due(), 300)
+
+        self.current_time = datetime(2016, 11, 4, 23, 59, 30)
+        self.assertEqual(self.watcher.seconds_until_due(), 30)
+
+        self.current_time = datetime(2016, 11, 5, 0, 0, 1)
+        self.assertEqual(self.watcher.run_pending(), [
+            ScheduledTaskInstance(3, 'Get gas', date(2016, 11, 5), False)
+        ])
+
+    def test_refresh(self):
+        self.tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+
+        self.watcher.load()
+        self.watcher.run_pending()
+
+        self.tasker.create_task('Get gas', 'weekly', date(2016, 11, 3))
+        self.current_time = datetime(2016, 11, 4, 8)
+
+        # The coffee task instance isn't done, so the next one isn't due, and the new task isn't known of yet.
+        self.assertEqual(self.watcher.run_pending(), [])
+
+        self.tasker.complete_task_instance(1)
+        self.watcher.refresh()
+
+        self.assertEqual(self.watcher.run_pending(), [
+            ScheduledTaskInstance(2, 'Make coffee', date(2016, 11, 4), False),
+            ScheduledTaskInstance(3, 'Get gas', date(2016, 11, 3), False)
+        ])
+
+        self.tasker.complete_task_instance(3)
+        self.watcher.refresh()
+
+        self.current_time = datetime(2016, 11, 10, 8)
+        self.assertEqual(self.watcher.run_pending(), [
+            ScheduledTaskInstance(4, 'Get gas', date(2016, 11, 10), False)
+        ])
+
+    def test_run_pending_scheduled_elsewhere(self):
+        self.tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+
+        self.watcher.load()
+        self.tasker.schedule_tasks(until_date=date(2016, 11, 3))
+
+        self.assertEqual(self.watcher.run_pending(), [])
+        self.assertEqual(self.notifications, [])
+
+        self.tasker.complete_task_instance(1)
+        self.watcher.refresh()
+        self.current_time = datetime(2016, 11, 4, 8)
+
+        self.assertEqual(self.watcher.run_pending(), [
+            ScheduledTaskInstance(2, 'Make coffee', date(2016, 11, 4), False)
+        ])
+
+    def test_refresh_sees_other_sessions(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        engine = create_database_engine('sqlite:///{}'.format(os.path.join(temp_dir, 'tasker.sqlite')))
+        self.addCleanup(engine.dispose)
+        engine.execute('PRAGMA journal_mode=WAL')
+
+        # Begin transactions when SQLAlchemy does, rather than at the first write, so that everything read in one
+        # reads the same snapshot, as it would in MySQL.
+        @event.listens_for(engine, 'connect')
+        def connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, 'begin')
+        def begin(connection):
+            connection.execute('BEGIN')
+
+        tasker = Tasker(sessionmaker(bind=engine)())
+        other_tasker = Tasker(sessionmaker(bind=engine)())
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+
+        watcher = TaskWatcher(tasker, notify=self.notifications.append, now=lambda: self.current_time)
+        watcher.load()
+        watcher.run_pending()
+        watcher.refresh()
+
+        other_tasker.complete_task_instance(1)
+        other_tasker.create_task('Get gas', 'weekly', date(2016, 11, 3))
+        watcher.refresh()
+
+        self.current_time = datetime(2016, 11, 4, 8)
+        self.assertEqual(watcher.run_pending(), [
+            ScheduledTaskInstance(2, 'Make coffee', date(2016, 11, 4), False),
+            ScheduledTaskInstance(3, 'Get gas', date(2016, 11, 3), False)
+        ])
+
+    def test_refresh_journaled(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        journal = CompletionJournal(os.path.join(temp_dir, 'journal'))
+        tasker = Tasker(self.tasker.db, journal=journal)
+        tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+
+        watcher = TaskWatcher(tasker, notify=self.notifications.append, now=lambda: self.current_time)
+        watcher.load()
+        watcher.run_pending()
+
+        tasker.complete_task_instance(1)
+        watcher.refresh()
+
+        self.assertEqual(journal.pending(), [])
+        self.current_time = datetime(2016, 11, 4, 8)
+        self.assertEqual(watcher.run_pending(), [
+            ScheduledTaskInstance(2, 'Make coffee', date(2016, 11, 4), False)
+        ])
+
+    def test_run(self):
+        self.tasker.create_task('Make coffee', 'daily', date(2016, 11, 3))
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                raise KeyboardInterrupt()
+            self.tasker.complete_task_instance(1)
+            self.current_time = datetime(2016, 11, 4)
+
+        self.watcher.sleep = sleep
+        self.assertRaises(KeyboardInterrupt, self.watcher.run)
+
+        self.assertEqual(sleeps, [300, 300])
+        self.assertEqual(self.notifications, [
+            ScheduledTaskInstance(1, 'Make coffee', date(2016, 11, 3), False),
+            ScheduledTaskInstance(2, 'Make coffee', date(2016, 11, 4), False)
+        ])